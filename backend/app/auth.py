@@ -4,23 +4,202 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from fastapi.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Optional, Tuple
+import asyncio
+import logging
 import os
+import threading
+import time
+import orjson
 from . import crud, schemas, models, database
+from .event_bus import bus
+from .rate_limit import AdmissionGate
+
+logger = logging.getLogger(__name__)
+
+# --- Hash de senha (Argon2) ---
+# Custo do Argon2. Mudou os valores? Os hashes antigos continuam válidos e são
+# regravados com os parâmetros novos no próximo login de cada usuário.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB por hash
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+# Hashes simultâneos (por worker). Cada um usa ARGON2_MEMORY_COST de RAM.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Logins simultâneos (por worker) e quanto tempo (s) um login espera na fila antes do 503
+LOGIN_MAX_CONCURRENCY = int(os.getenv("LOGIN_MAX_CONCURRENCY", "16"))
+LOGIN_QUEUE_TIMEOUT = float(os.getenv("LOGIN_QUEUE_TIMEOUT", "10"))
 
 # Configuração de Hash de Senha
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 
+# O Argon2 é pesado de propósito (CPU e memória). Roda num pool próprio e limitado:
+# fora do event loop (que atende os WebSockets) e sem ocupar o threadpool das
+# rotas síncronas. O argon2-cffi solta o GIL, então threads bastam.
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+# Logins simultâneos: os excedentes esperam na fila; se demorar demais, 503
+login_gate = AdmissionGate(
+    LOGIN_MAX_CONCURRENCY, LOGIN_QUEUE_TIMEOUT,
+    "Muitos logins ao mesmo tempo. Tente novamente em instantes.",
+)
+
+# Obrigatórias; conferidas por check_settings() na inicialização (e não no import)
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+_expire_minutes = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(_expire_minutes) if _expire_minutes else None
+
+
+def check_settings():
+    """Falha cedo e com mensagem clara se faltar configuração do JWT (chamado no lifespan)."""
+    missing = [name for name, value in (
+        ("SECRET_KEY", SECRET_KEY),
+        ("ALGORITHM", ALGORITHM),
+        ("ACCESS_TOKEN_EXPIRE_MINUTES", ACCESS_TOKEN_EXPIRE_MINUTES),
+    ) if not value]
+    if missing:
+        raise RuntimeError(f"Variáveis de ambiente obrigatórias não configuradas: {', '.join(missing)}")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/token")
 
+# --- Cache de usuários autenticados ---
+# Segundos que o usuário de um token fica em cache (0 desliga) e máximo de tokens guardados
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+class PrincipalCache:
+    """
+    Usuário (schemas.User) de cada token já validado, chave (sub, exp).
+    Evita ir ao banco em toda requisição autenticada. Cada entrada vive no
+    máximo PRINCIPAL_CACHE_TTL segundos (nunca além do exp do token) e as
+    menos usadas saem quando passa de PRINCIPAL_CACHE_SIZE. O crud chama
+    invalidate(email) quando um usuário muda: este worker esquece na hora e
+    os outros quando o "principal_invalidate" chegar pelo barramento.
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        # Acessado pelo event loop e pelo crud (threadpool)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Optional[int]], Tuple[float, schemas.User]]" = OrderedDict()
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Event loop do worker: o crud roda no threadpool e publica por ele
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def get(self, email: str, exp: Optional[int]) -> Optional[schemas.User]:
+        key = (email, exp)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, email: str, exp: Optional[int], user: schemas.User):
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        with self._lock:
+            self._entries[(email, exp)] = (time.monotonic() + ttl, user)
+            self._entries.move_to_end((email, exp))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        """Esquece todos os tokens desse usuário, neste worker e nos outros."""
+        self.forget(email)
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._publish(email), self._loop)
+
+    async def _publish(self, email: str):
+        try:
+            await bus.publish({"type": "principal_invalidate", "email": email})
+        except Exception as e:
+            # Os outros workers ficam com o usuário antigo até o TTL
+            logger.error("Erro ao publicar principal_invalidate", extra={"error": str(e)})
+
+    def on_event(self, event: dict):
+        self.forget(orjson.loads(event["frame"])["email"])
+
+    def forget(self, email: str):
+        """Esquece todos os tokens desse usuário (só neste worker)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == email]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl,
+        }
+
+
+principals = PrincipalCache()
+# Um usuário alterado em qualquer worker sai do cache de todos
+bus.subscribe("principal_invalidate", principals.on_event)
+
+
+def _load_principal(email: str) -> Optional[schemas.User]:
+    """Busca o usuário numa sessão curta (roda no threadpool)."""
+    with database.SessionLocal() as db:
+        user = crud.get_user_by_email(db, email=email)
+        return schemas.User.model_validate(user) if user else None
+
+
+async def get_principal(email: str, exp: Optional[int]) -> Optional[schemas.User]:
+    """Usuário do token: do cache ou, se não estiver lá, do banco."""
+    user = principals.get(email, exp)
+    if user is None:
+        user = await run_in_threadpool(_load_principal, email)
+        # Usuário inexistente não é guardado: pode ser criado a qualquer momento
+        if user is not None:
+            principals.put(email, exp, user)
+    return user
+
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _hash_pool.submit(pwd_context.verify, plain_password, hashed_password).result()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    # Chamado de código síncrono (rotas "def", seed): espera o pool limitado
+    return _hash_pool.submit(pwd_context.hash, password).result()
+
+async def verify_and_update_password(plain_password, hashed_password):
+    """
+    Versão para o event loop: espera o hash no pool sem travar o loop.
+    Retorna (senha_ok, novo_hash); novo_hash vem preenchido quando o hash
+    salvo usa parâmetros antigos do Argon2.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_pool, pwd_context.verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -32,18 +211,26 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = crud.get_user_by_email(db, email)
+async def authenticate_user(db: Session, email: str, password: str):
+    # Banco e Argon2 fora do event loop
+    user = await run_in_threadpool(crud.get_user_by_email, db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # Devolve a conexão ao pool antes de esperar o Argon2: senão uma rajada de
+    # logins (até LOGIN_MAX_CONCURRENCY) segura o pool inteiro. O usuário fica
+    # carregado, fora da sessão.
+    db.expunge(user)
+    await run_in_threadpool(db.rollback)
+    async with login_gate.slot():
+        valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Parâmetros do Argon2 mudaram: regrava o hash (transparente para o usuário)
+        await run_in_threadpool(crud.update_user_password_hash, db, user, new_hash)
     return user
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(database.get_db)
-):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
@@ -58,13 +245,14 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = crud.get_user_by_email(db, email=token_data.email)
+    # Sem sessão do banco por requisição: quase sempre vem do cache
+    user = await get_principal(token_data.email, payload.get("exp"))
     if user is None:
         raise credentials_exception
     return user
 
 async def get_current_active_kitchen_user(
-    current_user: models.User = Depends(get_current_user)
+    current_user: schemas.User = Depends(get_current_user)
 ):
     if current_user.cargo != models.UserRole.cozinheiro:
         raise HTTPException(
@@ -1,8 +1,15 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.dialects import postgresql, sqlite
 from fastapi import HTTPException, status
-from . import models, schemas, auth
+from . import models, schemas, auth, menu_cache, serializers
+from .metrics import ORDER_STOCK_CONFLICTS, ORDERS_CREATED
 from .models import UserRole
-from typing import List, Optional
+from typing import Dict, List, Optional
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
 
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
@@ -17,9 +24,22 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    auth.principals.invalidate(db_user.email)
     return db_user
 
+def update_user_password_hash(db: Session, user: models.User, hashed_password: str):
+    # O login devolve o usuário à sessão só aqui (ver auth.authenticate_user)
+    db.add(user)
+    user.hashed_password = hashed_password
+    db.commit()
+    auth.principals.invalidate(user.email)
+
 # --- Product ---
+# Toda escrita de produto chama menu_cache.mark_dirty depois do commit: os clientes
+# conectados recebem a mudança num "menu_delta" (ver menu_cache.py).
+# get_products, get_all_products, get_user_order_history, get_user_favorites,
+# get_active_orders e get_active_orders_by_user (e as versões "_data") são somente-leitura: os routers as chamam com a
+# sessão de database.get_read_db (réplica, quando configurada).
 def get_products(db: Session, only_in_stock: bool = True) -> List[models.Product]:
     query = db.query(models.Product)
     if only_in_stock:
@@ -29,6 +49,27 @@ def get_products(db: Session, only_in_stock: bool = True) -> List[models.Product
 def get_all_products(db: Session) -> List[models.Product]:
      return get_products(db, only_in_stock=False)
 
+def get_products_by_ids(db: Session, product_ids: List[int]) -> List[models.Product]:
+    return db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
+
+# Colunas lidas pelas versões "_data" (dicts prontos para o JSON, sem ORM; ver serializers.py)
+PRODUCT_COLUMNS = (
+    models.Product.id, models.Product.nome, models.Product.preco, models.Product.categoria,
+    models.Product.keywords, models.Product.quantidade_estoque, models.Product.em_promocao,
+    models.Product.preco_promocional,
+)
+
+def get_products_data(db: Session, only_in_stock: bool = True) -> List[dict]:
+    """Mesmo resultado de get_products, já no formato de schemas.Product."""
+    query = select(*PRODUCT_COLUMNS)
+    if only_in_stock:
+        query = query.where(models.Product.quantidade_estoque > 0)
+    return serializers.products_to_dicts(db.execute(query.order_by(models.Product.nome)))
+
+def get_products_data_by_ids(db: Session, product_ids: List[int]) -> List[dict]:
+    query = select(*PRODUCT_COLUMNS).where(models.Product.id.in_(product_ids))
+    return serializers.products_to_dicts(db.execute(query))
+
 def get_product_by_id(db: Session, product_id: int, lock_for_update: bool = False):
     query = db.query(models.Product).filter(models.Product.id == product_id)
     if lock_for_update:
@@ -41,6 +82,7 @@ def create_product(db: Session, product: schemas.ProductCreate) -> models.Produc
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    menu_cache.mark_dirty([db_product.id])
     return db_product
 
 def update_product(db: Session, product_id: int, product_update: schemas.ProductUpdate) -> Optional[models.Product]:
@@ -51,6 +93,7 @@ def update_product(db: Session, product_id: int, product_update: schemas.Product
             setattr(db_product, key, value)
         db.commit()
         db.refresh(db_product)
+        menu_cache.mark_dirty([product_id])
     return db_product
 
 def delete_product(db: Session, product_id: int) -> bool:
@@ -58,6 +101,7 @@ def delete_product(db: Session, product_id: int) -> bool:
     if db_product:
         db.delete(db_product)
         db.commit()
+        menu_cache.mark_dirty([product_id])
         return True
     return False
 
@@ -68,13 +112,21 @@ def update_product_promotion(db: Session, product_id: int, promo_update: schemas
         db_product.preco_promocional = promo_update.preco_promocional
         db.commit()
         db.refresh(db_product)
+        menu_cache.mark_dirty([product_id])
     return db_product
 
 # --- Order ---
+# Pedidos, itens e produtos são carregados em consultas separadas com
+# "WHERE ... IN (...)" (selectinload), em vez de um JOIN que repete as colunas
+# do pedido e do produto em cada linha de item.
+ORDER_GRAPH_OPTIONS = (
+    selectinload(models.Order.itens).selectinload(models.OrderItem.produto),
+)
+
 def get_user_order_history(db: Session, user_id: int) -> List[models.Order]:
     return db.query(models.Order)\
              .filter(models.Order.usuario_id == user_id)\
-             .options(joinedload(models.Order.itens))\
+             .options(*ORDER_GRAPH_OPTIONS)\
              .order_by(models.Order.created_at.desc())\
              .limit(5)\
              .all()
@@ -85,7 +137,7 @@ def get_active_orders(db: Session) -> List[models.Order]:
                  models.OrderStatus.RECEBIDO,
                  models.OrderStatus.EM_PRODUCAO
               ]))\
-             .options(joinedload(models.Order.itens).joinedload(models.OrderItem.produto))\
+             .options(*ORDER_GRAPH_OPTIONS)\
              .order_by(models.Order.created_at.asc())\
              .all()
 
@@ -96,16 +148,114 @@ def get_active_orders_by_user(db: Session, user_id: int) -> List[models.Order]:
                  models.OrderStatus.RECEBIDO,
                  models.OrderStatus.EM_PRODUCAO
               ]))\
-             .options(joinedload(models.Order.itens).joinedload(models.OrderItem.produto))\
+             .options(*ORDER_GRAPH_OPTIONS)\
              .order_by(models.Order.created_at.asc())\
              .all()
 
 def get_order_by_id(db: Session, order_id: int) -> models.Order:
      return db.query(models.Order)\
-             .options(joinedload(models.Order.itens).joinedload(models.OrderItem.produto))\
+             .options(*ORDER_GRAPH_OPTIONS)\
              .filter(models.Order.id == order_id)\
              .first()
 
+# Versões "_data" das leituras de pedidos: as mesmas três consultas do selectinload
+# (pedidos, itens, produtos), mas só com as colunas, sem hidratar objetos do ORM.
+# Devolvem dicts no formato de schemas.Order, prontos para o orjson.
+ORDER_COLUMNS = (
+    models.Order.id, models.Order.usuario_id, models.Order.status,
+    models.Order.created_at, models.Order.total, models.Order.versao,
+)
+ITEM_COLUMNS = (
+    models.OrderItem.id, models.OrderItem.pedido_id, models.OrderItem.produto_id,
+    models.OrderItem.quantidade, models.OrderItem.preco_no_momento,
+)
+
+def _orders_data(db: Session, query) -> List[dict]:
+    orders = db.execute(query).all()
+    if not orders:
+        return []
+    order_ids = [o.id for o in orders]
+    items = db.execute(
+        select(*ITEM_COLUMNS)
+        .where(models.OrderItem.pedido_id.in_(order_ids))
+        .order_by(models.OrderItem.id)
+    ).all()
+    # Cada produto vira dict uma vez só e é compartilhado pelos itens
+    products = {
+        p["id"]: p for p in get_products_data_by_ids(db, list({i.produto_id for i in items}))
+    }
+    items_by_order: Dict[int, List[dict]] = {order_id: [] for order_id in order_ids}
+    for item in items:
+        items_by_order[item.pedido_id].append(serializers.item_dict(item, products.get(item.produto_id)))
+    return [serializers.order_dict(o, items_by_order[o.id]) for o in orders]
+
+def _active_orders_query():
+    return select(*ORDER_COLUMNS).where(models.Order.status.in_([
+        models.OrderStatus.RECEBIDO,
+        models.OrderStatus.EM_PRODUCAO
+    ]))
+
+def get_active_orders_data(db: Session) -> List[dict]:
+    return _orders_data(db, _active_orders_query().order_by(models.Order.created_at.asc()))
+
+def get_active_orders_by_user_data(db: Session, user_id: int) -> List[dict]:
+    return _orders_data(db, _active_orders_query()
+                        .where(models.Order.usuario_id == user_id)
+                        .order_by(models.Order.created_at.asc()))
+
+def get_order_data(db: Session, order_id: int) -> Optional[dict]:
+    orders = _orders_data(db, select(*ORDER_COLUMNS).where(models.Order.id == order_id))
+    return orders[0] if orders else None
+
+
+# --- Favoritos (user_product_stats) ---
+# O score de cada pedido vale 2^(dias desde FAVORITES_EPOCH / meia-vida).
+# Como todos os scores crescem na mesma escala, ordenar pelo valor gravado é o
+# mesmo que ordenar pela contagem com decaimento "vista de hoje", sem precisar
+# reescrever as linhas antigas. Com meia-vida de 90 dias o float só estoura
+# daqui a uns 250 anos.
+FAVORITES_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+FAVORITES_HALF_LIFE_DAYS = 90.0
+
+def favorite_weight(ordered_at: datetime) -> float:
+    if ordered_at.tzinfo is None:
+        ordered_at = ordered_at.replace(tzinfo=timezone.utc)
+    days = (ordered_at - FAVORITES_EPOCH).total_seconds() / 86400
+    return 2.0 ** (days / FAVORITES_HALF_LIFE_DAYS)
+
+def _upsert_user_product_stats(db: Session, user_id: int, quantities: Dict[int, int], ordered_at: datetime):
+    """Soma um pedido (produto_id -> quantidade) no agregado do cliente."""
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stats = models.UserProductStats.__table__
+    weight = favorite_weight(ordered_at)
+    for product_id, quantity in quantities.items():
+        stmt = insert(stats).values(
+            usuario_id=user_id,
+            produto_id=product_id,
+            vezes_pedido=1,
+            quantidade_total=quantity,
+            score=weight,
+            ultimo_pedido_em=ordered_at,
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[stats.c.usuario_id, stats.c.produto_id],
+            set_={
+                "vezes_pedido": stats.c.vezes_pedido + 1,
+                "quantidade_total": stats.c.quantidade_total + quantity,
+                "score": stats.c.score + weight,
+                "ultimo_pedido_em": ordered_at,
+            },
+        ))
+
+def get_user_favorites(db: Session, user_id: int, limit: int = 5) -> List[models.UserProductStats]:
+    """Produtos favoritos do cliente (mais pedidos, com peso maior para os recentes)."""
+    return db.query(models.UserProductStats)\
+             .filter(models.UserProductStats.usuario_id == user_id)\
+             .options(joinedload(models.UserProductStats.produto))\
+             .order_by(models.UserProductStats.score.desc())\
+             .limit(limit)\
+             .all()
+
 
 def create_order(db: Session, user_id: int, items: List[schemas.OrderItemBase]) -> models.Order:
     """
@@ -137,6 +287,7 @@ def create_order(db: Session, user_id: int, items: List[schemas.OrderItemBase])
             
             # 1. Verifica o estoque
             if product.quantidade_estoque < item.quantidade:
+                ORDER_STOCK_CONFLICTS.inc()
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT, # 409 Conflict
                     detail=f"Estoque insuficiente para '{product.nome}'. " \
@@ -158,9 +309,18 @@ def create_order(db: Session, user_id: int, items: List[schemas.OrderItemBase])
             db.add(db_item)
 
         db_order.total = total
+
+        # Atualiza os favoritos do cliente na mesma transação
+        quantities: Dict[int, int] = {}
+        for item in items:
+            quantities[item.produto_id] = quantities.get(item.produto_id, 0) + item.quantidade
+        _upsert_user_product_stats(db, user_id, quantities, datetime.now(timezone.utc))
         
         # Se tudo deu certo, commita a transação
         db.commit()
+        ORDERS_CREATED.inc()
+        # O estoque mudou: avisa os clientes (juntando com outros pedidos do mesmo produto)
+        menu_cache.mark_dirty(quantities.keys())
         
         # Atualiza a instância do db_order
         db.refresh(db_order)
@@ -174,7 +334,7 @@ def create_order(db: Session, user_id: int, items: List[schemas.OrderItemBase])
         raise e
     except Exception as e:
         db.rollback()
-        print(f"Erro inesperado no banco: {e}")
+        logger.exception("Erro inesperado no banco ao criar pedido", extra={"user_id": user_id})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ocorreu um erro ao processar seu pedido."
@@ -184,6 +344,8 @@ def update_order_status(db: Session, order_id: int, status: models.OrderStatus)
     db_order = get_order_by_id(db, order_id)
     if db_order:
         db_order.status = status
+        # Incremento no próprio UPDATE: duas mudanças simultâneas não geram a mesma versão
+        db_order.versao = models.Order.versao + 1
         db.commit()
         db.refresh(db_order)
     return db_order
\ No newline at end of file
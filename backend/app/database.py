@@ -1,27 +1,308 @@
-from sqlalchemy import create_engine # Importa o módulo para criar a engine de conexão com o banco de dados
+from sqlalchemy import create_engine, event, text # Importa o módulo para criar a engine de conexão com o banco de dados
 from sqlalchemy.ext.declarative import declarative_base # Importa a função para criar classes base de modelos ORM
 from sqlalchemy.orm import sessionmaker # Importa o gerenciador de sessões do SQLAlchemy
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError # Erro lançado quando o pool esgota o pool_timeout
 import os # Importa o módulo para acessar variáveis de ambiente
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv # Importa a função para carregar variáveis de ambiente de um arquivo .env
+from .metrics import DB_POOL_CHECKED_OUT, DB_POOL_CONNECTIONS, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
 # Pega a URL do banco de dados armazenada na variável de ambiente DATABASE_URL
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+# URL opcional de uma réplica somente-leitura (ex: streaming replica do PostgreSQL)
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL")
+
+# --- Configuração do pool de conexões (via variáveis de ambiente) ---
+# Regra prática: (workers do uvicorn) x (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+# deve caber no max_connections do PostgreSQL.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))     # segundos esperando uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))     # segundos até reciclar uma conexão (-1 desliga)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Timeout de statement (ms) aplicado a cada sessão do PostgreSQL. 0 = desligado.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Segundos para abrir uma conexão com o PostgreSQL (connect_timeout do libpq; 0 = sem limite).
+# Sem ele, um banco que não responde (rede caída) prende a thread por minutos.
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# Atraso máximo (s) tolerado na réplica antes de voltar a ler do primário
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "2"))
+# Intervalo (s) entre medições do atraso da réplica
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "1"))
+
+
+def _engine_kwargs(url: str) -> dict:
+    """Monta os argumentos do create_engine de acordo com o banco usado."""
+    kwargs = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if url.startswith("sqlite"):
+        # SQLite (usado em testes locais) não tem statement_timeout e, em memória,
+        # nem usa QueuePool; fica só com as opções comuns.
+        return kwargs
+
+    kwargs.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    if url.startswith("postgresql"):
+        connect_args = {}
+        if DB_CONNECT_TIMEOUT > 0:
+            connect_args["connect_timeout"] = DB_CONNECT_TIMEOUT
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        if connect_args:
+            kwargs["connect_args"] = connect_args
+    return kwargs
+
+
+class PoolMetrics:
+    """
+    Contadores do pool de conexões, alimentados pelos eventos do SQLAlchemy
+    e pelo get_db (que mede quanto tempo cada requisição esperou por uma conexão).
+    Também alimenta as séries coffeenet_db_pool_* do /metrics (rótulo pool=name).
+    """
+
+    def __init__(self, name: str = "primary"):
+        self.name = name
+        self._lock = threading.Lock()
+        self.connects = 0           # Conexões físicas abertas
+        self.checkouts = 0          # Conexões entregues pelo pool
+        self.checkins = 0           # Conexões devolvidas ao pool
+        self.timeouts = 0           # Esperas que estouraram o pool_timeout
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._connects = DB_POOL_CONNECTIONS.labels(name)
+        self._checked_out = DB_POOL_CHECKED_OUT.labels(name)
+        self._timeouts = DB_POOL_TIMEOUTS.labels(name)
+        self._wait = DB_POOL_WAIT.labels(name)
+
+    def on_connect(self, *args):
+        self.incr("connects")
+        self._connects.inc()
+
+    def on_checkout(self, *args):
+        self.incr("checkouts")
+        self._checked_out.inc()
+
+    def on_checkin(self, *args):
+        self.incr("checkins")
+        self._checked_out.dec()
+
+    def on_timeout(self):
+        self.incr("timeouts")
+        self._timeouts.inc()
+
+    def incr(self, attr: str, amount: int = 1):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + amount)
+
+    def observe_wait(self, seconds: float):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_seconds_total += seconds
+            if seconds > self.wait_seconds_max:
+                self.wait_seconds_max = seconds
+        self._wait.observe(seconds)
+
+    def snapshot(self, bind) -> dict:
+        pool = bind.pool
+        with self._lock:
+            data = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "timeouts": self.timeouts,
+                "wait_count": self.wait_count,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+        # Estado atual do pool (nem todo pool implementa todos os métodos)
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            method = getattr(pool, name, None)
+            data[name] = method() if callable(method) else None
+        data["pool_class"] = type(pool).__name__
+        data["pool_timeout"] = getattr(pool, "_timeout", None)
+        data["max_overflow"] = getattr(pool, "_max_overflow", None)
+        return data
+
+
+def _instrument_pool(bind, metrics: PoolMetrics):
+    """Registra os listeners de eventos do pool que alimentam as métricas."""
+    event.listen(bind, "connect", metrics.on_connect)
+    event.listen(bind, "checkout", metrics.on_checkout)
+    event.listen(bind, "checkin", metrics.on_checkin)
+
 
 # Cria a engine de conexão com o banco de dados
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(SQLALCHEMY_DATABASE_URL))
+pool_metrics = PoolMetrics()
+_instrument_pool(engine, pool_metrics)
 
 # Cria uma classe de sessão:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine/sessão de leitura (réplica). Sem DATABASE_READ_URL, tudo vai para o primário.
+if SQLALCHEMY_READ_DATABASE_URL:
+    read_engine = create_engine(SQLALCHEMY_READ_DATABASE_URL, **_engine_kwargs(SQLALCHEMY_READ_DATABASE_URL))
+    read_pool_metrics = PoolMetrics("replica")
+    _instrument_pool(read_engine, read_pool_metrics)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+else:
+    read_engine = None
+    read_pool_metrics = None
+    ReadSessionLocal = None
+
 # Cria a classe base para declarar os modelos ORM
 Base = declarative_base()
 
+# Atraso de replicação em segundos. Réplica em dia (ou um primário) retorna 0.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """
+    Decide se uma leitura pode ir para a réplica.
+    O atraso é medido no máximo a cada DB_REPLICA_LAG_CHECK_INTERVAL segundos;
+    se a réplica estiver atrasada demais (ou fora do ar) as leituras voltam para o primário.
+    """
+
+    def __init__(self, bind, max_lag: float, check_interval: float):
+        self.bind = bind
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.lag_seconds = None     # None = ainda não medido / réplica inacessível
+        self.replica_reads = 0
+        self.primary_fallbacks = 0
+
+    def _measure_lag(self) -> float:
+        if self.bind.dialect.name != "postgresql":
+            # Ex: dois arquivos SQLite em testes locais; não há replicação para medir
+            return 0.0
+        with self.bind.connect() as conn:
+            return float(conn.execute(REPLICA_LAG_QUERY).scalar() or 0.0)
+
+    def current_lag(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self.lag_seconds
+            self._checked_at = now
+        try:
+            lag = self._measure_lag()
+        except Exception as e:
+            logger.warning("Réplica indisponível, usando o primário", extra={"error": str(e)})
+            lag = None
+        self.lag_seconds = lag
+        return lag
+
+    def use_replica(self) -> bool:
+        lag = self.current_lag()
+        healthy = lag is not None and lag <= self.max_lag
+        with self._lock:
+            if healthy:
+                self.replica_reads += 1
+            else:
+                self.primary_fallbacks += 1
+        return healthy
+
+    def stats(self) -> dict:
+        return {
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self.max_lag,
+            "replica_reads": self.replica_reads,
+            "primary_fallbacks": self.primary_fallbacks,
+        }
+
+
+replica_router = ReplicaRouter(read_engine, DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_LAG_CHECK_INTERVAL) if read_engine else None
+
+
+def reset_pools_after_fork():
+    """
+    Com o preload do gunicorn o app é importado antes do fork. Cada worker
+    começa com pools vazios e nunca usa uma conexão aberta por outro processo
+    (close=False: não fecha as do processo pai, só as esquece).
+    """
+    engine.dispose(close=False)
+    if read_engine is not None:
+        read_engine.dispose(close=False)
+
+
+def get_pool_stats() -> dict:
+    """Estatísticas dos pools de conexões (checkouts, espera, overflow...)."""
+    stats = {"primary": pool_metrics.snapshot(engine), "replica": None}
+    if read_engine is not None:
+        stats["replica"] = read_pool_metrics.snapshot(read_engine)
+        stats["replica"].update(replica_router.stats())
+    return stats
+
+
+def _checkout_connection(db, metrics: PoolMetrics):
+    """
+    Pega a conexão do pool logo no início da requisição, medindo o tempo de espera.
+    Sem isso a espera acontece "escondida" na primeira query.
+    """
+    start = time.perf_counter()
+    try:
+        db.connection()
+    except PoolTimeoutError:
+        metrics.on_timeout()
+        raise
+    metrics.observe_wait(time.perf_counter() - start)
+
+
 # Função geradora para fornecer uma sessão de banco de dados
 def get_db():
     db = SessionLocal()
+    try:
+        _checkout_connection(db, pool_metrics)
+        yield db
+    finally:
+        db.close()
+
+
+def _new_read_session():
+    """Sessão na réplica se ela estiver configurada e em dia; senão, no primário."""
+    if replica_router is not None and replica_router.use_replica():
+        return ReadSessionLocal(), read_pool_metrics
+    return SessionLocal(), pool_metrics
+
+
+# Sessão para as consultas somente-leitura (cardápio, fila da cozinha, histórico).
+# NUNCA use para escrita: na réplica o commit falha.
+def get_read_db():
+    db, metrics = _new_read_session()
+    try:
+        _checkout_connection(db, metrics)
+        yield db
+    finally:
+        db.close()
+
+
+@contextmanager
+def read_session():
+    """Versão context manager do get_read_db, para código fora do Depends (ex: o chat)."""
+    db, _ = _new_read_session()
     try:
         yield db
     finally:
@@ -0,0 +1,388 @@
+"""
+Barramento de eventos entre workers.
+
+Com mais de um worker do uvicorn, cada processo tem o seu próprio
+ConnectionManager: uma cozinha conectada no worker A não veria um pedido
+confirmado no worker B. Por isso os routers não falam mais direto com o
+manager; eles publicam um evento no barramento e TODOS os workers (inclusive
+o que publicou) o entregam às suas conexões locais.
+
+Backends:
+- "postgres": LISTEN/NOTIFY no PostgreSQL que já usamos (padrão quando
+  DATABASE_URL é PostgreSQL). Precisa do driver psycopg2.
+- "memory": entrega direto no próprio processo (testes, SQLite, 1 worker).
+
+Retomada: cada evento ganha um número de sequência ("seq") crescente e cada
+worker guarda os últimos EVENT_REPLAY_BUFFER eventos. Um cliente que reconecta
+com ?last_seq=N recebe só o que perdeu; se o buraco for maior que o buffer,
+recebe o estado completo de novo.
+"""
+import abc
+import asyncio
+import itertools
+import logging
+import os
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import orjson
+from sqlalchemy import delete, insert, select, text
+
+from . import models
+from .database import engine
+from .websocket_manager import Topics, encode_message, frame_for_topics, manager
+
+logger = logging.getLogger(__name__)
+
+# Canal do LISTEN/NOTIFY
+EVENT_BUS_CHANNEL = os.getenv("EVENT_BUS_CHANNEL", "coffeenet_events")
+# O NOTIFY aceita no máximo 8000 bytes; acima disso o payload vai para a tabela eventos_payloads
+NOTIFY_MAX_BYTES = 7900
+# Por quanto tempo (s) os payloads grandes ficam guardados na tabela
+PAYLOAD_RETENTION_SECONDS = 300
+# Quantos eventos cada worker guarda para reenviar a quem reconecta
+EVENT_REPLAY_BUFFER = int(os.getenv("EVENT_REPLAY_BUFFER", "1000"))
+# Espera (s) antes de reconectar o LISTEN: dobra a cada falha seguida, até o máximo
+LISTEN_RETRY_MIN = 0.5
+LISTEN_RETRY_MAX = 10
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+async def dispatch_local(event: dict):
+    """Entrega um evento às conexões WebSocket DESTE worker."""
+    frame = event["frame"]
+    if event.get("kitchens"):
+        await manager.broadcast_to_kitchens(frame, event.get("topics"))
+    if event.get("clients"):
+        await manager.broadcast_to_clients(frame)
+    elif event.get("user_id") is not None:
+        await manager.send_to_user(event["user_id"], frame)
+
+
+def make_event(seq: int, message: dict, kitchens: bool, user_id: Optional[int], clients: bool = False,
+               topics: Optional[List[str]] = None) -> dict:
+    """Monta o evento publicado; o frame já leva o seq para o cliente saber onde parou."""
+    return {
+        "seq": seq,
+        "type": message.get("type"),
+        "kitchens": kitchens,
+        "topics": topics,
+        "clients": clients,
+        "user_id": user_id,
+        "frame": encode_message({**message, "seq": seq}),
+    }
+
+
+def _is_for(event: dict, kitchen: bool, user_id: int) -> bool:
+    if kitchen:
+        return event["kitchens"]
+    return event.get("clients") or event["user_id"] == user_id
+
+
+class EventBus(abc.ABC):
+    """Interface comum dos backends (cada um implementa publish_event)."""
+
+    def __init__(self, handler: Handler = dispatch_local, buffer_size: int = EVENT_REPLAY_BUFFER):
+        self.handler = handler
+        self.published = 0
+        self.received = 0
+        # Identifica a sequência; um cliente com seq de outro "stream" recebe o estado completo
+        self.stream_id = ""
+        # Últimos eventos recebidos, em ordem de seq. O histórico é contínuo a partir
+        # de base_seq: todo evento com seq > base_seq está no buffer (ou ainda vai chegar).
+        self.buffer_size = buffer_size
+        self.history: Deque[dict] = deque()
+        self.base_seq: Optional[int] = None
+        self.last_seq: Optional[int] = None
+        self.replays = 0
+        self.snapshot_fallbacks = 0
+        # Recebendo os eventos dos outros workers? (o em memória sempre está)
+        self.listening = True
+        # Callbacks locais por tipo de evento (ex: invalidar o cardápio em cache)
+        self._subscribers: Dict[str, List[Callable[[dict], None]]] = {}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abc.abstractmethod
+    async def publish_event(self, message: dict, kitchens: bool, user_id: Optional[int], clients: bool,
+                            topics: Optional[List[str]]):
+        """Entrega o evento a todos os workers (inclusive este)."""
+
+    async def publish(self, message: dict, kitchens: bool = False, user_id: Optional[int] = None,
+                      clients: bool = False, topics: Optional[List[str]] = None):
+        """
+        Publica uma mensagem em todos os workers, para as cozinhas, para um
+        cliente (user_id) e/ou para todos os clientes (clients=True).
+        topics: categorias do pedido, para rotear às estações da cozinha.
+        """
+        self.published += 1
+        await self.publish_event(message, kitchens, user_id, clients, topics)
+
+    def subscribe(self, event_type: str, callback: Callable[[dict], None]):
+        """Chama callback(evento) neste worker sempre que chegar um evento desse tipo."""
+        self._subscribers.setdefault(event_type, []).append(callback)
+
+    async def _deliver(self, event: dict):
+        self.received += 1
+        self._remember(event)
+        try:
+            for callback in self._subscribers.get(event.get("type"), []):
+                callback(event)
+            await self.handler(event)
+        except Exception as e:
+            logger.error("Erro ao entregar evento", extra={"type": event.get("type"), "error": str(e)})
+
+    # --- Histórico para retomada ---
+    def reset_history(self, base_seq: Optional[int]):
+        """Esquece o histórico; daqui em diante ele é contínuo a partir de base_seq."""
+        self.history.clear()
+        self.base_seq = base_seq
+        self.last_seq = base_seq
+
+    def _remember(self, event: dict):
+        seq = event.get("seq")
+        if seq is None or self.last_seq is None or seq <= self.last_seq:
+            return
+        if len(self.history) >= self.buffer_size:
+            self.base_seq = self.history.popleft()["seq"]
+        self.history.append(event)
+        self.last_seq = seq
+
+    def can_resume(self, after_seq: Optional[int], stream: Optional[str]) -> bool:
+        """
+        True se o buffer tem TUDO o que veio depois de after_seq. Não dá para garantir
+        com buraco maior que o buffer, outro stream, servidor reiniciado...:
+        nesses casos o cliente recebe o estado completo.
+        """
+        return (after_seq is not None and stream == self.stream_id and self.base_seq is not None
+                and self.base_seq <= after_seq <= self.last_seq)
+
+    def missed_frames(self, after_seq: Optional[int], stream: Optional[str], kitchen: bool, user_id: int,
+                      topics: Topics = None) -> Optional[List[str]]:
+        """Frames (já codificados) dos eventos posteriores a after_seq para esse destinatário."""
+        if not self.can_resume(after_seq, stream):
+            return None
+        frames = []
+        for event in self.history:
+            if event["seq"] <= after_seq or not _is_for(event, kitchen, user_id):
+                continue
+            # Estações da cozinha só recebem os itens das suas categorias
+            frame = frame_for_topics(event["frame"], event.get("topics"), topics) if kitchen else event["frame"]
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    def replay_message(self, frames: List[str]) -> str:
+        """Frame "replay" com os eventos perdidos; os frames só são juntados, sem decodificar de novo."""
+        self.replays += 1
+        return '{"type":"replay","seq":%d,"stream":%s,"events":[%s]}' % (
+            self.last_seq, orjson.dumps(self.stream_id).decode(), ",".join(frames),
+        )
+
+    def sync_message(self) -> dict:
+        """Posição atual da sequência, enviada junto com o estado completo."""
+        return {"type": "sync", "seq": self.last_seq, "stream": self.stream_id}
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "received": self.received,
+            "stream": self.stream_id,
+            "last_seq": self.last_seq,
+            "replay_buffer": len(self.history),
+            "replay_buffer_limit": self.buffer_size,
+            "replays": self.replays,
+            "snapshot_fallbacks": self.snapshot_fallbacks,
+        }
+
+
+class InMemoryEventBus(EventBus):
+    """Entrega no próprio processo. Usado em testes e com um único worker."""
+
+    def __init__(self, handler: Handler = dispatch_local, buffer_size: int = EVENT_REPLAY_BUFFER):
+        super().__init__(handler, buffer_size)
+        # A sequência recomeça a cada processo: um stream novo invalida os seq antigos
+        self.stream_id = uuid.uuid4().hex[:12]
+        self._seq = itertools.count(1)
+        self.reset_history(0)
+
+    async def publish_event(self, message: dict, kitchens: bool, user_id: Optional[int], clients: bool,
+                            topics: Optional[List[str]]):
+        await self._deliver(make_event(next(self._seq), message, kitchens, user_id, clients, topics))
+
+
+class PostgresEventBus(EventBus):
+    """
+    LISTEN/NOTIFY do PostgreSQL.
+    O LISTEN usa uma conexão dedicada (fora do pool) lida pelo próprio event
+    loop via add_reader, sem threads. A publicação usa uma conexão do pool.
+
+    O seq vem da sequence eventos_seq e é gerado segurando um advisory lock do
+    canal até o commit: assim a ordem dos seq é a mesma ordem em que os NOTIFY
+    chegam, igual em todos os workers.
+    """
+
+    def __init__(self, bind, channel: str = EVENT_BUS_CHANNEL, handler: Handler = dispatch_local,
+                 buffer_size: int = EVENT_REPLAY_BUFFER):
+        super().__init__(handler, buffer_size)
+        self.bind = bind
+        self.channel = channel
+        self.stream_id = channel
+        self._task: Optional[asyncio.Task] = None
+        self.reconnects = 0
+        self._retry_in = LISTEN_RETRY_MIN
+        # Com o LISTEN ativo (senão este worker perde eventos: ver /readyz)
+        self.listening = False
+
+    async def start(self):
+        self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # --- Publicação ---
+    def _lock(self, conn):
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:channel))"), {"channel": self.channel})
+
+    def _notify(self, message: dict, kitchens: bool, user_id: Optional[int], clients: bool,
+                topics: Optional[List[str]]):
+        with self.bind.begin() as conn:
+            self._lock(conn)
+            seq = conn.execute(text("SELECT nextval('eventos_seq')")).scalar_one()
+            payload = orjson.dumps(make_event(seq, message, kitchens, user_id, clients, topics)).decode()
+            if len(payload.encode()) > NOTIFY_MAX_BYTES:
+                # Grande demais para o NOTIFY: guarda na tabela e notifica só a referência
+                payload_id = conn.execute(
+                    insert(models.EventPayload).values(payload=payload).returning(models.EventPayload.id)
+                ).scalar_one()
+                conn.execute(delete(models.EventPayload).where(
+                    models.EventPayload.created_at < text(f"now() - interval '{PAYLOAD_RETENTION_SECONDS} seconds'")
+                ))
+                payload = orjson.dumps({"ref": payload_id}).decode()
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+
+    async def publish_event(self, message: dict, kitchens: bool, user_id: Optional[int], clients: bool,
+                            topics: Optional[List[str]]):
+        # Roda fora do event loop: é uma ida ao banco
+        await asyncio.to_thread(self._notify, message, kitchens, user_id, clients, topics)
+
+    # --- Recebimento ---
+    def _connect(self):
+        dialect = self.bind.dialect
+        cargs, cparams = dialect.create_connect_args(self.bind.url)
+        conn = dialect.loaded_dbapi.connect(*cargs, **cparams)
+        conn.autocommit = True
+        conn.cursor().execute(f'LISTEN "{self.channel}"')
+        return conn
+
+    def _current_seq(self) -> int:
+        """
+        Último seq já publicado. Lido com o lock do canal (depois do LISTEN):
+        todo evento com seq maior ainda vai chegar por esta conexão.
+        """
+        with self.bind.begin() as conn:
+            self._lock(conn)
+            return conn.execute(text(
+                "SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM eventos_seq"
+            )).scalar_one()
+
+    def _load_payload(self, payload_id: int) -> Optional[str]:
+        with self.bind.connect() as conn:
+            return conn.execute(
+                select(models.EventPayload.payload).where(models.EventPayload.id == payload_id)
+            ).scalar()
+
+    async def _decode(self, raw: str) -> Optional[dict]:
+        data = orjson.loads(raw)
+        if "ref" in data:
+            raw = await asyncio.to_thread(self._load_payload, data["ref"])
+            if raw is None:
+                logger.warning("Evento expirou antes de ser lido", extra={"ref": data["ref"]})
+                return None
+            data = orjson.loads(raw)
+        return data
+
+    async def _listen_once(self):
+        loop = asyncio.get_running_loop()
+        conn = await asyncio.to_thread(self._connect)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def _on_readable():
+            try:
+                conn.poll()
+            except Exception as e:
+                queue.put_nowait(e)
+                return
+            while conn.notifies:
+                queue.put_nowait(conn.notifies.pop(0).payload)
+
+        fd = conn.fileno()
+        loop.add_reader(fd, _on_readable)
+        try:
+            # Eventos podem ter se perdido enquanto estávamos desconectados: o histórico
+            # recomeça daqui (o que chegar com seq menor só é entregue, não guardado)
+            self.reset_history(await asyncio.to_thread(self._current_seq))
+            self.listening = True
+            # Reconectou: a próxima queda volta a esperar pouco
+            self._retry_in = LISTEN_RETRY_MIN
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                event = await self._decode(item)
+                if event is not None:
+                    await self._deliver(event)
+                # Em rajadas chegam dezenas de NOTIFY de uma vez: cede o loop a cada
+                # evento para os writers das conexões esvaziarem as filas
+                await asyncio.sleep(0)
+        finally:
+            self.listening = False
+            loop.remove_reader(fd)
+            conn.close()
+
+    async def _listen_forever(self):
+        while True:
+            try:
+                await self._listen_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.reconnects += 1
+                self.reset_history(None)
+                retry_in = self._retry_in
+                logger.warning("Barramento de eventos desconectado; reconectando", extra={"error": str(e), "retry_in": retry_in})
+                await asyncio.sleep(retry_in)
+                self._retry_in = min(retry_in * 2, LISTEN_RETRY_MAX)
+
+    def stats(self) -> dict:
+        data = super().stats()
+        data["reconnects"] = self.reconnects
+        data["listening"] = self.listening
+        return data
+
+
+def create_event_bus() -> EventBus:
+    backend = os.getenv("EVENT_BUS_BACKEND")
+    if backend is None:
+        backend = "postgres" if engine.dialect.name == "postgresql" else "memory"
+    if backend == "postgres":
+        return PostgresEventBus(engine)
+    if backend == "memory":
+        return InMemoryEventBus()
+    raise ValueError(f"EVENT_BUS_BACKEND inválido: {backend!r} (use 'postgres' ou 'memory')")
+
+
+# Instância global do barramento
+bus = create_event_bus()
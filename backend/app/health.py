@@ -0,0 +1,131 @@
+"""
+Inicialização (aquecimento) e sondas de saúde do backend.
+
+- warm_up() roda no lifespan, antes do worker aceitar conexões: confere a
+  configuração, inicializa o Gemini, abre as conexões do pool do banco,
+  monta o cardápio e o catálogo em cache e cria o cliente HTTP da IA 1.
+  Assim a primeira requisição não paga a inicialização.
+- /healthz (vivo): o processo responde. Não consulta nada.
+- /readyz (pronto): aquecido, banco respondendo, barramento de eventos
+  escutando e sem desligamento em andamento. Senão, 503: o balanceador
+  (ou o healthcheck do compose) não manda tráfego para este worker.
+
+O tempo de cada etapa fica em startup.timings e aparece no /readyz e no log.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from . import auth, database
+from .event_bus import bus
+from .menu_cache import menu
+from .services import gemini_service, nlu_service
+
+logger = logging.getLogger(__name__)
+
+# Conexões do pool abertas no aquecimento (limitado ao DB_POOL_SIZE)
+STARTUP_WARM_CONNECTIONS = int(os.getenv("STARTUP_WARM_CONNECTIONS", "2"))
+# Quanto tempo (s) o /readyz espera pelo banco antes de dar 503
+READY_DB_TIMEOUT = float(os.getenv("READY_DB_TIMEOUT", "2"))
+
+
+def _warm_pool(n: int):
+    """Abre n conexões do pool de uma vez (cada uma faz o connect e o pre-ping)."""
+    connections = []
+    try:
+        for _ in range(n):
+            conn = database.engine.connect()
+            connections.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def _ping_db():
+    with database.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+class Startup:
+
+    def __init__(self):
+        # Importação do app até o início do lifespan (marcada em main.py)
+        self.import_started: Optional[float] = None
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        # Dependências opcionais: sem elas o chat responde com mensagens fixas
+        self.optional: Dict[str, bool] = {}
+        self.warm = False
+        self.shutting_down = False
+        # Consulta do /readyz em andamento (no máximo uma por worker)
+        self._db_ping: Optional[asyncio.Future] = None
+
+    async def _step(self, name: str, coro):
+        start = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            self.errors[name] = str(e)
+            logger.error("Inicialização: falha", extra={"step": name, "error": str(e)})
+            raise
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 3)
+
+    async def warm_up(self):
+        started = time.perf_counter()
+        if self.import_started is not None:
+            self.timings["import"] = round(started - self.import_started, 3)
+        # Configuração faltando: o worker nem sobe
+        auth.check_settings()
+        self.optional["gemini"] = await run_in_threadpool(gemini_service.init)
+        self.timings["gemini"] = round(time.perf_counter() - started, 3)
+        await self._step("nlu_client", nlu_service.start())
+        # Banco fora do ar não impede a subida: o /readyz fica em 503 até ele voltar
+        try:
+            warm = min(STARTUP_WARM_CONNECTIONS, database.DB_POOL_SIZE)
+            await self._step("db_pool", run_in_threadpool(_warm_pool, warm))
+            await self._step("menu_cache", run_in_threadpool(menu.menu_frame))
+            await self._step("catalog_cache", run_in_threadpool(menu.catalog))
+        except Exception:
+            pass
+        # A IA 1 é outro serviço: só registra se ela já está pronta
+        self.optional["nlu"] = await nlu_service.check()
+        self.timings["startup"] = round(time.perf_counter() - started, 3)
+        self.warm = True
+        total = self.timings["startup"] + self.timings.get("import", 0)
+        logger.info("Backend pronto", extra={"seconds": round(total, 3), "timings": self.timings, "optional": self.optional})
+
+    async def _check_db(self) -> bool:
+        """
+        O wait_for desiste de esperar, mas não solta a thread presa no banco.
+        Por isso, enquanto uma consulta não termina, as sondas seguintes esperam
+        por ela em vez de ocupar mais uma thread do threadpool cada.
+        """
+        if self._db_ping is None or self._db_ping.done():
+            self._db_ping = asyncio.ensure_future(run_in_threadpool(_ping_db))
+        try:
+            await asyncio.wait_for(asyncio.shield(self._db_ping), timeout=READY_DB_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def readiness(self) -> Dict[str, object]:
+        checks: Dict[str, object] = {
+            "warm": self.warm,
+            "shutting_down": self.shutting_down,
+            "event_bus": bus.listening,
+        }
+        checks["database"] = await self._check_db()
+        ready = checks["warm"] and not checks["shutting_down"] and checks["event_bus"] and checks["database"]
+        return {"ready": ready, "checks": checks, "optional": self.optional,
+                "timings": self.timings, "errors": self.errors}
+
+
+# Estado global da inicialização deste worker
+startup = Startup()
@@ -1,26 +1,70 @@
+# Início da importação do app (tempo de cold start: ver health.py)
+import time
+_import_started = time.perf_counter()
+
 # Bibliotecas para autenticação JWT (JSON Web Token)
 from jose import JWTError, jwt
 
 # FastAPI e funcionalidades relacionadas a WebSocket
-from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session # Sessão ORM do SQLAlchemy
+from coffeenet_common import admin, logs, profiler
 
 # Importações de módulos internos da aplicação
 from . import crud
-from . import models, database, auth, schemas
+from . import models, database, auth, schemas, rate_limit, metrics
 from .database import engine
 from .routers import users, orders, products
-from .websocket_manager import manager
+from .websocket_manager import Topics, encode_message, filter_order, manager, order_topics, parse_topics
+from .event_bus import bus
+from .menu_cache import menu
+from .health import startup
+from .services import nlu_service
 from starlette import status
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from typing import List, Optional
 import json
+import logging
+
+# Logs estruturados (LOG_LEVEL, LOG_FORMAT; ver coffeenet_common/logs.py)
+logs.setup()
+logger = logging.getLogger(__name__)
+
+# As tabelas NÃO são mais criadas aqui: o esquema é versionado com Alembic
+# (backend/migrations) e aplicado com "alembic upgrade head" antes de subir o servidor.
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.import_started = _import_started
+    # Pools do banco próprios deste worker (preload do gunicorn: ver gunicorn.conf.py)
+    database.reset_pools_after_fork()
+    # Começa a escutar os eventos publicados por todos os workers
+    await bus.start()
+    # Pings periódicos e limpeza das conexões caladas
+    manager.start_heartbeat()
+    # Publica as alterações de produtos (menu_delta) em lotes
+    menu.start()
+    # Invalidações do cache de usuários (crud, no threadpool) vão para os outros workers
+    auth.principals.start()
+    # Aquece banco, caches e clientes antes de aceitar conexões (ver health.py)
+    await startup.warm_up()
+    # kill -USR2 <pid do worker>: perfil de alguns segundos (com PROFILE_TOKEN; ver coffeenet_common/profiler.py)
+    profiler.install_signal_handler()
+    yield
+    # Sai do balanceamento (/readyz -> 503) e fecha os WebSockets que ainda
+    # restarem (em produção o app.server já drenou antes do uvicorn derrubá-los)
+    startup.shutting_down = True
+    await manager.drain()
+    await menu.stop()
+    await manager.stop_heartbeat()
+    await bus.stop()
+    await nlu_service.stop()
 
-# Cria todas as tabelas no banco de dados (para desenvolvimento)
-# Em produção, você usaria Alembic para migrações.
-models.Base.metadata.create_all(bind=engine)
 
 # Criação da instância principal do FastAPI
-app = FastAPI(title="CoffeeNet Backend Principal")
+app = FastAPI(title="CoffeeNet Backend Principal", lifespan=lifespan)
 
 # Configuração do CORS (Cross-Origin Resource Sharing)
 # Permite que qualquer frontend acesse a API
@@ -31,11 +75,16 @@ app.add_middleware(
     allow_methods=["*"],       # Permite todos os métodos HTTP (GET, POST, etc.)   
     allow_headers=["*"],       # Permite todos os cabeçalhos
 )
+# Perfil de uma requisição com X-Profile-Token (ou de uma fração delas; ver coffeenet_common/profiler.py)
+app.add_middleware(profiler.ProfilerMiddleware)
+# Latência por rota (histograma do /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Inclui as rotas de API
 app.include_router(users.router)
 app.include_router(orders.router)
 app.include_router(products.router)
+app.include_router(admin.router)
 
 
 # Endpoint raiz para testar se o backend está online
@@ -44,85 +93,234 @@ def read_root():
     return {"Status": "CoffeeNet Backend Principal está online!"}
 
 
+# Vivo: o processo responde (não consulta nada)
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+# Pronto para receber tráfego: aquecido, banco e barramento ok (ver health.py)
+@app.get("/readyz")
+async def readyz(response: Response):
+    result = await startup.readiness()
+    if not result["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return result
+
+
+# Métricas no formato do Prometheus (latências, IAs, pool, WebSocket, pedidos; ver metrics.py)
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+# Estatísticas do pool de conexões com o banco (para dimensionar DB_POOL_SIZE x workers)
+@app.get("/metrics/pool")
+def read_pool_metrics():
+    return database.get_pool_stats()
+
+
+# Estado das conexões WebSocket (profundidade das filas e conexões derrubadas)
+@app.get("/metrics/ws")
+def read_ws_metrics():
+    return {**manager.stats(), "event_bus": bus.stats(), "menu": menu.stats()}
+
+
+# Cache de usuários autenticados (acertos = requisições sem ida ao banco)
+@app.get("/metrics/auth")
+def read_auth_metrics():
+    return auth.principals.stats()
+
+
+# Limitadores (fichas e filas) das rotas caras: recusas com 429/503
+@app.get("/metrics/limits")
+def read_limit_metrics():
+    return {
+        "chat": rate_limit.chat.stats(),
+        "login": auth.login_gate.stats(),
+        "ws_get_order": rate_limit.ws_get_order.stats(),
+    }
+
+
+# Tentativas de montar um snapshot que emende com o buffer do barramento antes
+# de desistir e fechar com 1013 (o cliente reconecta)
+SNAPSHOT_ATTEMPTS = 3
+
+
+def _load_snapshot(role: str, user_id: int, reconnect: bool, topics: Topics = None) -> List[str]:
+    """
+    Mensagens do estado completo, já codificadas, lidas numa sessão curta
+    (roda no threadpool). Lê do primário: o snapshot vai junto com o seq do
+    "sync", e o que já saiu no barramento (seq <= sync) e a réplica ainda não
+    tem não estaria nele nem seria reenviado depois.
+    """
+    messages = []
+    if role == "cliente":
+        # Cardápio: o mesmo frame, montado uma vez por worker, serve a todos os clientes
+        messages.append(menu.menu_frame())
+
+    with database.SessionLocal() as read_db:
+        # (Apenas para Cliente) Pedidos ativos
+        if role == "cliente":
+            orders_data = crud.get_active_orders_by_user_data(read_db, user_id=user_id)
+
+            # Envia pedidos ativos do cliente (se houver; numa reconexão, sempre,
+            # para limpar pedidos que sumiram enquanto estava fora)
+            if orders_data or reconnect:
+                messages.append(encode_message({
+                    "type": "active_orders", # Novo tipo de mensagem
+                    "data": orders_data
+                }))
+
+        # (Apenas para Cozinha) Pedidos ativos atuais
+        if role == "cozinheiro":
+            orders_data = crud.get_active_orders_data(read_db)
+            if topics is not None:
+                # Estação: só os pedidos (e itens) das categorias assinadas
+                orders_data = [filter_order(o, topics) for o in orders_data if topics.intersection(order_topics(o))]
+            messages.append(encode_message({
+                "type": "initial_state",
+                "data": orders_data
+            }))
+    return messages
+
+
+def _load_order(order_id: int, user_id: int, kitchen: bool, topics: Topics):
+    """
+    Pedido completo para quem recebeu um status_update compacto de um pedido
+    que não conhecia (roda no threadpool). Lê do primário: o pedido pode ser
+    novo demais para a réplica. Cliente só vê os próprios pedidos.
+    """
+    with database.SessionLocal() as db:
+        order_data = crud.get_order_data(db, order_id)
+    if order_data is None or (not kitchen and order_data["usuario_id"] != user_id):
+        return None
+    if topics is not None:
+        if not topics.intersection(order_topics(order_data)):
+            return None
+        order_data = filter_order(order_data, topics)
+    return order_data
+
+
+async def _handle_client_message(connection, text: str, kitchen: bool, get_order_bucket: rate_limit.TokenBucket):
+    """Mensagens vindas do navegador: "pong" (heartbeat) e "get_order"."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(message, dict) or message.get("type") != "get_order":
+        return
+    try:
+        order_id = int(message.get("id"))
+    except (TypeError, ValueError):
+        return
+    # Cada get_order é uma ida ao banco: um cliente em loop espera pelas fichas
+    await rate_limit.ws_get_order.pace(get_order_bucket)
+    order_data = await run_in_threadpool(_load_order, order_id, connection.user_id, kitchen, connection.topics)
+    if order_data is not None:
+        await manager.send_personal(connection, {"type": "order", "data": order_data})
+
+
 # Endpoint WebSocket para comunicação em tempo real
 @app.websocket("/ws/{token}")
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str,
-    db: Session = Depends(database.get_db) # Fornece sessão do DB automaticamente
+    last_seq: Optional[int] = None, # Último seq recebido (reconexão)
+    stream: Optional[str] = None,   # Stream desse seq (vem na mensagem "sync"/"replay")
+    topics: Optional[str] = None,   # Cozinha: categorias da estação, ex: "Bebidas,Doces" (vazio = todas)
 ):
     """
     Endpoint WebSocket.
     Espera um token JWT como parte da URL para autenticação.
+    Ao reconectar, o cliente manda ?last_seq=N&stream=S e recebe só os eventos
+    que perdeu (mensagem "replay"); se não der, recebe o estado completo de novo.
+    Uma estação da cozinha (ex: o bar) pode mandar ?topics=Bebidas para receber
+    só os pedidos, e os itens, dessas categorias.
+
+    O banco só é usado no começo (autenticação e snapshot), em sessões curtas:
+    um socket aberto não segura conexão do pool.
     """
-    user = None
+    # Worker desligando: o cliente reconecta em outro
+    if manager.draining:
+        await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+        return
+
+    # 1. Autentica o usuário usando o token
     try:
-        # 1. Autentica o usuário usando o token
         payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub") # "sub" geralmente contém o identificador do usuário
-        if email is None:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-        
-        # Busca o usuário no banco de dados pelo email
-        user = crud.get_user_by_email(db, email=email)
-        if user is None:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-            
-        user_id = user.id
-        role = user.cargo.value # Obtém a função do usuário (cliente, cozinheiro, etc.)
-        
-        # 2. Adiciona o usuário ao gerenciador de conexões
-        await manager.connect(websocket, user_id, role)
-        print(f"WS Connect: User {user_id} ({role})")
-
-        # 2.5 (Apenas para Cliente) Envia o cardápio inicial
-        if role == "cliente":
-            # Envia o cardápio
-            products = crud.get_products(db) 
-            menu_data = [schemas.Product.model_validate(p).model_dump(mode='json') for p in products] 
-            await websocket.send_json({
-                "type": "menu",
-                "data": menu_data
-            })
-            
-            # Envia pedidos ativos do cliente (se houver)
-            active_client_orders = crud.get_active_orders_by_user(db, user_id=user_id)
-            if active_client_orders: # Só envia se tiver algum
-                orders_data = [schemas.Order.model_validate(o).model_dump(mode='json') for o in active_client_orders]
-                await websocket.send_json({
-                    "type": "active_orders", # Novo tipo de mensagem
-                    "data": orders_data
-                })
-
-        # 3. (Apenas para Cozinha) Envia os pedidos ativos atuais
-        if role == "cozinheiro":
-            active_orders = crud.get_active_orders(db)
-            orders_data = [schemas.Order.model_validate(o).model_dump(mode='json') for o in active_orders]
-            await websocket.send_json({
-                "type": "initial_state",
-                "data": orders_data
-            })
-
-        # 4. Mantém a conexão viva
-        try:
-            while True:
-                # Recebe qualquer mensagem enviada pelo cliente
-                await websocket.receive_text()
-                
-        except WebSocketDisconnect:
-            # Caso o cliente desconecte, remove do gerenciador
-            print(f"WS Disconnect: User {user_id} ({role})")
-            if user:
-                manager.disconnect(websocket, user_id, role)
-
-    except (JWTError, AttributeError):
+    except JWTError:
         # Caso o token seja inválido ou falhe a autenticação
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        if user and user_id and role:
-            manager.disconnect(websocket, user_id, role)
+        return
+    email: str = payload.get("sub") # "sub" geralmente contém o identificador do usuário
+    if email is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # Busca o usuário pelo email (cache de usuários autenticados ou banco)
+    user = await auth.get_principal(email, payload.get("exp"))
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user_id, role = user.id, user.cargo.value # role: função do usuário (cliente, cozinheiro, etc.)
+    kitchen = role == "cozinheiro"
+    station = parse_topics(topics) if kitchen else None
+
+    await websocket.accept()
+
+    # 2. Reconexão: se o buffer do barramento tem tudo o que o cliente perdeu,
+    # manda só isso. Senão, monta o estado completo.
+    snapshot = None
+    if bus.can_resume(last_seq, stream):
+        missed = bus.missed_frames(last_seq, stream, kitchen, user_id, station)
+    else:
+        if last_seq is not None:
+            bus.snapshot_fallbacks += 1
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            # Posição da sequência ANTES do snapshot: o que chegar durante a leitura
+            # sai do buffer logo depois (aplicar de novo no frontend é inofensivo)
+            sync = bus.sync_message()
+            snapshot = await run_in_threadpool(_load_snapshot, role, user_id, last_seq is not None, station)
+            if sync["seq"] is None:
+                # Barramento sem sequência (ainda): não há o que repetir
+                missed = []
+                break
+            missed = bus.missed_frames(sync["seq"], sync["stream"], kitchen, user_id, station)
+            if missed is not None:
+                break
+            # Durante a leitura passaram mais eventos do que cabem no buffer (ou o
+            # stream mudou): o snapshot já não emenda com o barramento
+        else:
+            logger.warning("Snapshot sem emenda com o barramento", extra={"user_id": user_id, "role": role})
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return
+        snapshot.append(encode_message(sync))
+
+    # 3. Adiciona o usuário ao gerenciador de conexões e enfileira o estado inicial.
+    # Desde o cálculo de missed até o fim do bloco não há await: nenhum evento
+    # novo passa na frente (cada conexão ganha uma fila de saída própria; os
+    # envios abaixo só enfileiram)
+    connection = manager.connect(websocket, user_id, role, topics=station)
+    logger.debug("WS conectado", extra={"user_id": user_id, "role": role})
+    if snapshot is None:
+        await manager.send_personal(connection, bus.replay_message(missed))
+    else:
+        for frame in snapshot + missed:
+            await manager.send_personal(connection, frame)
+
+    # 4. Mantém a conexão viva
+    get_order_bucket = rate_limit.ws_get_order.bucket()
+    try:
+        while True:
+            # Recebe qualquer mensagem enviada pelo cliente (inclusive o "pong" do heartbeat)
+            text = await websocket.receive_text()
+            connection.touch()
+            await _handle_client_message(connection, text, kitchen, get_order_bucket)
+
+    except (WebSocketDisconnect, RuntimeError):
+        # Caso o cliente desconecte (ou a conexão tenha sido derrubada pelo servidor)
+        logger.debug("WS desconectado", extra={"user_id": user_id, "role": role})
     finally:
-        # Garante que a sessão do banco de dados seja fechada
-        if 'db' in locals() and db:
-            db.close()
\ No newline at end of file
+        manager.disconnect(websocket, user_id, role)
@@ -0,0 +1,190 @@
+"""
+Cardápio compartilhado e atualizações incrementais (menu_delta).
+
+- O cardápio que o cliente recebe ao conectar no WebSocket é montado uma vez
+  por worker e o mesmo frame (já codificado) serve a todas as conexões, até
+  ser invalidado.
+- As escritas de produto no crud (estoque, edição, promoção...) só marcam os
+  ids alterados com mark_dirty(). Uma task por worker junta as marcações a
+  cada MENU_DELTA_DEBOUNCE segundos e publica UM "menu_delta" no barramento
+  com o estado atual desses produtos: dez pedidos seguidos do mesmo café viram
+  uma mensagem só.
+- Todo worker que recebe um menu_delta invalida o seu cardápio em cache.
+- O catálogo completo da cozinha (GET /products/) também fica em cache, já
+  serializado, com um ETag que é o hash do conteúdo: o mesmo em todos os
+  workers. O painel que consulta de novo com If-None-Match recebe 304 sem
+  ir ao banco.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import orjson
+
+from . import crud, database
+from .event_bus import bus
+from .websocket_manager import encode_message
+
+logger = logging.getLogger(__name__)
+
+# Janela (s) em que as alterações de produtos são juntadas num único menu_delta
+MENU_DELTA_DEBOUNCE = float(os.getenv("MENU_DELTA_DEBOUNCE", "0.5"))
+
+
+class MenuCache:
+
+    def __init__(self, debounce: float = MENU_DELTA_DEBOUNCE):
+        self.debounce = debounce
+        # mark_dirty é chamado pelo crud, que roda no threadpool
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._dirty: Set[int] = set()
+        # "menu" (frame do WebSocket) e "catalog" (corpo e ETag do GET /products/)
+        self._cached: Dict[str, object] = {}
+        # Muda a cada invalidação: um snapshot montado antes dela não é guardado
+        self._generation = 0
+        self._task: Optional[asyncio.Task] = None
+        # Métricas
+        self.marks = 0
+        self.deltas_published = 0
+        self.builds: Dict[str, int] = {"menu": 0, "catalog": 0}
+        self.hits: Dict[str, int] = {"menu": 0, "catalog": 0}
+
+    def _get_or_build(self, name: str, build: Callable[[], object]):
+        cached = self._cached.get(name)
+        if cached is not None:
+            self.hits[name] += 1
+            return cached
+        # Só uma thread monta; as outras esperam e reaproveitam
+        with self._build_lock:
+            cached = self._cached.get(name)
+            if cached is not None:
+                self.hits[name] += 1
+                return cached
+            generation = self._generation
+            value = build()
+            self.builds[name] += 1
+            with self._lock:
+                if generation == self._generation:
+                    self._cached[name] = value
+            return value
+
+    # --- Cardápio completo (conexão do WebSocket) ---
+    def menu_frame(self) -> str:
+        """Mensagem "menu" já codificada. Bloqueia (consulta o banco): chame no threadpool."""
+        return self._get_or_build("menu", self._build_menu_frame)
+
+    def _build_menu_frame(self) -> str:
+        # Lê do primário: o cache é refeito logo depois de um menu_delta, e um
+        # menu lido da réplica atrasada ficaria guardado sem a alteração (que os
+        # clientes novos nunca recebem)
+        with database.SessionLocal() as db:
+            return encode_message({
+                "type": "menu",
+                "data": crud.get_products_data(db)
+            })
+
+    # --- Catálogo completo da cozinha (GET /products/) ---
+    def catalog(self) -> Tuple[str, bytes]:
+        """(ETag, corpo JSON) de todos os produtos, inclusive sem estoque. Bloqueia: chame no threadpool."""
+        return self._get_or_build("catalog", self._build_catalog)
+
+    def _build_catalog(self) -> Tuple[str, bytes]:
+        # Lê do primário: logo depois de uma invalidação a réplica pode ainda não
+        # ter a escrita, e o catálogo antigo ficaria em cache (com o ETag antigo)
+        with database.SessionLocal() as db:
+            body = orjson.dumps(crud.get_products_data(db, only_in_stock=False))
+        # Hash do conteúdo: igual em todos os workers enquanto o catálogo não muda
+        return f'"{hashlib.sha256(body).hexdigest()[:32]}"', body
+
+    def invalidate(self, event: Optional[dict] = None):
+        with self._lock:
+            self._generation += 1
+            self._cached.clear()
+
+    # --- Alterações incrementais ---
+    def mark_dirty(self, product_ids: Iterable[int]):
+        with self._lock:
+            for product_id in product_ids:
+                self._dirty.add(product_id)
+                self.marks += 1
+        # Este worker já descarta o cache (a cozinha que editou vê na hora);
+        # os outros descartam quando o menu_delta chegar
+        self.invalidate()
+
+    def _take_dirty(self) -> List[int]:
+        with self._lock:
+            product_ids = sorted(self._dirty)
+            self._dirty.clear()
+        return product_ids
+
+    def _load_delta(self, product_ids: List[int]) -> dict:
+        # Lê do primário: a escrita acabou de acontecer e a réplica pode não ter visto
+        with database.SessionLocal() as db:
+            products = crud.get_products_data_by_ids(db, product_ids)
+            # O cliente só vê produtos com estoque (ver crud.get_products)
+            updated = [p for p in products if p["quantidade_estoque"] > 0]
+        in_menu = {p["id"] for p in updated}
+        return {
+            "type": "menu_delta",
+            "data": {
+                "updated": updated,
+                "removed": [product_id for product_id in product_ids if product_id not in in_menu],
+            }
+        }
+
+    async def flush(self):
+        """Publica as alterações acumuladas (se houver) num único menu_delta."""
+        product_ids = self._take_dirty()
+        if not product_ids:
+            return
+        message = await asyncio.to_thread(self._load_delta, product_ids)
+        await bus.publish(message, clients=True)
+        self.deltas_published += 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.debounce)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Erro ao publicar menu_delta", extra={"error": str(e)})
+
+    def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Não perde as últimas alterações ao desligar
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "marks": self.marks,
+            "pending": len(self._dirty),
+            "deltas_published": self.deltas_published,
+            "snapshot_builds": self.builds["menu"],
+            "snapshot_hits": self.hits["menu"],
+            "catalog_builds": self.builds["catalog"],
+            "catalog_hits": self.hits["catalog"],
+            "debounce_seconds": self.debounce,
+        }
+
+
+# Instância global do cardápio em cache
+menu = MenuCache()
+# Qualquer worker que publicar um menu_delta invalida o cache de todos
+bus.subscribe("menu_delta", menu.invalidate)
+
+
+def mark_dirty(product_ids: Iterable[int]):
+    """Marca produtos alterados; chamado pelo crud depois do commit."""
+    menu.mark_dirty(product_ids)
@@ -0,0 +1,76 @@
+"""
+Métricas no formato do Prometheus (GET /metrics).
+
+Os endpoints /metrics/pool, /metrics/ws... continuam com o detalhe em JSON do
+worker que respondeu; aqui ficam as séries para o Prometheus coletar e somar:
+
+- http_request_duration_seconds{method, route, status}: por rota (o caminho
+  com os parâmetros, ex: /orders/{order_id}/status), medida pelo middleware
+  de coffeenet_common.metrics (o mesmo da IA 1)
+- coffeenet_nlu_request_duration_seconds{outcome}: chamadas à IA 1
+- coffeenet_gemini_request_duration_seconds{outcome} e
+  coffeenet_gemini_fallbacks_total{reason}: chamadas ao Gemini e as respostas
+  fixas usadas no lugar (sem modelo ou com erro)
+- coffeenet_db_pool_*: conexões abertas/em uso, espera por conexão e timeouts
+- coffeenet_ws_connections{role} e coffeenet_ws_broadcast_duration_seconds{target}
+- coffeenet_orders_created_total e coffeenet_order_stock_conflicts_total
+
+Com vários workers (gunicorn), cada um tem os seus contadores; para o /metrics
+somar todos, defina PROMETHEUS_MULTIPROC_DIR (um diretório vazio a cada
+subida; o start.sh e o gunicorn.conf.py cuidam disso).
+"""
+# Reexportados: o main.py e o gunicorn.conf.py usam metrics.render etc.
+from coffeenet_common.metrics import (
+    HTTP_REQUEST_DURATION,
+    MetricsMiddleware,
+    mark_process_dead,
+    render,
+)
+from prometheus_client import Counter, Gauge, Histogram
+
+# Chamadas externas: de milissegundos a alguns segundos
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Broadcast só enfileira (ver websocket_manager): microssegundos
+FANOUT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+
+NLU_REQUEST_DURATION = Histogram(
+    "coffeenet_nlu_request_duration_seconds", "Chamadas à IA 1 (NLU).",
+    ["outcome"], buckets=LATENCY_BUCKETS,
+)
+
+GEMINI_REQUEST_DURATION = Histogram(
+    "coffeenet_gemini_request_duration_seconds", "Chamadas ao Gemini (IA 2).",
+    ["outcome"], buckets=LATENCY_BUCKETS,
+)
+GEMINI_FALLBACKS = Counter(
+    "coffeenet_gemini_fallbacks_total", "Respostas fixas no lugar do Gemini.", ["reason"],
+)
+
+DB_POOL_CONNECTIONS = Counter(
+    "coffeenet_db_pool_connects_total", "Conexões físicas abertas com o banco.", ["pool"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "coffeenet_db_pool_checked_out", "Conexões do pool em uso agora.", ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "coffeenet_db_pool_wait_seconds", "Espera por uma conexão livre do pool.", ["pool"],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "coffeenet_db_pool_timeouts_total", "Esperas que estouraram o DB_POOL_TIMEOUT.", ["pool"],
+)
+
+WS_CONNECTIONS = Gauge(
+    "coffeenet_ws_connections", "Conexões WebSocket abertas.", ["role"],
+    multiprocess_mode="livesum",
+)
+WS_BROADCAST_DURATION = Histogram(
+    "coffeenet_ws_broadcast_duration_seconds", "Tempo para enfileirar um evento para todos os destinatários.",
+    ["target"], buckets=FANOUT_BUCKETS,
+)
+
+ORDERS_CREATED = Counter("coffeenet_orders_created_total", "Pedidos criados.")
+ORDER_STOCK_CONFLICTS = Counter(
+    "coffeenet_order_stock_conflicts_total", "Pedidos recusados por falta de estoque (409).",
+)
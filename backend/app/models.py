@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Enum, Index, Sequence, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -51,18 +51,73 @@ class Order(Base):
     status = Column(Enum(OrderStatus), default=OrderStatus.RECEBIDO)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     total = Column(Float, default=0.0)
+    # Incrementada a cada mudança de status: o frontend descarta atualizações velhas
+    versao = Column(Integer, nullable=False, default=1, server_default="1")
     
     usuario = relationship("User", back_populates="pedidos")
     itens = relationship("OrderItem", back_populates="pedido")
 
+    __table_args__ = (
+        # Histórico do cliente: WHERE usuario_id = ? ORDER BY created_at DESC
+        Index("ix_pedidos_usuario_created_at", "usuario_id", "created_at"),
+        # Fila da cozinha: índice parcial só com os pedidos ativos (poucos),
+        # já na ordem de created_at. O IN precisa ser igual ao de crud.get_active_orders.
+        Index(
+            "ix_pedidos_ativos_created_at", "created_at",
+            postgresql_where=status.in_([OrderStatus.RECEBIDO, OrderStatus.EM_PRODUCAO]),
+            sqlite_where=status.in_([OrderStatus.RECEBIDO, OrderStatus.EM_PRODUCAO]),
+        ),
+    )
+
 class OrderItem(Base):
     __tablename__ = "itens_pedido"
     id = Column(Integer, primary_key=True, index=True)
-    pedido_id = Column(Integer, ForeignKey("pedidos.id"))
+    pedido_id = Column(Integer, ForeignKey("pedidos.id"), index=True)
     produto_id = Column(Integer, ForeignKey("produtos.id"))
     quantidade = Column(Integer, nullable=False)
     # Requisito: "congelar" o preço no momento da compra
     preco_no_momento = Column(Float, nullable=False)
     
     pedido = relationship("Order", back_populates="itens")
-    produto = relationship("Product")
\ No newline at end of file
+    produto = relationship("Product")
+
+class UserProductStats(Base):
+    """
+    Agregado incremental "cliente x produto", atualizado por crud.create_order.
+    Substitui o recálculo dos favoritos a partir dos últimos pedidos.
+    """
+    __tablename__ = "user_product_stats"
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    vezes_pedido = Column(Integer, nullable=False, default=0)      # Nº de pedidos com o produto
+    quantidade_total = Column(Integer, nullable=False, default=0)  # Soma das quantidades
+    # Contagem com decaimento temporal (pedidos recentes pesam mais). Ver crud.favorite_weight.
+    score = Column(Float, nullable=False, default=0.0)
+    ultimo_pedido_em = Column(DateTime(timezone=True))
+
+    produto = relationship("Product")
+
+    __table_args__ = (
+        # Favoritos do cliente: WHERE usuario_id = ? ORDER BY score DESC LIMIT n
+        Index("ix_user_product_stats_usuario_score", "usuario_id", "score"),
+    )
+
+
+class EventPayload(Base):
+    """Payloads de eventos grandes demais para o NOTIFY do PostgreSQL (ver event_bus.py)."""
+    __tablename__ = "eventos_payloads"
+    id = Column(Integer, primary_key=True)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+
+class RateLimitBucket(Base):
+    """Baldes de fichas do limitador compartilhados pelos workers (RATE_LIMIT_BACKEND=postgres, ver rate_limit.py)."""
+    __tablename__ = "rate_limit_buckets"
+    chave = Column(String, primary_key=True)
+    fichas = Column(Float, nullable=False)
+    atualizado_em = Column(Float, nullable=False)  # epoch em segundos
+
+
+# Números de sequência dos eventos WebSocket (só no PostgreSQL; ver event_bus.py)
+eventos_seq = Sequence("eventos_seq", metadata=Base.metadata)
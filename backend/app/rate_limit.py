@@ -0,0 +1,292 @@
+"""
+Controle de admissão das rotas caras (hoje: /orders/chat, que chama a NLU,
+consulta o banco e chama o Gemini, e o get_order do WebSocket, que consulta
+o banco).
+
+- Token bucket por usuário e global: cada chamada gasta uma ficha; as fichas
+  voltam a uma taxa fixa até o limite (rajada). Sem ficha -> 429 na hora, com
+  Retry-After dizendo quando volta a ter.
+- Limite de chamadas em andamento por worker (AdmissionGate): as excedentes
+  esperam numa fila; se a espera passar do limite -> 503 com Retry-After.
+
+As fichas ficam em memória (por worker) ou, com RATE_LIMIT_BACKEND=postgres,
+numa tabela compartilhada por todos os workers (ver migração 0007).
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from .database import engine
+
+# Chat: fichas por segundo e rajada, por usuário e somando todos os usuários (por worker
+# no backend "memory"; no cluster inteiro no "postgres")
+CHAT_RATE_PER_USER = float(os.getenv("CHAT_RATE_PER_USER", "0.5"))
+CHAT_BURST_PER_USER = float(os.getenv("CHAT_BURST_PER_USER", "5"))
+CHAT_RATE_GLOBAL = float(os.getenv("CHAT_RATE_GLOBAL", "10"))
+CHAT_BURST_GLOBAL = float(os.getenv("CHAT_BURST_GLOBAL", "20"))
+# Chats em andamento por worker e espera máxima (s) na fila
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "2"))
+# get_order pelo WebSocket: consultas por segundo e rajada, por conexão
+WS_GET_ORDER_RATE = float(os.getenv("WS_GET_ORDER_RATE", "5"))
+WS_GET_ORDER_BURST = float(os.getenv("WS_GET_ORDER_BURST", "20"))
+
+
+def _refill(tokens: float, elapsed: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(elapsed, 0) * rate)
+
+
+def _wait_for_token(tokens: float, rate: float) -> float:
+    """Segundos até o balde ter uma ficha inteira."""
+    return (1 - tokens) / rate if rate > 0 else math.inf
+
+
+class MemoryBucketStore:
+    """Baldes em memória, por worker."""
+
+    def __init__(self):
+        # Chamado pelo event loop; o lock deixa usar também do threadpool
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # chave -> (fichas, instante)
+
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        """Tenta gastar uma ficha. Retorna (permitido, segundos até a próxima ficha)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, now - updated_at, rate, burst)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return allowed, 0.0 if allowed else _wait_for_token(tokens, rate)
+
+
+class PostgresBucketStore:
+    """
+    Baldes na tabela rate_limit_buckets, compartilhados por todos os workers.
+    Uma ida ao banco por chamada permitida (um upsert atômico); a recusada faz
+    mais uma leitura para calcular o Retry-After.
+    """
+
+    _TAKE = text("""
+        INSERT INTO rate_limit_buckets AS b (chave, fichas, atualizado_em)
+        VALUES (:key, :burst - 1, :now)
+        ON CONFLICT (chave) DO UPDATE
+        SET fichas = LEAST(:burst, b.fichas + GREATEST(:now - b.atualizado_em, 0) * :rate) - 1,
+            atualizado_em = :now
+        WHERE LEAST(:burst, b.fichas + GREATEST(:now - b.atualizado_em, 0) * :rate) >= 1
+        RETURNING b.fichas
+    """)
+    _PEEK = text("SELECT fichas, atualizado_em FROM rate_limit_buckets WHERE chave = :key")
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        # Relógio de parede: todos os workers precisam medir o tempo do mesmo jeito
+        now = time.time()
+        with self.engine.begin() as conn:
+            if conn.execute(self._TAKE, {"key": key, "rate": rate, "burst": burst, "now": now}).first():
+                return True, 0.0
+            row = conn.execute(self._PEEK, {"key": key}).first()
+        tokens = _refill(row.fichas, now - row.atualizado_em, rate, burst) if row else burst
+        return False, _wait_for_token(tokens, rate)
+
+
+class TokenBucket:
+    """
+    Um balde só, de um dono que já está num lugar (ex: uma conexão WebSocket):
+    sem chave nem lock, usado só pelo event loop.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Gasta uma ficha, mesmo que ainda não exista. Retorna quantos segundos esperar por ela."""
+        now = time.monotonic()
+        self.tokens = _refill(self.tokens, now - self.updated_at, self.rate, self.burst) - 1
+        self.updated_at = now
+        return 0.0 if self.tokens >= 0 else _wait_for_token(self.tokens + 1, self.rate)
+
+
+class ConnectionPacer:
+    """
+    Fichas por conexão WebSocket. Sem ficha, a mensagem espera (e não é
+    descartada): as mensagens de uma conexão são tratadas uma de cada vez,
+    então a espera segura a leitura do socket e o cliente não passa da taxa.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        # Métricas
+        self.allowed = 0
+        self.delayed = 0
+
+    def bucket(self) -> TokenBucket:
+        return TokenBucket(self.rate, self.burst)
+
+    async def pace(self, bucket: TokenBucket):
+        wait = bucket.reserve()
+        if wait > 0:
+            self.delayed += 1
+            await asyncio.sleep(wait)
+        self.allowed += 1
+
+    def stats(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "allowed": self.allowed, "delayed": self.delayed}
+
+
+def _retry_after(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class AdmissionGate:
+    """Limite de chamadas simultâneas (por worker) com fila de espera limitada."""
+
+    def __init__(self, max_concurrency: int, queue_timeout: float, detail: str):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.detail = detail
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # Métricas
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=self.detail,
+                headers=_retry_after(self.queue_timeout),
+            )
+        finally:
+            self.waiting -= 1
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class RateLimiter:
+    """Token bucket por usuário + global, seguido do AdmissionGate."""
+
+    def __init__(self, name: str, store, rate_per_user: float, burst_per_user: float,
+                 rate_global: float, burst_global: float, gate: AdmissionGate):
+        self.name = name
+        self.store = store
+        self.rate_per_user = rate_per_user
+        self.burst_per_user = burst_per_user
+        self.rate_global = rate_global
+        self.burst_global = burst_global
+        self.gate = gate
+        # Métricas
+        self.allowed = 0
+        self.limited_user = 0
+        self.limited_global = 0
+
+    def _check(self, user_id: int) -> Optional[Tuple[str, float]]:
+        """None se pode seguir; senão (qual limite, segundos de espera). Pode bloquear (postgres)."""
+        allowed, wait = self.store.take(f"{self.name}:user:{user_id}", self.rate_per_user, self.burst_per_user)
+        if not allowed:
+            return "user", wait
+        allowed, wait = self.store.take(f"{self.name}:global", self.rate_global, self.burst_global)
+        if not allowed:
+            return "global", wait
+        return None
+
+    async def check(self, user_id: int):
+        if isinstance(self.store, MemoryBucketStore):
+            limited = self._check(user_id)
+        else:
+            limited = await run_in_threadpool(self._check, user_id)
+        if limited is None:
+            self.allowed += 1
+            return
+        scope, wait = limited
+        if scope == "user":
+            self.limited_user += 1
+            detail = "Muitas mensagens seguidas. Espere um pouco e tente de novo."
+        else:
+            self.limited_global += 1
+            detail = "O atendimento está sobrecarregado. Tente novamente em instantes."
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers=_retry_after(wait),
+        )
+
+    @asynccontextmanager
+    async def admit(self, user_id: int):
+        """Confere as fichas (429) e espera uma vaga (503) antes de rodar o bloco."""
+        await self.check(user_id)
+        async with self.gate.slot():
+            yield
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory" if isinstance(self.store, MemoryBucketStore) else "postgres",
+            "allowed": self.allowed,
+            "limited_user": self.limited_user,
+            "limited_global": self.limited_global,
+            "concurrency": self.gate.stats(),
+        }
+
+
+def create_bucket_store():
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if backend == "postgres":
+        return PostgresBucketStore(engine)
+    if backend == "memory":
+        return MemoryBucketStore()
+    raise ValueError(f"RATE_LIMIT_BACKEND inválido: {backend!r} (use 'memory' ou 'postgres')")
+
+
+# Instância global do limitador do chat
+chat = RateLimiter(
+    "chat",
+    create_bucket_store(),
+    rate_per_user=CHAT_RATE_PER_USER,
+    burst_per_user=CHAT_BURST_PER_USER,
+    rate_global=CHAT_RATE_GLOBAL,
+    burst_global=CHAT_BURST_GLOBAL,
+    gate=AdmissionGate(
+        CHAT_MAX_CONCURRENCY, CHAT_QUEUE_TIMEOUT,
+        "O atendimento está sobrecarregado. Tente novamente em instantes.",
+    ),
+)
+
+# get_order do WebSocket (um balde por conexão; ver main._handle_client_message)
+ws_get_order = ConnectionPacer(WS_GET_ORDER_RATE, WS_GET_ORDER_BURST)
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from .. import crud, schemas, auth, models, database
-from ..websocket_manager import manager
+from .. import crud, schemas, auth, models, database, rate_limit
+from ..serializers import OrjsonResponse, order_to_dict
+from ..event_bus import bus
+from ..websocket_manager import order_topics
 from ..services import nlu_service, gemini_service
 import asyncio
 
@@ -15,8 +18,37 @@ router = APIRouter(
 @router.post("/chat", response_model=schemas.ChatResponse)
 async def handle_chat_message(
     chat_request: schemas.ChatRequest,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
+):
+    """
+    Rota mais cara do sistema (NLU + banco + Gemini). Passa antes pelo limitador:
+    sem ficha -> 429; fila de chats em andamento cheia -> 503 (ver rate_limit.py).
+    A sessão do banco só é aberta depois de admitido: quem espera na fila não
+    segura conexão do pool.
+    """
+    async with rate_limit.chat.admit(current_user.id):
+        context = await run_in_threadpool(_load_chat_context, current_user.id)
+        return await _chat_pipeline(chat_request, current_user, *context)
+
+
+def _load_chat_context(user_id: int):
+    """
+    Catálogo e favoritos do cliente para o chat (roda no threadpool). Só leituras:
+    pode ir para a réplica. A sessão fecha aqui, antes das chamadas ao NLU e ao
+    Gemini, para não segurar conexão do pool durante a espera pelas IAs (os
+    objetos já vêm carregados; favoritos trazem o produto por joinedload).
+    """
+    with database.read_session() as db:
+        all_products = crud.get_all_products(db)
+        history = crud.get_user_favorites(db, user_id)
+    return all_products, history
+
+
+async def _chat_pipeline(
+    chat_request: schemas.ChatRequest,
+    current_user: schemas.User,
+    all_products: List[models.Product],
+    history: List[models.UserProductStats],
 ):
     """
     Ponto central:
@@ -28,8 +60,7 @@ async def handle_chat_message(
     6. Retorna a sugestão do Gemini e os itens entendidos.
     """
     
-    # 1. Pega TODOS os produtos (incluindo fora de estoque) para mapeamento e checagem
-    all_products = crud.get_all_products(db) 
+    # 1. TODOS os produtos (incluindo fora de estoque) para mapeamento e checagem
     product_keywords_map = {kw: prod.id for prod in all_products for kw in prod.keywords.split(',')}
     product_id_map = {prod.id: prod for prod in all_products} 
 
@@ -122,10 +153,12 @@ async def handle_chat_message(
         else: # Se IA1 retornou vazio (e era cumprimento) ou algo deu muito errado
              intent = "clarify_general"
 
-    # 4. Pega histórico e promoções
-    history = crud.get_user_order_history(db, current_user.id)
-    products_in_stock = crud.get_products(db, only_in_stock=True) 
-    active_promo_products = [p for p in products_in_stock if p.em_promocao and p.preco_promocional is not None]
+    # 4. Histórico (favoritos agregados) e promoções
+    # (em estoque, na mesma ordem por nome de crud.get_products(only_in_stock=True))
+    active_promo_products = [
+        p for p in all_products
+        if p.quantidade_estoque > 0 and p.em_promocao and p.preco_promocional is not None
+    ]
 
     history_context, frequent_items = gemini_service.format_history(history)
 
@@ -192,11 +225,25 @@ async def handle_chat_message(
         suggested_item=suggested_item_details
     )
 
+def _create_order_and_serialize(db: Session, user_id: int, items: List[schemas.OrderItemBase]):
+    new_order = crud.create_order(db, user_id=user_id, items=items)
+    # Converte o objeto SQLAlchemy para um dict ainda na thread,
+    # já que a serialização pode disparar lazy loads no banco
+    return new_order, order_to_dict(new_order)
+
+
+def _update_status_and_serialize(db: Session, order_id: int, new_status: models.OrderStatus):
+    updated_order = crud.update_order_status(db, order_id=order_id, status=new_status)
+    if not updated_order:
+        return None, None
+    return updated_order, order_to_dict(updated_order)
+
+
 @router.post("/confirm", response_model=schemas.Order)
 async def confirm_order(
     order_request: schemas.ConfirmOrderRequest,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: schemas.User = Depends(auth.get_current_user)
 ):
     """
     O cliente confirmou os itens.
@@ -206,31 +253,29 @@ async def confirm_order(
     """
     
     # 1. Cria o pedido
-    new_order = crud.create_order(
-        db, 
-        user_id=current_user.id, 
-        items=order_request.items
-    )
+    # (em thread: create_order bloqueia esperando o lock de estoque e, se rodasse
+    # no event loop, travaria os envios WebSocket deste worker)
+    new_order, order_data = await run_in_threadpool(_create_order_and_serialize, db, current_user.id, order_request.items)
     
     # 2. Notifica as cozinhas
-    # Converte o objeto SQLAlchemy para um dict (usando Pydantic)
-    order_data = schemas.Order.model_validate(new_order).model_dump(mode='json') 
-    await manager.broadcast_to_kitchens({
+    # (via barramento de eventos: chega nas cozinhas conectadas em qualquer worker)
+    await bus.publish({
         "type": "new_order",
         "data": order_data
-    })
+    }, kitchens=True, topics=order_topics(order_data)) # Estações recebem só as suas categorias
     
-    # 3. Retorna
-    return new_order
+    # 3. Retorna (o mesmo dict do evento, sem serializar de novo)
+    return OrjsonResponse(order_data)
 
 
 @router.get("/active", response_model=List[schemas.Order])
-async def get_active_orders(
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_active_kitchen_user)
+def get_active_orders(
+    db: Session = Depends(database.get_read_db),
+    current_user: schemas.User = Depends(auth.get_current_active_kitchen_user)
 ):
     """Retorna todos os pedidos ativos (Recebido, Em Produção) para a cozinha."""
-    return crud.get_active_orders(db)
+    # Fila grande: só colunas, sem ORM nem validação do response_model (ver serializers.py)
+    return OrjsonResponse(crud.get_active_orders_data(db))
 
 
 @router.put("/{order_id}/status", response_model=schemas.Order)
@@ -238,7 +283,7 @@ async def update_order_status(
     order_id: int,
     status_request: schemas.UpdateStatusRequest,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_active_kitchen_user)
+    current_user: schemas.User = Depends(auth.get_current_active_kitchen_user)
 ):
     """
     A cozinha atualiza o status de um pedido.
@@ -247,26 +292,19 @@ async def update_order_status(
     3. Notifica TODAS as cozinhas (para sincronizar painéis).
     """
     
-    # 1. Atualiza no banco
-    updated_order = crud.update_order_status(
-        db, 
-        order_id=order_id, 
-        status=status_request.status
-    )
+    # 1. Atualiza no banco (em thread, para não travar o event loop)
+    updated_order, order_data = await run_in_threadpool(_update_status_and_serialize, db, order_id, status_request.status)
     
     if not updated_order:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
 
-    # 2. Notifica o cliente
-    order_data = schemas.Order.model_validate(updated_order).model_dump(mode='json')
-    message = {
+    # 2 e 3. Um único evento no barramento notifica o cliente dono do pedido
+    # e TODAS as cozinhas (para sincronizar painéis), em qualquer worker.
+    # Só o que mudou vai no frame: quem não conhece o pedido pede o completo
+    # pelo WebSocket ({"type": "get_order", "id": ...}).
+    await bus.publish({
         "type": "status_update",
-        "data": order_data
-    }
-    
-    await manager.send_to_user(updated_order.usuario_id, message)
-    
-    # 3. Notifica todas as cozinhas
-    await manager.broadcast_to_kitchens(message)
+        "data": {"id": order_data["id"], "status": order_data["status"], "versao": order_data["versao"]}
+    }, kitchens=True, user_id=updated_order.usuario_id, topics=order_topics(order_data))
     
-    return updated_order
\ No newline at end of file
+    return OrjsonResponse(order_data)
\ No newline at end of file
@@ -1,8 +1,10 @@
 # /coffeenet/backend/app/routers/products.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 from .. import crud, schemas, auth, database, models
+from ..menu_cache import menu
+from ..serializers import etag_matches
 
 router = APIRouter(
     prefix="/products",
@@ -12,9 +14,18 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.Product])
-def read_products(db: Session = Depends(database.get_db)):
-    products = crud.get_all_products(db)
-    return products
+def read_products(request: Request):
+    """
+    Catálogo completo, servido do cache já serializado (ver menu_cache.py).
+    Os painéis consultam de novo com If-None-Match: se nada mudou, 304 sem
+    corpo e sem ir ao banco.
+    """
+    etag, body = menu.catalog()
+    # private: depende do usuário logado; no-cache: o navegador sempre revalida
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @router.post("/", response_model=schemas.Product, status_code=status.HTTP_201_CREATED)
 def create_new_product(product: schemas.ProductCreate, db: Session = Depends(database.get_db)):
@@ -26,7 +26,8 @@ async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
     db: Session = Depends(database.get_db)
 ):
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    # Argon2 roda num pool limitado, fora do event loop (ver auth.py)
+    user = await auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -40,5 +41,5 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: schemas.User = Depends(auth.get_current_user)):
     return current_user
\ No newline at end of file
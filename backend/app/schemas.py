@@ -92,6 +92,7 @@ class Order(OrderBase):
     status: OrderStatus
     created_at: datetime
     total: float
+    versao: int = 1
     itens: List[OrderItem] = []
     class Config:
         from_attributes = True
@@ -1,14 +1,32 @@
 # Este script popula o banco com dados iniciais.
+#
+#   python -m app.seed                    -> usuários de teste e cardápio básico
+#   python -m app.seed --synthetic ...    -> o mesmo + massa sintética grande
+#                                            (benchmarks e testes de carga)
 
-from .database import SessionLocal, engine
-from .models import Base, User, Product, Promotion
+import argparse
+import bisect
+import csv
+import enum
+import io
+import random
+import time
+import unicodedata
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .crud import favorite_weight
+from .database import SessionLocal
+from .models import User, Product, Promotion
 from .auth import get_password_hash
 from .models import UserRole
 
 def seed_data():
-    # Cria as tabelas (caso ainda não existam)
-    Base.metadata.create_all(bind=engine)
-    
+    # As tabelas já devem existir: rode "alembic upgrade head" antes do seed
     db = SessionLocal()
     
     try:
@@ -100,7 +118,262 @@ def seed_data():
     finally:
         db.close()
 
-if __name__ == "__main__":
+# --- Massa sintética ---
+# Determinística por semente: mesma semente e mesmos parâmetros, mesmas linhas
+# (os horários são relativos a "until", por padrão a data fixa SYNTHETIC_UNTIL,
+# e não a hoje: senão a mesma semente daria outras datas a cada dia).
+# Distribuições:
+#   - popularidade dos produtos: Zipf (poucos produtos concentram os pedidos);
+#   - atividade dos clientes: Zipf mais suave (alguns clientes pedem muito);
+#   - cada cliente tem 1 a 3 favoritos, que aparecem em metade dos seus itens;
+#   - pedidos espalhados pelos últimos "days" dias, em ordem de id; os mais
+#     recentes (active_ratio) ainda estão na fila da cozinha.
+# No PostgreSQL as linhas entram por COPY; nos outros bancos, em lotes.
+
+SYNTHETIC_BATCH_SIZE = 20000
+# Fim do período dos pedidos sintéticos (--until muda)
+SYNTHETIC_UNTIL = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+_CATALOG = {
+    "Bebidas": ["Café Espresso", "Cappuccino", "Café com Leite", "Latte", "Mocha", "Chocolate Quente",
+                "Chá Gelado", "Suco de Laranja", "Limonada", "Água com Gás"],
+    "Salgados": ["Pão de Queijo", "Coxinha", "Esfiha", "Empada", "Pastel", "Misto Quente", "Croissant",
+                 "Enroladinho"],
+    "Doces": ["Bolo de Fubá", "Brigadeiro", "Brownie", "Cookie", "Torta de Limão", "Pudim", "Cuca"],
+}
+_PRICE_RANGE = {"Bebidas": (4.0, 15.0), "Salgados": (3.0, 12.0), "Doces": (4.0, 14.0)}
+_VARIANTS = ["Grande", "Pequeno", "Especial", "Duplo", "da Casa", "Zero", "Vegano", "Gourmet"]
+# Itens por pedido (1 a 4) e quantidade por item (1 a 3): pesos
+_ITEMS_PER_ORDER = [50, 30, 15, 5]
+_QUANTITY = [75, 20, 5]
+
+
+def _unaccent(value: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", value) if unicodedata.category(c) != "Mn")
+
+
+def _zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    total, cum = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cum.append(total)
+    return cum
+
+
+def _pick(rnd: random.Random, values: list, cum_weights: List[float]):
+    return values[bisect.bisect(cum_weights, rnd.random() * cum_weights[-1])]
+
+
+def _next_id(db, model) -> int:
+    return (db.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def _write_rows(db, table, columns: List[str], rows: List[tuple]):
+    """COPY no PostgreSQL; INSERT em lote nos outros bancos."""
+    if not rows:
+        return
+    if db.bind.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([v.name if isinstance(v, enum.Enum) else v for v in row])
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    else:
+        db.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def synthetic_products(n: int, first_id: int, rnd: random.Random) -> List[tuple]:
+    """Linhas de produtos (id, nome, preço, categoria, keywords, estoque, promoção, preço promocional)."""
+    bases = [(categoria, nome) for categoria, nomes in _CATALOG.items() for nome in nomes]
+    rows = []
+    for i in range(n):
+        categoria, base = bases[i % len(bases)]
+        round_ = i // len(bases)
+        if round_ == 0:
+            nome = base
+        elif round_ <= len(_VARIANTS):
+            nome = f"{base} {_VARIANTS[round_ - 1]}"
+        else:
+            nome = f"{base} #{round_}"
+        keywords = list(dict.fromkeys(k for name in (nome, base) for k in (name.lower(), _unaccent(name.lower()))))
+        low, high = _PRICE_RANGE[categoria]
+        preco = round(rnd.uniform(low, high) * 2) / 2
+        em_promocao = rnd.random() < 0.05
+        rows.append((
+            first_id + i, nome, preco, categoria, ",".join(keywords),
+            0 if rnd.random() < 0.03 else rnd.randint(20, 500),
+            em_promocao, round(preco * 0.8, 2) if em_promocao else None,
+        ))
+    return rows
+
+
+def seed_synthetic(db, users: int, products: int, orders: int, seed: int = 42,
+                   active_ratio: float = 0.0005, days: int = 365, until: Optional[datetime] = None,
+                   email_prefix: str = "sintetico", password: str = "123") -> Dict[str, int]:
+    """
+    Insere clientes ({email_prefix}{i}@teste.com, todos com a mesma senha),
+    produtos com palavras-chave, pedidos com itens e o agregado
+    user_product_stats correspondente. Pensado para banco vazio (ou com o
+    seed básico); os ids continuam a partir dos existentes.
+    """
+    rnd = random.Random(seed)
+    started = time.perf_counter()
+    print(f"Massa sintética (semente {seed}): {users} clientes, {products} produtos, {orders} pedidos...")
+
+    # Clientes: um único hash (Argon2 é lento de propósito)
+    hashed_password = get_password_hash(password)
+    first_user = _next_id(db, User)
+    user_ids = list(range(first_user, first_user + users))
+    _write_rows(db, User.__table__, ["id", "email", "hashed_password", "cargo"],
+                [(user_id, f"{email_prefix}{i}@teste.com", hashed_password, UserRole.cliente)
+                 for i, user_id in enumerate(user_ids)])
+
+    first_product = _next_id(db, Product)
+    product_rows = synthetic_products(products, first_product, rnd)
+    _write_rows(db, Product.__table__,
+                ["id", "nome", "preco", "categoria", "keywords", "quantidade_estoque", "em_promocao",
+                 "preco_promocional"],
+                product_rows)
+    db.commit()
+
+    prices = {row[0]: row[2] for row in product_rows}
+    popular_products = [row[0] for row in product_rows]
+    rnd.shuffle(popular_products)
+    product_weights = _zipf_cum_weights(len(popular_products), 1.1)
+    active_users = list(user_ids)
+    rnd.shuffle(active_users)
+    user_weights = _zipf_cum_weights(len(active_users), 0.7)
+    favorites: Dict[int, List[int]] = {}
+
+    until = until or SYNTHETIC_UNTIL
+    start = until - timedelta(days=days)
+    step = timedelta(days=days) / max(orders, 1)
+    n_active = round(orders * active_ratio)
+    first_order = _next_id(db, models.Order)
+    first_item = next_item = _next_id(db, models.OrderItem)
+    # (cliente, produto) -> [pedidos, quantidade, score, último pedido]
+    stats: Dict[tuple, list] = {}
+
+    order_columns = ["id", "usuario_id", "status", "created_at", "total", "versao"]
+    item_columns = ["id", "pedido_id", "produto_id", "quantidade", "preco_no_momento"]
+    for offset in range(0, orders, SYNTHETIC_BATCH_SIZE):
+        order_rows, item_rows = [], []
+        for i in range(offset, min(offset + SYNTHETIC_BATCH_SIZE, orders)):
+            user_id = _pick(rnd, active_users, user_weights)
+            user_favorites = favorites.get(user_id)
+            if user_favorites is None:
+                user_favorites = favorites[user_id] = [
+                    _pick(rnd, popular_products, product_weights) for _ in range(rnd.randint(1, 3))
+                ]
+            quantities: Dict[int, int] = {}
+            for _ in range(rnd.choices((1, 2, 3, 4), _ITEMS_PER_ORDER)[0]):
+                if rnd.random() < 0.5:
+                    product_id = rnd.choice(user_favorites)
+                else:
+                    product_id = _pick(rnd, popular_products, product_weights)
+                quantity = rnd.choices((1, 2, 3), _QUANTITY)[0]
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+            created_at = start + step * (i + rnd.random())
+            if i >= orders - n_active:
+                status = rnd.choice((models.OrderStatus.RECEBIDO, models.OrderStatus.EM_PRODUCAO))
+            else:
+                status = models.OrderStatus.CANCELADO if rnd.random() < 0.05 else models.OrderStatus.PRONTO
+            order_id = first_order + i
+            total = 0.0
+            weight = favorite_weight(created_at)
+            for product_id, quantity in quantities.items():
+                item_rows.append((next_item, order_id, product_id, quantity, prices[product_id]))
+                next_item += 1
+                total += prices[product_id] * quantity
+                stat = stats.get((user_id, product_id))
+                if stat is None:
+                    stats[(user_id, product_id)] = [1, quantity, weight, created_at]
+                else:
+                    stat[0] += 1
+                    stat[1] += quantity
+                    stat[2] += weight
+                    stat[3] = created_at
+            versao = {models.OrderStatus.RECEBIDO: 1, models.OrderStatus.EM_PRODUCAO: 2}.get(status, 3)
+            order_rows.append((order_id, user_id, status, created_at, round(total, 2), versao))
+        _write_rows(db, models.Order.__table__, order_columns, order_rows)
+        _write_rows(db, models.OrderItem.__table__, item_columns, item_rows)
+        db.commit()
+        done = offset + len(order_rows)
+        if done % (SYNTHETIC_BATCH_SIZE * 10) == 0 or done == orders:
+            print(f"  {done}/{orders} pedidos ({time.perf_counter() - started:.0f}s)")
+
+    stat_rows = [(user_id, product_id, *values) for (user_id, product_id), values in stats.items()]
+    for offset in range(0, len(stat_rows), SYNTHETIC_BATCH_SIZE * 5):
+        _write_rows(db, models.UserProductStats.__table__,
+                    ["usuario_id", "produto_id", "vezes_pedido", "quantidade_total", "score", "ultimo_pedido_em"],
+                    stat_rows[offset:offset + SYNTHETIC_BATCH_SIZE * 5])
+    if db.bind.dialect.name == "postgresql":
+        # Ids inseridos explicitamente: as sequences continuam depois deles
+        for table in ("usuarios", "produtos", "pedidos", "itens_pedido"):
+            db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                            f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+    db.commit()
+    counts = {"users": users, "products": products, "orders": orders,
+              "items": next_item - first_item, "user_product_stats": len(stat_rows)}
+    print(f"Massa sintética pronta em {time.perf_counter() - started:.1f}s: {counts}")
+    return counts
+
+
+# Tabelas esvaziadas por reset_and_seed (das que referenciam para as referenciadas)
+SYNTHETIC_TABLES = ("itens_pedido", "promocoes", "user_product_stats", "pedidos", "produtos", "usuarios")
+
+
+def reset_and_seed(engine, **kwargs) -> Dict[str, int]:
+    """
+    Banco de TESTE dos benchmarks: cria as tabelas que faltam, apaga todas as
+    linhas (as de outras tabelas que apontam para elas também, no PostgreSQL) e insere a massa sintética (kwargs vão para seed_synthetic). No
+    PostgreSQL, roda ANALYZE no fim para os planos verem os dados novos.
+    """
+    models.Base.metadata.create_all(engine)
+    with Session(engine, autoflush=False) as db:
+        if engine.dialect.name == "postgresql":
+            # TRUNCATE e não DELETE: as linhas apagadas ficariam nas tabelas e nos
+            # índices até o autovacuum, e cada rodada mediria um banco mais inchado
+            db.execute(text(f"TRUNCATE {', '.join(SYNTHETIC_TABLES)} CASCADE"))
+        else:
+            for table in SYNTHETIC_TABLES:
+                db.execute(text(f"DELETE FROM {table}"))
+        db.commit()
+        counts = seed_synthetic(db, **kwargs)
+        if engine.dialect.name == "postgresql":
+            db.execute(text("ANALYZE"))
+            db.commit()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Popula o banco (rode \"alembic upgrade head\" antes).")
+    parser.add_argument("--synthetic", action="store_true", help="Além do seed básico, gera a massa sintética")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42, help="Semente (mesma semente, mesmos dados)")
+    parser.add_argument("--active-ratio", type=float, default=0.0005, help="Fração dos pedidos (os mais recentes) ainda ativos")
+    parser.add_argument("--days", type=int, default=365, help="Período coberto pelos pedidos")
+    parser.add_argument("--until", type=date.fromisoformat, default=SYNTHETIC_UNTIL.date(),
+                        help="Data (AAAA-MM-DD, UTC) em que o período termina")
+    args = parser.parse_args()
+
     print("Iniciando o seed do banco de dados...")
     seed_data()
-    print("Seed concluído.")
\ No newline at end of file
+    if args.synthetic:
+        db = SessionLocal()
+        try:
+            seed_synthetic(db, args.users, args.products, args.orders, seed=args.seed,
+                           active_ratio=args.active_ratio, days=args.days,
+                           until=datetime.combine(args.until, datetime.min.time(), timezone.utc))
+        finally:
+            db.close()
+    print("Seed concluído.")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
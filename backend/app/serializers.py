@@ -0,0 +1,92 @@
+"""
+Serialização rápida de pedidos e produtos, compartilhada pelo HTTP e pelo WebSocket.
+
+As listas somente-leitura (fila da cozinha, pedidos do cliente, cardápio) não
+passam mais por ORM + schemas.Order/schemas.Product + model_dump: o crud lê só
+as colunas necessárias (ver crud.get_*_data) e as funções daqui montam os dicts
+no mesmo formato do model_dump(mode='json') desses schemas. O resultado vai
+direto para o orjson, tanto na resposta HTTP (OrjsonResponse) quanto no frame
+do WebSocket (encode_message).
+
+As funções aceitam linhas do SQLAlchemy Core e objetos do ORM: só usam
+atributos com os nomes das colunas.
+"""
+from datetime import datetime
+from typing import Any, Iterable, List, Optional
+
+import orjson
+from starlette.responses import Response
+
+
+def iso_datetime(value: datetime) -> str:
+    """Igual ao pydantic no modo JSON: UTC sai com "Z"."""
+    text = value.isoformat()
+    if text.endswith("+00:00"):
+        text = text[:-6] + "Z"
+    return text
+
+
+def product_dict(product) -> dict:
+    """Formato de schemas.Product."""
+    return {
+        "id": product.id,
+        "nome": product.nome,
+        "preco": product.preco,
+        "categoria": product.categoria,
+        "keywords": product.keywords,
+        "quantidade_estoque": product.quantidade_estoque,
+        "em_promocao": product.em_promocao,
+        "preco_promocional": product.preco_promocional,
+    }
+
+
+def item_dict(item, produto: dict) -> dict:
+    """Formato de schemas.OrderItem (produto já convertido)."""
+    return {
+        "produto_id": item.produto_id,
+        "quantidade": item.quantidade,
+        "id": item.id,
+        "preco_no_momento": item.preco_no_momento,
+        "produto": produto,
+    }
+
+
+def order_dict(order, itens: List[dict]) -> dict:
+    """Formato de schemas.Order (itens já convertidos)."""
+    return {
+        "id": order.id,
+        "usuario_id": order.usuario_id,
+        "status": order.status.value,
+        "created_at": iso_datetime(order.created_at),
+        "total": order.total,
+        "versao": order.versao,
+        "itens": itens,
+    }
+
+
+def order_to_dict(order) -> dict:
+    """Pedido do ORM (com itens e produtos carregados) -> dict, sem passar pelo pydantic."""
+    return order_dict(order, [item_dict(item, product_dict(item.produto)) for item in order.itens])
+
+
+def products_to_dicts(products: Iterable) -> List[dict]:
+    return [product_dict(p) for p in products]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """O ETag atual está no cabeçalho If-None-Match (lista, "*" ou prefixo fraco W/)?"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class OrjsonResponse(Response):
+    """
+    Resposta JSON codificada com orjson, para conteúdo já em tipos JSON
+    (os dicts daqui). Não passa pela validação do response_model.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
@@ -0,0 +1,41 @@
+"""
+Worker de produção: gunicorn + uvicorn (ver gunicorn.conf.py e start.sh).
+
+Igual ao UvicornWorker, só muda o desligamento. O uvicorn, ao receber o
+SIGTERM, derruba os WebSockets na hora (1012) e só depois roda o shutdown do
+lifespan. Aqui, antes disso, o worker para de aceitar conexões, sai do
+/readyz e drena os WebSockets (ConnectionManager.drain): cada um recebe o que
+já estava na fila e os clientes reconectam aos poucos em outro worker.
+"""
+import sys
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn_worker import UvicornWorker
+
+from .health import startup
+from .websocket_manager import manager
+
+
+class DrainingServer(Server):
+
+    async def shutdown(self, sockets=None):
+        # Para de aceitar conexões (o uvicorn faria o mesmo logo em seguida;
+        # os sockets do gunicorn ele mesmo fecha)
+        for server in self.servers:
+            server.close()
+        startup.shutting_down = True
+        await manager.drain()
+        await super().shutdown(sockets=sockets)
+
+
+class DrainingUvicornWorker(UvicornWorker):
+
+    async def _serve(self) -> None:
+        # Mesmo _serve do UvicornWorker, com o DrainingServer
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
@@ -1,14 +1,33 @@
-import google.generativeai as genai 
+import logging
 import os
+import time
 from typing import List, Optional, Tuple
 from .. import schemas, models
+from ..metrics import GEMINI_FALLBACKS, GEMINI_REQUEST_DURATION
+
+logger = logging.getLogger(__name__)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    print("Erro Crítico: GEMINI_API_KEY não está configurada no ambiente.")
-    model = None 
-else:
+GEMINI_MODEL_NAME = "gemini-2.0-flash"
+
+# Configurado por init() na inicialização do app (lifespan), não no import
+model = None
+
+
+def init() -> bool:
+    """
+    Configura o cliente do Gemini. Roda no lifespan (em thread): o import do
+    SDK é pesado e não precisa pesar em quem só importa o módulo (migrações,
+    seed, benchmarks). Sem chave ou com erro, o chat segue com respostas fixas.
+    """
+    global model
+    if not GEMINI_API_KEY:
+        logger.error("GEMINI_API_KEY não está configurada no ambiente; o chat usa respostas fixas.")
+        model = None
+        return False
     try:
+        import google.generativeai as genai
+
         genai.configure(api_key=GEMINI_API_KEY)
         generation_config = {
           "temperature": 0.7,
@@ -18,35 +37,30 @@ else:
         }
 
         model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
+            model_name=GEMINI_MODEL_NAME,
             generation_config=generation_config,
         )
-        print("Cliente Gemini inicializado com sucesso.")
+        logger.info("Cliente Gemini inicializado com sucesso.", extra={"model": GEMINI_MODEL_NAME})
+        return True
     except Exception as e:
-        print(f"Erro ao inicializar o cliente Gemini: {e}")
-        model = None 
+        logger.error("Erro ao inicializar o cliente Gemini", extra={"error": str(e)})
+        model = None
+        return False
 
 
-def format_history(history: List[models.Order]) -> str:
-    if not history:
+def format_history(favorites: List[models.UserProductStats]) -> str:
+    """
+    Formata os favoritos do cliente (crud.get_user_favorites), já ordenados
+    por frequência com peso maior para os pedidos recentes.
+    """
+    if not favorites:
         return "Este é um cliente novo, sem histórico de pedidos.", []
 
-    product_frequency = {}
-    for order in history:
-        for item in order.itens:
-            product_name = item.produto.nome
-            product_frequency[product_name] = product_frequency.get(product_name, 0) + 1
-
-    if not product_frequency:
-         return "Este é um cliente novo, sem histórico de pedidos.", []
-
-    sorted_history = sorted(product_frequency.items(), key=lambda x: x[1], reverse=True)
-
     formatted = "Itens mais pedidos por este cliente (em ordem de frequência):\n"
     frequent_items_list = []
-    for product_name, count in sorted_history:
-        formatted += f"- {product_name} (pedido {count} vezes)\n"
-        frequent_items_list.append(product_name)
+    for stat in favorites:
+        formatted += f"- {stat.produto.nome} (pedido {stat.vezes_pedido} vezes)\n"
+        frequent_items_list.append(stat.produto.nome)
 
     return formatted, frequent_items_list
 
@@ -75,7 +89,7 @@ def format_current_order(items: List[schemas.OrderItemBase], products_dict: dict
 async def get_gemini_recommendation(
     intent: str,
     parsed_items: List[schemas.OrderItemBase],
-    history: List[models.Order],
+    history: List[models.UserProductStats],
     promotions: List[models.Product],
     all_products: List[models.Product],
     out_of_stock_items: Optional[List[str]] = None,
@@ -87,7 +101,8 @@ async def get_gemini_recommendation(
     """
 
     if model is None:
-         print("Erro: Tentando usar Gemini, mas o modelo não foi inicializado.")
+         # (o aviso já saiu no init; aqui só conta, uma vez por chat)
+         GEMINI_FALLBACKS.labels("no_model").inc()
          # Retorna mensagem de erro mais direta para clarificar
          if intent.startswith("clarify"):
              return "Opa, desculpa, tô com uma dificuldade aqui pra processar. Pode repetir?"
@@ -250,8 +265,10 @@ async def get_gemini_recommendation(
     SUA RESPOSTA (APENAS a fala do atendente, curta e direta):
     """
 
+    started = time.perf_counter()
     try:
         response = await model.generate_content_async(prompt)
+        GEMINI_REQUEST_DURATION.labels("ok").observe(time.perf_counter() - started)
         text_response = response.text.strip()
         if text_response.lower().startswith("resposta:"):
              text_response = text_response[len("resposta:"):].strip()
@@ -263,7 +280,9 @@ async def get_gemini_recommendation(
         return text_response
 
     except Exception as e:
-        print(f"Erro ao chamar API do Gemini: {e}")
+        GEMINI_REQUEST_DURATION.labels("error").observe(time.perf_counter() - started)
+        GEMINI_FALLBACKS.labels("error").inc()
+        logger.warning("Erro ao chamar API do Gemini", extra={"error": str(e)})
         if intent.startswith("clarify"):
             return "Desculpe, não entendi muito bem. Poderia repetir ou escolher um item do cardápio?"
         else:
@@ -1,26 +1,67 @@
 import httpx
+import logging
 import os
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
 from .. import schemas
+from ..metrics import NLU_REQUEST_DURATION
+
+logger = logging.getLogger(__name__)
 
 IA_1_NLU_URL = os.getenv("IA_1_NLU_URL")
 
+# Cliente HTTP compartilhado (conexões reaproveitadas com a IA 1), criado no lifespan
+_client: Optional[httpx.AsyncClient] = None
+
+
+async def start():
+    global _client
+    _client = httpx.AsyncClient(timeout=5.0)
+
+
+async def stop():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def check() -> bool:
+    """A IA 1 está pronta (modelo carregado)? Usado no aquecimento e no /readyz."""
+    if _client is None or not IA_1_NLU_URL:
+        return False
+    try:
+        response = await _client.get(f"{IA_1_NLU_URL}/readyz", timeout=1.0)
+        return response.status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
 async def call_nlu_service(text: str, product_keywords: List[str]) -> schemas.NLUResponse:
     """
     Chama o microsserviço de IA 1 (NLU)
     """
     url = f"{IA_1_NLU_URL}/parse"
     payload = {"text": text, "product_keywords": product_keywords}
+    started = time.perf_counter()
+    outcome = "error"
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload, timeout=5.0)
-            response.raise_for_status() # Lança exceção se for 4xx ou 5xx
-            
-            data = response.json()
-            return schemas.NLUResponse(items=data.get("items", []))
-            
-        except httpx.RequestError as e:
-            print(f"Erro ao chamar IA 1 (NLU): {e}")
-            # Retorna uma resposta vazia em caso de falha
-            return schemas.NLUResponse(items=[])
\ No newline at end of file
+    try:
+        if _client is not None:
+            response = await _client.post(url, json=payload, timeout=5.0)
+        else:
+            # Fora do app (scripts): cliente avulso
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, json=payload, timeout=5.0)
+        response.raise_for_status() # Lança exceção se for 4xx ou 5xx
+        
+        data = response.json()
+        outcome = "ok"
+        return schemas.NLUResponse(items=data.get("items", []))
+        
+    except httpx.RequestError as e:
+        logger.warning("Erro ao chamar IA 1 (NLU)", extra={"error": str(e)})
+        # Retorna uma resposta vazia em caso de falha
+        return schemas.NLUResponse(items=[])
+    finally:
+        NLU_REQUEST_DURATION.labels(outcome).observe(time.perf_counter() - started)
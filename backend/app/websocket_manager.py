@@ -1,43 +1,412 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from starlette import status
+from typing import Dict, FrozenSet, Iterable, List, Optional, Union
+import asyncio
+import logging
+import os
+import time
+import orjson
+
+from .metrics import WS_BROADCAST_DURATION, WS_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo da fila de saída de cada conexão (em mensagens)
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+# Tempo máximo (s) para um send; acima disso a conexão é considerada travada
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Intervalo (s) entre os pings do servidor; o cliente responde com {"type": "pong"}
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+# Sem receber nada do cliente por esse tempo (s), a conexão é derrubada
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# Desligamento: as conexões são fechadas aos poucos ao longo desses segundos
+WS_DRAIN_SECONDS = float(os.getenv("WS_DRAIN_SECONDS", "10"))
+
+# Frame de ping, compartilhado por todas as conexões
+PING_FRAME = orjson.dumps({"type": "ping"}).decode()
+
+
+# Uma mensagem pode chegar como dict ou já codificada (texto/bytes JSON)
+Message = Union[dict, str, bytes]
+
+
+def encode_message(message: Message) -> str:
+    """
+    Codifica a mensagem em JSON uma única vez (com orjson).
+    O frame resultante é reaproveitado para todos os destinatários.
+    Frames de texto: o frontend faz JSON.parse(event.data) direto.
+    """
+    if isinstance(message, str):
+        return message
+    if isinstance(message, bytes):
+        return message.decode()
+    return orjson.dumps(message).decode()
+
+
+# --- Tópicos da cozinha ---
+# Uma estação (ex: o bar) assina categorias de produto e só recebe os pedidos,
+# e dentro deles só os itens, dessas categorias. None = recebe tudo.
+Topics = Optional[FrozenSet[str]]
+
+
+def normalize_topic(name: Optional[str]) -> str:
+    return (name or "").strip().lower()
+
+
+def parse_topics(raw: Optional[str]) -> Topics:
+    """"Bebidas, Doces" -> {"bebidas", "doces"}. Vazio -> None (todas as categorias)."""
+    topics = frozenset(normalize_topic(t) for t in (raw or "").split(",") if t.strip())
+    return topics or None
+
+
+def order_topics(order: dict) -> List[str]:
+    """Categorias presentes num pedido serializado (schemas.Order)."""
+    return sorted({normalize_topic(item["produto"]["categoria"]) for item in order["itens"]})
+
+
+def filter_order(order: dict, topics: FrozenSet[str]) -> dict:
+    """Cópia do pedido só com os itens das categorias dadas."""
+    return {**order, "itens": [i for i in order["itens"] if normalize_topic(i["produto"]["categoria"]) in topics]}
+
+
+def frame_for_topics(frame: str, event_topics: Optional[Iterable[str]], subscribed: Topics) -> Optional[str]:
+    """
+    O frame que uma estação deve receber: o original (se ela vê o pedido
+    inteiro), um novo só com os itens dela, ou None (nada a ver com ela).
+    """
+    if subscribed is None or event_topics is None:
+        return frame
+    event_topics = frozenset(event_topics)
+    visible = subscribed & event_topics
+    if not visible:
+        return None
+    if visible == event_topics:
+        return frame
+    message = orjson.loads(frame)
+    if "itens" not in message["data"]:
+        # Mensagem compacta (ex: status_update): não tem itens para separar
+        return frame
+    message["data"] = filter_order(message["data"], visible)
+    return orjson.dumps(message).decode()
+
+
+class Connection:
+    """
+    Uma conexão WebSocket com sua própria fila de saída.
+    Uma task "writer" esvazia a fila; quem faz broadcast só enfileira e nunca
+    espera o socket, então um tablet travado não atrasa os outros.
+    """
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, user_id: int, role: str,
+                 topics: Topics = None):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.role = role
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=manager.queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+        # Última vez que o cliente mandou algo (pong ou qualquer mensagem)
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def start(self):
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, frame: str) -> bool:
+        """Coloca o frame (já codificado) na fila sem bloquear. Retorna False se a fila estiver cheia."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _write_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(frame), timeout=self.manager.send_timeout)
+                    self.manager.messages_sent += 1
+                except asyncio.TimeoutError:
+                    self.manager.evict(self, "timeout")
+                    return
+                except Exception:
+                    # Socket morto (cliente sumiu sem fechar direito)
+                    self.manager.evict(self, "error")
+                    return
+                finally:
+                    # Para o drain saber quando tudo que estava na fila já saiu (ou desistiu)
+                    self.queue.task_done()
+        finally:
+            # Derrubada ou cancelada: o resto da fila não vai sair; não deixa o drain esperando
+            self._discard_pending()
+
+    def _discard_pending(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
 
 class ConnectionManager:
-    def __init__(self):
-        # Mapeia user_id para uma lista de WebSockets ativos
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT,
+                 ping_interval: float = WS_PING_INTERVAL, idle_timeout: float = WS_IDLE_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Mapeia user_id para uma lista de conexões ativas
         # (um usuário pode estar conectado em várias abas)
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        # Conexões da cozinha (todos recebem todos os pedidos)
-        self.kitchen_connections: List[WebSocket] = []
+        self.active_connections: Dict[int, List[Connection]] = {}
+        # Conexões da cozinha (todas)
+        self.kitchen_connections: List[Connection] = []
+        # ...as que recebem todos os pedidos (sem tópicos)
+        self.kitchen_all: List[Connection] = []
+        # ...e o índice das estações por tópico (categoria)
+        self.kitchen_topics: Dict[str, List[Connection]] = {}
+        # Métricas
+        self.frames_split = 0
+        self.messages_enqueued = 0
+        self.messages_sent = 0
+        self.dropped: Dict[str, int] = {"overflow": 0, "timeout": 0, "error": 0, "idle": 0}
+        # Desligando: não aceita conexões novas (ver drain)
+        self.draining = False
+        self.drained = 0
 
-    async def connect(self, websocket: WebSocket, user_id: int, role: str):
-        await websocket.accept()
+    def connect(self, websocket: WebSocket, user_id: int, role: str, topics: Topics = None) -> Connection:
+        """
+        Registra uma conexão já aceita. É síncrono de propósito: quem chama pode
+        registrar e enfileirar o estado inicial sem que um evento passe na frente.
+        topics: categorias assinadas por uma estação da cozinha (None = todas).
+        """
+        connection = Connection(self, websocket, user_id, role, topics)
+        WS_CONNECTIONS.labels(role).inc()
         if role == "cozinheiro":
-            self.kitchen_connections.append(websocket)
+            self.kitchen_connections.append(connection)
+            if topics is None:
+                self.kitchen_all.append(connection)
+            for topic in topics or ():
+                self.kitchen_topics.setdefault(topic, []).append(connection)
         else:
             if user_id not in self.active_connections:
                 self.active_connections[user_id] = []
-            self.active_connections[user_id].append(websocket)
+            self.active_connections[user_id].append(connection)
+        connection.start()
+        return connection
 
-    def disconnect(self, websocket: WebSocket, user_id: int, role: str):
-        if role == "cozinheiro":
-            if websocket in self.kitchen_connections:
-                self.kitchen_connections.remove(websocket)
+    def _find(self, websocket: WebSocket, user_id: int, role: str) -> Optional[Connection]:
+        candidates = self.kitchen_connections if role == "cozinheiro" else self.active_connections.get(user_id, [])
+        return next((c for c in candidates if c.websocket is websocket), None)
+
+    def _remove(self, connection: Connection):
+        if not connection.closed:
+            WS_CONNECTIONS.labels(connection.role).dec()
+        connection.closed = True
+        self._unindex(connection)
+        # Não cancela a própria task quando quem remove é o writer
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    def _unindex(self, connection: Connection):
+        """Tira a conexão dos índices de broadcast (pode ser chamado mais de uma vez)."""
+        if connection.role == "cozinheiro":
+            if connection in self.kitchen_connections:
+                self.kitchen_connections.remove(connection)
+            if connection in self.kitchen_all:
+                self.kitchen_all.remove(connection)
+            for topic in connection.topics or ():
+                subscribers = self.kitchen_topics.get(topic)
+                if subscribers and connection in subscribers:
+                    subscribers.remove(connection)
+                    if not subscribers:
+                        del self.kitchen_topics[topic]
         else:
-            if user_id in self.active_connections:
-                self.active_connections[user_id].remove(websocket)
-                if not self.active_connections[user_id]:
-                    del self.active_connections[user_id]
+            connections = self.active_connections.get(connection.user_id)
+            if connections and connection in connections:
+                connections.remove(connection)
+                if not connections:
+                    del self.active_connections[connection.user_id]
+
+    def disconnect(self, websocket: WebSocket, user_id: int, role: str):
+        connection = self._find(websocket, user_id, role)
+        if connection:
+            self._remove(connection)
+
+    def evict(self, connection: Connection, reason: str):
+        """Derruba uma conexão lenta ou morta e limpa seus registros."""
+        if connection.closed:
+            return
+        self.dropped[reason] += 1
+        logger.info("WS derrubado", extra={"user_id": connection.user_id, "role": connection.role, "reason": reason})
+        self._remove(connection)
+        asyncio.create_task(self._close(connection))
+
+    async def _close(self, connection: Connection):
+        try:
+            await asyncio.wait_for(
+                connection.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER),
+                timeout=self.send_timeout,
+            )
+        except Exception:
+            pass  # Já estava fechada ou travada; de qualquer forma saiu do registro
+
+    def _deliver(self, connections: List[Connection], message: Message):
+        if not connections:
+            return
+        frame = encode_message(message) # Codifica uma vez, não uma por conexão
+        # Copia a lista: evict() remove itens durante a iteração
+        for connection in list(connections):
+            if connection.enqueue(frame):
+                self.messages_enqueued += 1
+            else:
+                self.evict(connection, "overflow")
+
+    async def send_personal(self, connection: Connection, message: Message):
+        """Envia uma mensagem para uma conexão específica (ex: estado inicial)."""
+        self._deliver([connection], message)
 
-    async def send_to_user(self, user_id: int, message: dict):
+    async def send_to_user(self, user_id: int, message: Message):
         """Envia uma mensagem específica para todas as conexões de um usuário."""
         if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                await connection.send_json(message)
+            started = time.perf_counter()
+            self._deliver(self.active_connections[user_id], message)
+            WS_BROADCAST_DURATION.labels("user").observe(time.perf_counter() - started)
+
+    async def broadcast_to_kitchens(self, message: Message, topics: Optional[Iterable[str]] = None):
+        """
+        Envia uma mensagem para as cozinhas conectadas.
+        Sem topics, vai para todas. Com topics (as categorias de um pedido), vai
+        para as cozinhas sem tópicos e só para as estações inscritas em alguma
+        dessas categorias, cada uma com os itens que lhe cabem.
+        """
+        started = time.perf_counter()
+        if topics is None:
+            self._deliver(self.kitchen_connections, message)
+        else:
+            self._deliver_by_topics(message, topics)
+        WS_BROADCAST_DURATION.labels("kitchens").observe(time.perf_counter() - started)
+
+    def _deliver_by_topics(self, message: Message, topics: Iterable[str]):
+        frame = encode_message(message)
+        event_topics = frozenset(topics)
+        self._deliver(self.kitchen_all, frame)
+
+        # Agrupa as estações pelo pedaço do pedido que elas veem: um frame por grupo
+        groups: Dict[FrozenSet[str], List[Connection]] = {}
+        seen = set()
+        for topic in event_topics:
+            for connection in self.kitchen_topics.get(topic, ()):
+                if connection not in seen:
+                    seen.add(connection)
+                    groups.setdefault(connection.topics & event_topics, []).append(connection)
+        for visible, connections in groups.items():
+            if visible != event_topics:
+                self.frames_split += 1
+            self._deliver(connections, frame_for_topics(frame, event_topics, visible))
+
+    async def broadcast_to_clients(self, message: Message):
+        """Envia uma mensagem para todos os clientes conectados (ex: mudanças no cardápio)."""
+        started = time.perf_counter()
+        self._deliver([c for conns in self.active_connections.values() for c in conns], message)
+        WS_BROADCAST_DURATION.labels("clients").observe(time.perf_counter() - started)
+
+    def connections(self) -> List[Connection]:
+        return self.kitchen_connections + [c for conns in self.active_connections.values() for c in conns]
+
+    # --- Desligamento ---
+    async def drain(self, duration: float = WS_DRAIN_SECONDS):
+        """
+        Fecha todas as conexões com 1012 (serviço reiniciando), cada uma depois
+        de esvaziar a própria fila, espalhadas ao longo de `duration` segundos:
+        os clientes reconectam (e retomam pelo last_seq) em outro worker sem
+        chegarem todos de uma vez.
+        """
+        self.draining = True
+        connections = self.connections()
+        if not connections:
+            return
+        logger.info("Drenando conexões WebSocket", extra={"connections": len(connections), "seconds": duration})
+        interval = duration / len(connections)
+        tasks = []
+        for connection in connections:
+            tasks.append(asyncio.create_task(self._drain_one(connection)))
+            if interval >= 0.001:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+
+    async def _drain_one(self, connection: Connection):
+        # Sai dos broadcasts antes de esperar a fila: senão cada evento novo
+        # entra atrás e o join só termina no timeout
+        self._unindex(connection)
+        try:
+            # Tudo o que já estava na fila chega antes do close
+            await asyncio.wait_for(connection.queue.join(), timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            pass
+        if connection.closed:
+            return
+        self.drained += 1
+        self._remove(connection)
+        try:
+            await asyncio.wait_for(
+                connection.websocket.close(code=status.WS_1012_SERVICE_RESTART),
+                timeout=self.send_timeout,
+            )
+        except Exception:
+            pass
+
+    # --- Heartbeat ---
+    def start_heartbeat(self):
+        """Uma única task para todas as conexões (e não uma por socket)."""
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop_heartbeat(self):
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            self.ping_and_reap()
+
+    def ping_and_reap(self):
+        """Derruba quem está calado há mais de idle_timeout e manda ping para os demais."""
+        deadline = time.monotonic() - self.idle_timeout
+        alive = []
+        for connection in self.connections():
+            if connection.last_seen < deadline:
+                self.evict(connection, "idle")
+            else:
+                alive.append(connection)
+        self._deliver(alive, PING_FRAME)
 
-    async def broadcast_to_kitchens(self, message: dict):
-        """Envia uma mensagem para todas as cozinhas conectadas."""
-        for connection in self.kitchen_connections:
-            await connection.send_json(message)
+    def stats(self) -> dict:
+        connections = self.connections()
+        depths = [c.queue.qsize() for c in connections]
+        return {
+            "kitchen_connections": len(self.kitchen_connections),
+            "kitchen_topics": {topic: len(subscribers) for topic, subscribers in self.kitchen_topics.items()},
+            "frames_split": self.frames_split,
+            "client_connections": len(connections) - len(self.kitchen_connections),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_size_limit": self.queue_size,
+            "messages_enqueued": self.messages_enqueued,
+            "messages_sent": self.messages_sent,
+            "dropped": dict(self.dropped),
+            "draining": self.draining,
+            "drained": self.drained,
+        }
 
 # Instância global do gerenciador
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
@@ -0,0 +1,2 @@
+# Scripts de benchmark e verificação de desempenho do backend.
+# Rode a partir da pasta backend/, ex: python -m benchmarks.check_query_plans --help
@@ -0,0 +1,136 @@
+"""
+Benchmark das estratégias de carga do grafo pedido -> itens -> produto.
+
+Compara, para filas de 100 a 10.000 pedidos ativos:
+  - joinedload: um único SELECT com LEFT JOINs (estratégia antiga do crud)
+  - selectinload: pedidos, itens e produtos em consultas "IN" separadas (crud atual)
+
+Mede o tempo de crud.get_active_orders (carga + hidratação do ORM), o número de
+linhas e de bytes aproximados trafegados do banco.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_order_loading                     # SQLite temporário
+    python -m benchmarks.bench_order_loading --database-url postgresql+psycopg2://...  (banco de TESTE: é esvaziado!)
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from app import crud, models
+from app.seed import reset_and_seed
+
+
+def joined_active_orders(db):
+    """Versão antiga de crud.get_active_orders, com JOINs encadeados."""
+    return db.query(models.Order)\
+             .filter(models.Order.status.in_([
+                 models.OrderStatus.RECEBIDO,
+                 models.OrderStatus.EM_PRODUCAO
+              ]))\
+             .options(joinedload(models.Order.itens).joinedload(models.OrderItem.produto))\
+             .order_by(models.Order.created_at.asc())\
+             .all()
+
+
+STRATEGIES = {
+    "joinedload": joined_active_orders,
+    "selectinload": crud.get_active_orders,
+}
+
+
+class TrafficCounter:
+    """Conta statements, linhas e bytes (repr das linhas) lidos do banco."""
+
+    def __init__(self, bind):
+        self.statements = self.rows = self.bytes = 0
+        event.listen(bind, "after_cursor_execute", self._after_execute)
+
+    def reset(self):
+        self.statements = self.rows = self.bytes = 0
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def count_rows(self, rows):
+        self.rows += len(rows)
+        self.bytes += sum(len(repr(tuple(r))) for r in rows)
+
+
+def measure(Session, fn, counter: TrafficCounter, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        db = Session()
+        try:
+            counter.reset()
+            start = time.perf_counter()
+            orders = fn(db)
+            timings.append(time.perf_counter() - start)
+            n_items = sum(len(o.itens) for o in orders)
+        finally:
+            db.close()
+    return statistics.median(timings), len(orders), n_items
+
+
+def raw_rows(Session, fn, counter: TrafficCounter):
+    """Re-executa o SQL emitido por fn e conta linhas/bytes do resultado bruto."""
+    captured = []
+    db = Session()
+    listener = lambda conn, cur, stmt, params, ctx, many: captured.append((stmt, params))
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        fn(db)
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+        db.close()
+    counter.reset()
+    engine = Session.kw["bind"]
+    with engine.connect() as conn:
+        for stmt, params in captured:
+            counter.count_rows(conn.exec_driver_sql(stmt, params).fetchall())
+    return counter.statements, counter.rows, counter.bytes
+
+
+def run_size(database_url: str, n_orders: int, repeat: int):
+    engine = create_engine(database_url)
+    # Banco de teste: começa vazio a cada tamanho
+    reset_and_seed(engine, users=max(10, n_orders // 10), products=50, orders=n_orders,
+                   active_ratio=1.0, seed=n_orders)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    counter = TrafficCounter(engine)
+    results = []
+    for name, fn in STRATEGIES.items():
+        with Session() as db:
+            fn(db)  # aquecimento
+        seconds, n_loaded, n_items = measure(Session, fn, counter, repeat)
+        statements, rows, size = raw_rows(Session, fn, counter)
+        results.append((name, seconds, n_loaded, n_items, statements, rows, size))
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="Tamanhos da fila (pedidos ativos)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="Banco de TESTE, esvaziado a cada tamanho (padrão: SQLite temporário por tamanho)")
+    args = parser.parse_args()
+
+    print(f"{'pedidos':>8} {'estratégia':<13} {'mediana (ms)':>12} {'itens':>7} {'queries':>7} {'linhas':>8} {'KB lidos':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        if args.database_url:
+            url = args.database_url
+        else:
+            tmpdir = tempfile.mkdtemp(prefix="coffeenet_bench_")
+            url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        for name, seconds, n_loaded, n_items, statements, rows, size_bytes in run_size(url, size, args.repeat):
+            print(f"{n_loaded:>8} {name:<13} {seconds * 1000:>12.1f} {n_items:>7} {statements:>7} {rows:>8} {size_bytes / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
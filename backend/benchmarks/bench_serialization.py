@@ -0,0 +1,111 @@
+"""
+Benchmark da serialização da fila da cozinha (GET /orders/active e initial_state do WebSocket).
+
+Compara, para filas de 1.000 e 10.000 pedidos ativos, do banco até os bytes JSON:
+  - pydantic_http: crud.get_active_orders (ORM) + validação do response_model
+    (List[schemas.Order]) + JSON do pydantic (caminho antigo do HTTP)
+  - pydantic_ws: crud.get_active_orders (ORM) + model_dump(mode='json') + orjson
+    (caminho antigo do snapshot do WebSocket)
+  - lean: crud.get_active_orders_data (só colunas, dicts) + orjson (HTTP e WebSocket hoje)
+
+Confere também que os três produzem o mesmo JSON.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_serialization                     # SQLite temporário
+    python -m benchmarks.bench_serialization --database-url postgresql+psycopg2://...  (banco de TESTE: é esvaziado!)
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas
+from app.seed import reset_and_seed
+
+_orders_adapter = TypeAdapter(List[schemas.Order])
+
+
+def pydantic_http(db) -> bytes:
+    orders = crud.get_active_orders(db)
+    return _orders_adapter.dump_json(_orders_adapter.validate_python(orders, from_attributes=True))
+
+
+def pydantic_ws(db) -> bytes:
+    orders = crud.get_active_orders(db)
+    return orjson.dumps([schemas.Order.model_validate(o).model_dump(mode='json') for o in orders])
+
+
+def lean(db) -> bytes:
+    return orjson.dumps(crud.get_active_orders_data(db))
+
+
+STRATEGIES = {
+    "pydantic_http": pydantic_http,
+    "pydantic_ws": pydantic_ws,
+    "lean": lean,
+}
+
+
+def measure(Session, fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        db = Session()
+        try:
+            start = time.perf_counter()
+            body = fn(db)
+            timings.append(time.perf_counter() - start)
+        finally:
+            db.close()
+    return statistics.median(timings), body
+
+
+def run_size(database_url: str, n_orders: int, repeat: int):
+    engine = create_engine(database_url)
+    # Banco de teste: começa vazio a cada tamanho
+    reset_and_seed(engine, users=max(10, n_orders // 10), products=50, orders=n_orders,
+                   active_ratio=1.0, seed=n_orders)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    results = []
+    for name, fn in STRATEGIES.items():
+        with Session() as db:
+            fn(db)  # aquecimento
+        seconds, body = measure(Session, fn, repeat)
+        results.append((name, seconds, orjson.loads(body), len(body)))
+    engine.dispose()
+    reference = results[0][2]
+    for name, _, payload, _ in results[1:]:
+        if payload != reference:
+            raise AssertionError(f"{name} gerou um JSON diferente de {results[0][0]}")
+    return [(name, seconds, len(payload), size) for name, seconds, payload, size in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="Tamanhos da fila (pedidos ativos)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="Banco de TESTE, esvaziado a cada tamanho (padrão: SQLite temporário por tamanho)")
+    args = parser.parse_args()
+
+    print(f"{'pedidos':>8} {'estratégia':<14} {'mediana (ms)':>12} {'x lean':>7} {'KB JSON':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        if args.database_url:
+            url = args.database_url
+        else:
+            tmpdir = tempfile.mkdtemp(prefix="coffeenet_bench_")
+            url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        results = run_size(url, size, args.repeat)
+        lean_seconds = results[-1][1]
+        for name, seconds, n_orders, n_bytes in results:
+            print(f"{n_orders:>8} {name:<14} {seconds * 1000:>12.1f} {seconds / lean_seconds:>7.1f} {n_bytes / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
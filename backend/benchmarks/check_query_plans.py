@@ -0,0 +1,163 @@
+"""
+Verificação (regressão) dos planos de execução das consultas quentes.
+
+Popula um banco DESCARTÁVEL com muitos pedidos, executa as funções do crud,
+captura o SQL que elas geram e roda EXPLAIN em cada statement, conferindo que
+os índices esperados são usados (e que não há Seq Scan em pedidos/itens_pedido).
+
+Uso (a partir de backend/, com DATABASE_URL apontando para um banco de teste):
+    alembic upgrade head
+    python -m benchmarks.check_query_plans --seed --orders 200000
+
+Sai com código 1 se algum plano não usar o índice esperado.
+Funciona com PostgreSQL (EXPLAIN FORMAT JSON) e SQLite (EXPLAIN QUERY PLAN).
+O SQLite só usa índice parcial quando o WHERE tem literais (o crud usa parâmetros),
+então lá o índice parcial da fila da cozinha (e o Seq Scan em pedidos que ele evita)
+NÃO é conferido: essas linhas saem como [NÃO VERIFICADO] e um aviso no final.
+Para a regressão valer, rode contra PostgreSQL.
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import event, select
+
+from app import crud, models
+from app.database import SessionLocal, engine
+from app.seed import seed_synthetic
+
+# Função do crud -> conjuntos de índices aceitos (o plano precisa usar um deles)
+EXPECTED_INDEXES = {
+    "get_active_orders": [{"ix_pedidos_ativos_created_at", "ix_itens_pedido_pedido_id"}],
+    "get_user_order_history": [{"ix_pedidos_usuario_created_at", "ix_itens_pedido_pedido_id"}],
+    # Com poucos pedidos ativos no banco todo (o normal: ver app.seed), varrer o
+    # índice parcial da fila sai mais barato que o histórico do cliente
+    "get_active_orders_by_user": [{"ix_pedidos_usuario_created_at", "ix_itens_pedido_pedido_id"},
+                                  {"ix_pedidos_ativos_created_at", "ix_itens_pedido_pedido_id"}],
+}
+# Índices parciais: o SQLite não consegue usá-los com parâmetros
+PARTIAL_INDEXES = {"ix_pedidos_ativos_created_at"}
+# Tabelas grandes que nunca devem ser varridas inteiras
+BIG_TABLES = {"pedidos", "itens_pedido"}
+
+def capture_statements(fn, *args):
+    """Executa fn e devolve a lista de (sql, parâmetros) enviados ao banco."""
+    captured = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _listener)
+    try:
+        fn(*args)
+    finally:
+        event.remove(engine, "before_cursor_execute", _listener)
+    return captured
+
+
+def _walk_pg_plan(node, found: set, seq_scans: set):
+    if "Index Name" in node:
+        found.add(node["Index Name"])
+    if node.get("Node Type") == "Seq Scan":
+        seq_scans.add(node.get("Relation Name"))
+    for child in node.get("Plans", []):
+        _walk_pg_plan(child, found, seq_scans)
+
+
+def explain(conn, statement, parameters):
+    """Retorna (índices usados, tabelas com varredura completa, plano em texto)."""
+    found, seq_scans = set(), set()
+    if engine.dialect.name == "postgresql":
+        row = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        plan = row if isinstance(row, list) else json.loads(row)
+        _walk_pg_plan(plan[0]["Plan"], found, seq_scans)
+        return found, seq_scans, json.dumps(plan, indent=1)
+
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    lines = []
+    for row in rows:
+        detail = row[-1]
+        lines.append(detail)
+        words = detail.split()
+        if "INDEX" in words:
+            found.add(words[words.index("INDEX") + 1])
+        if words[:1] == ["SCAN"] and len(words) > 1 and words[1] in BIG_TABLES and "INDEX" not in words:
+            seq_scans.add(words[1])
+    return found, seq_scans, "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="Insere dados sintéticos antes (banco de TESTE!)")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--active-ratio", type=float, default=0.01)
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Imprime os planos completos")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.seed:
+            seed_synthetic(db, args.users, args.products, args.orders, seed=args.random_seed,
+                           active_ratio=args.active_ratio)
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+            conn.commit()
+
+        user_id = db.scalar(
+            select(models.Order.usuario_id)
+            .where(models.Order.status.in_([models.OrderStatus.RECEBIDO, models.OrderStatus.EM_PRODUCAO]))
+            .limit(1)
+        )
+        if user_id is None:
+            print("Nenhum pedido ativo no banco. Rode com --seed num banco de teste.")
+            return 1
+        calls = {
+            "get_active_orders": (crud.get_active_orders, db),
+            "get_user_order_history": (crud.get_user_order_history, db, user_id),
+            "get_active_orders_by_user": (crud.get_active_orders_by_user, db, user_id),
+        }
+
+        failures = 0
+        unchecked = []
+        with engine.connect() as conn:
+            for name, (fn, *fn_args) in calls.items():
+                used, scanned, plans = set(), set(), []
+                for statement, parameters in capture_statements(fn, *fn_args):
+                    found, seq_scans, plan = explain(conn, statement, parameters)
+                    used |= found
+                    scanned |= seq_scans & BIG_TABLES
+                    plans.append(plan)
+                    db.expunge_all()
+                options = EXPECTED_INDEXES[name]
+                skipped = False
+                if engine.dialect.name == "sqlite":
+                    usable = [expected for expected in options if not expected & PARTIAL_INDEXES]
+                    if not usable:
+                        usable = [expected - PARTIAL_INDEXES for expected in options]
+                        scanned.discard("pedidos")
+                        skipped = True
+                        unchecked.append(name)
+                    options = usable
+                missing = min((expected - used for expected in options), key=len)
+                ok = not missing and not scanned
+                failures += not ok
+                label = "FALHOU" if not ok else "NÃO VERIFICADO" if skipped else "OK"
+                print(f"[{label}] {name}: índices={sorted(used)}"
+                      + (f" faltando={sorted(missing)}" if missing else "")
+                      + (f" seq_scan={sorted(scanned)}" if scanned else ""))
+                if args.verbose or not ok:
+                    print("\n".join(plans))
+        if unchecked:
+            print(f"AVISO: SQLite não usa índice parcial com parâmetros; {sorted(PARTIAL_INDEXES)} "
+                  f"e o Seq Scan em pedidos NÃO foram conferidos em {unchecked}. "
+                  "Rode contra PostgreSQL para validar a fila da cozinha.")
+        return 1 if failures else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Tempo de cold start de um serviço (backend ou IA 1).
+
+Sobe o app com uvicorn (um worker) --runs vezes e mede, do início do processo:
+- até o /healthz responder (o worker aceita conexões: lifespan concluído);
+- até o /readyz responder 200 (aquecido e com as dependências ok);
+- a latência da primeira requisição de verdade (--first-path).
+Mostra também a divisão do tempo informada pelo próprio serviço no /readyz
+(import, Gemini, pool do banco, caches / modelo spaCy...).
+
+Pré-requisitos (backend): DATABASE_URL apontando para um banco de TESTE já
+migrado, e SECRET_KEY / ALGORITHM / ACCESS_TOKEN_EXPIRE_MINUTES.
+
+Uso (a partir de backend/):
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --cwd ../ia_1_nlu --first-path /readyz    # IA 1
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def wait_for(client: httpx.Client, url: str, started: float, timeout: float, ok=lambda r: True) -> float:
+    """Segundos desde started até url responder (e ok(resposta) ser verdadeiro)."""
+    while time.perf_counter() - started < timeout:
+        try:
+            if ok(client.get(url)):
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} não respondeu em {timeout}s")
+
+
+def run_once(args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", args.app, "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        cwd=args.cwd, env=os.environ.copy(), stdout=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=10) as client:
+            live = wait_for(client, f"{base_url}/healthz", started, args.timeout)
+            ready = wait_for(client, f"{base_url}/readyz", started, args.timeout,
+                             ok=lambda r: r.status_code == 200)
+            first_started = time.perf_counter()
+            client.get(f"{base_url}{args.first_path}")
+            first = time.perf_counter() - first_started
+            timings = client.get(f"{base_url}/readyz").json().get("timings", {})
+        return {"live": live, "ready": ready, "first": first, "timings": timings}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--app", default="app.main:app")
+    parser.add_argument("--cwd", default=".", help="Pasta do serviço (backend/ ou ia_1_nlu/)")
+    parser.add_argument("--first-path", default="/", help="Primeira requisição medida depois de pronto")
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    results = [run_once(args) for _ in range(args.runs)]
+    for i, r in enumerate(results, 1):
+        print(f"#{i}: vivo={r['live']:.2f}s pronto={r['ready']:.2f}s "
+              f"primeira requisição={r['first'] * 1000:.1f}ms etapas={r['timings']}")
+    print(f"mediana: vivo={statistics.median(r['live'] for r in results):.2f}s "
+          f"pronto={statistics.median(r['ready'] for r in results):.2f}s "
+          f"primeira requisição={statistics.median(r['first'] for r in results) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
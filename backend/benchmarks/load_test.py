@@ -0,0 +1,291 @@
+"""
+Teste de carga ponta a ponta: clientes e cozinhas simulados.
+
+Sobe a IA 1 dublê (stubs.nlu_app) e o backend de produção (gunicorn.conf.py)
+com o Gemini dublê (stubbed_backend), cada um com a latência configurada, e
+por --duration segundos:
+  - N clientes: POST /users/token -> /ws/{token} -> alguns POST /orders/chat
+    (com pausa entre as mensagens) -> POST /orders/confirm com os itens
+    entendidos, e de novo;
+  - M cozinhas: conectadas em /ws/{token}; cada new_order é assumido por uma
+    delas, que o leva por PUT /orders/{id}/status (EM_PRODUCAO -> PRONTO).
+
+Mostra, por rota: requisições, vazão, p50/p95/p99/max (ms) e os status HTTP
+(429/503 = limitador do chat ou fila de login). E o atraso do WebSocket:
+confirm -> new_order em cada cozinha, e PUT status -> status_update no cliente.
+
+Os clientes são os da massa sintética (sintetico{i}@teste.com, senha 123,
+com histórico e favoritos: python -m app.seed --synthetic); os que faltarem
+são criados na primeira rodada, sem histórico.
+Com muitos clientes, suba os limites do chat (CHAT_RATE_GLOBAL etc.) no
+ambiente, ou o 429 passa a ser o resultado medido.
+
+Pré-requisitos: DATABASE_URL apontando para um PostgreSQL de TESTE já migrado
+e com o seed padrão (cozinha@teste.com, senha 123). Os estoques são
+aumentados para a carga não esbarrar neles.
+
+Uso (a partir de backend/):
+    python -m benchmarks.load_test --customers 50 --kitchens 3 --duration 60 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+import websockets
+
+from .workers_throughput import wait_until_ready
+from .ws_multiworker import percentile
+
+PASSWORD = "123"
+
+
+class Recorder:
+    """Latências e status por rota, e atrasos do WebSocket."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.confirmed_at = {}       # pedido -> instante do confirm
+        self.status_sent_at = {}     # (pedido, status) -> instante do PUT
+        self.new_order_received = [] # (pedido, instante), em cada cozinha
+        self.kitchen_lag = []        # ms, confirm -> new_order (cada cozinha)
+        self.customer_lag = []       # ms, PUT status -> status_update no cliente
+
+    async def call(self, route: str, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            self.statuses[route][type(e).__name__] += 1
+            return None
+        self.latencies[route].append((time.perf_counter() - start) * 1000)
+        self.statuses[route][response.status_code] += 1
+        return response
+
+
+def chat_text(products: list, rnd: random.Random) -> str:
+    """Mensagem de chat com 1 ou 2 produtos do cardápio (pela primeira palavra-chave)."""
+    chosen = rnd.sample(products, k=min(len(products), rnd.choice((1, 1, 2))))
+    parts = [f"{rnd.randint(1, 3)} {p['keywords'].split(',')[0]}" for p in chosen]
+    return "quero " + " e ".join(parts)
+
+
+async def consume(ws, on_message):
+    """Lê o WebSocket até fechar; responde aos pings."""
+    try:
+        async for raw in ws:
+            message = json.loads(raw)
+            if message.get("type") == "ping":
+                await ws.send('{"type": "pong"}')
+            else:
+                on_message(message)
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def customer(i: int, args, client: httpx.AsyncClient, ws_url: str, rec: Recorder,
+                   products: list, deadline: float):
+    rnd = random.Random(i)
+    response = await rec.call("POST /users/token", client.post(
+        "/users/token", data={"username": f"{args.customer_prefix}{i}@teste.com", "password": PASSWORD}))
+    if response is None or response.status_code != 200:
+        return
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def on_message(message):
+        if message.get("type") == "status_update":
+            data = message["data"]
+            sent = rec.status_sent_at.get((data["id"], data["status"]))
+            if sent is not None:
+                rec.customer_lag.append((time.perf_counter() - sent) * 1000)
+
+    async with websockets.connect(f"{ws_url}/ws/{token}", max_size=None) as ws:
+        reader = asyncio.create_task(consume(ws, on_message))
+        while time.monotonic() < deadline:
+            items = []
+            for _ in range(args.chats):
+                await asyncio.sleep(rnd.uniform(0.5, 1.5) * args.think_time)
+                response = await rec.call("POST /orders/chat", client.post(
+                    "/orders/chat", headers=headers,
+                    json={"text": chat_text(products, rnd), "current_items": items}))
+                if response is not None and response.status_code == 200:
+                    items = [{"produto_id": p["produto_id"], "quantidade": p["quantidade"]}
+                             for p in response.json()["parsed_items"]]
+            if time.monotonic() >= deadline:
+                break
+            if not items:
+                items = [{"produto_id": rnd.choice(products)["id"], "quantidade": 1}]
+            start = time.perf_counter()
+            response = await rec.call("POST /orders/confirm", client.post(
+                "/orders/confirm", headers=headers, json={"items": items}))
+            if response is not None and response.status_code == 200:
+                rec.confirmed_at[response.json()["id"]] = start
+        reader.cancel()
+
+
+async def kitchen(k: int, args, client: httpx.AsyncClient, ws_url: str, token: str, rec: Recorder,
+                  connected: asyncio.Event, counter: list):
+    headers = {"Authorization": f"Bearer {token}"}
+    work: asyncio.Queue = asyncio.Queue()
+
+    def on_message(message):
+        if message.get("type") != "new_order":
+            return
+        order_id = message["data"]["id"]
+        # O evento pode chegar antes da resposta do confirm: a conta fica para o fim
+        rec.new_order_received.append((order_id, time.perf_counter()))
+        if order_id % args.kitchens == k:
+            work.put_nowait(order_id)
+
+    async def cook():
+        while True:
+            order_id = await work.get()
+            for new_status in (1, 3):  # EM_PRODUCAO, PRONTO
+                await asyncio.sleep(args.prep_time)
+                rec.status_sent_at[(order_id, new_status)] = time.perf_counter()
+                await rec.call("PUT /orders/{id}/status", client.put(
+                    f"/orders/{order_id}/status", headers=headers, json={"status": new_status}))
+
+    async with websockets.connect(f"{ws_url}/ws/{token}", max_size=None) as ws:
+        counter[0] += 1
+        if counter[0] == args.kitchens:
+            connected.set()
+        cooks = [asyncio.create_task(cook()) for _ in range(args.cooks)]
+        try:
+            await consume(ws, on_message)
+        finally:
+            for task in cooks:
+                task.cancel()
+
+
+async def prepare(client: httpx.AsyncClient, args) -> tuple:
+    """Token da cozinha, cardápio com estoque alto e contas dos clientes."""
+    response = await client.post("/users/token", data={"username": args.kitchen_email, "password": PASSWORD})
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    products = (await client.get("/products/", headers=headers)).json()
+    for product in products:
+        await client.put(f"/products/{product['id']}", headers=headers, json={"quantidade_estoque": 1_000_000})
+    semaphore = asyncio.Semaphore(8)
+
+    async def register(i: int):
+        async with semaphore:
+            await client.post("/users/register", json={"email": f"{args.customer_prefix}{i}@teste.com", "password": PASSWORD})
+
+    # 400 = já existe (rodadas anteriores)
+    await asyncio.gather(*(register(i) for i in range(args.customers)))
+    return token, products
+
+
+def report(rec: Recorder, seconds: float):
+    print(f"{'rota':<24} {'n':>6} {'req/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}  status")
+    for route in sorted(rec.statuses):
+        values = rec.latencies[route]
+        statuses = ", ".join(f"{code}: {n}" for code, n in sorted(rec.statuses[route].items(), key=str))
+        if values:
+            print(f"{route:<24} {len(values):>6} {len(values) / seconds:>7.1f} {statistics.median(values):>7.1f} "
+                  f"{percentile(values, 95):>7.1f} {percentile(values, 99):>7.1f} {max(values):>7.1f}  {statuses}")
+        else:
+            print(f"{route:<24} {0:>6}  {statuses}")
+    for name, values in (("WS confirm -> cozinha", rec.kitchen_lag), ("WS status -> cliente", rec.customer_lag)):
+        if values:
+            print(f"{name:<24} {len(values):>6} {'':>7} {statistics.median(values):>7.1f} "
+                  f"{percentile(values, 95):>7.1f} {percentile(values, 99):>7.1f} {max(values):>7.1f}")
+        else:
+            print(f"{name:<24} {0:>6}")
+
+
+def start_servers(args) -> list:
+    env = os.environ.copy()
+    env.update({
+        "NLU_STUB_LATENCY_MS": str(args.nlu_latency),
+        "GEMINI_STUB_LATENCY_MS": str(args.gemini_latency),
+        "IA_1_NLU_URL": f"http://127.0.0.1:{args.nlu_port}",
+        "WEB_CONCURRENCY": str(args.workers),
+    })
+    nlu = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.stubs:nlu_app", "--host", "127.0.0.1",
+         "--port", str(args.nlu_port), "--log-level", "warning"],
+        env=env,
+    )
+    backend = subprocess.Popen(
+        ["gunicorn", "benchmarks.stubbed_backend:app", "-c", "gunicorn.conf.py",
+         "--bind", f"127.0.0.1:{args.port}", "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    return [backend, nlu]
+
+
+async def run(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    ws_url = f"ws://127.0.0.1:{args.port}"
+    servers = start_servers(args)
+    try:
+        await wait_until_ready(base_url)
+        limits = httpx.Limits(max_connections=args.customers + args.kitchens * args.cooks + 10)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            kitchen_token, products = await prepare(client, args)
+            rec = Recorder()
+            connected = asyncio.Event()
+            counter = [0]
+            kitchens = [asyncio.create_task(kitchen(k, args, client, ws_url, kitchen_token, rec, connected, counter))
+                        for k in range(args.kitchens)]
+            await asyncio.wait_for(connected.wait(), timeout=30)
+
+            started = time.perf_counter()
+            deadline = time.monotonic() + args.duration
+            await asyncio.gather(*(customer(i, args, client, ws_url, rec, products, deadline)
+                                   for i in range(args.customers)))
+            seconds = time.perf_counter() - started
+            # Últimos eventos e mudanças de status em trânsito
+            await asyncio.sleep(2 * args.prep_time + 1)
+            for task in kitchens:
+                task.cancel()
+            await asyncio.gather(*kitchens, return_exceptions=True)
+
+        for order_id, received in rec.new_order_received:
+            if order_id in rec.confirmed_at:
+                rec.kitchen_lag.append((received - rec.confirmed_at[order_id]) * 1000)
+
+        print(f"workers={args.workers} clientes={args.customers} cozinhas={args.kitchens} "
+              f"NLU={args.nlu_latency:.0f}ms Gemini={args.gemini_latency:.0f}ms em {seconds:.1f}s")
+        report(rec, seconds)
+        return 0
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--kitchens", type=int, default=3)
+    parser.add_argument("--cooks", type=int, default=4, help="Pedidos preparados em paralelo por cozinha")
+    parser.add_argument("--duration", type=float, default=60, help="Segundos de carga")
+    parser.add_argument("--chats", type=int, default=2, help="Mensagens de chat antes de cada confirm")
+    parser.add_argument("--think-time", type=float, default=3, help="Pausa média (s) antes de cada mensagem")
+    parser.add_argument("--prep-time", type=float, default=1, help="Segundos entre as mudanças de status")
+    parser.add_argument("--nlu-latency", type=float, default=30, help="Latência média (ms) da IA 1 dublê")
+    parser.add_argument("--gemini-latency", type=float, default=400, help="Latência média (ms) do Gemini dublê")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--port", type=int, default=8769)
+    parser.add_argument("--nlu-port", type=int, default=8770)
+    parser.add_argument("--kitchen-email", default="cozinha@teste.com")
+    parser.add_argument("--customer-prefix", default="sintetico", help="Clientes {prefixo}{i}@teste.com")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark de "tempestade de logins" e atraso do event loop.
+
+Sobe o backend com UM worker, dispara N logins simultâneos e, ao mesmo tempo,
+mede o tempo de resposta de uma rota trivial (GET /) a cada --probe-interval
+segundos. Como a rota não faz nada, o tempo dela é praticamente o atraso do
+event loop: se o Argon2 rodar no loop, ela trava junto com os logins (e os
+WebSockets também).
+
+Mostra também a vazão e a latência dos logins e quantos foram recusados com
+503 (fila de login cheia, ver LOGIN_MAX_CONCURRENCY / LOGIN_QUEUE_TIMEOUT).
+
+Pré-requisitos: DATABASE_URL apontando para um banco de TESTE já migrado e com
+o seed padrão (cliente@teste.com, senha 123).
+
+Uso (a partir de backend/):
+    python -m benchmarks.login_storm --logins 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .ws_multiworker import percentile, wait_until_up
+
+
+async def probe(client: httpx.AsyncClient, base_url: str, interval: float, stop: asyncio.Event) -> list:
+    """Tempos (ms) de GET / até o stop."""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(f"{base_url}/")
+        lags.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return lags
+
+
+def summary(values) -> str:
+    if not values:
+        return "sem amostras"
+    return (f"p50={statistics.median(values):.1f} p99={percentile(values, 99):.1f} "
+            f"max={max(values):.1f}")
+
+
+async def run(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        await wait_until_up(base_url)
+        limits = httpx.Limits(max_connections=args.logins + 10)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client, \
+                httpx.AsyncClient(timeout=120) as prober:
+            # Aquecimento: primeiro login (imports, pool do banco) fora da conta
+            await client.post(f"{base_url}/users/token", data={"username": args.email, "password": args.password})
+
+            stop = asyncio.Event()
+            idle = asyncio.create_task(probe(prober, base_url, args.probe_interval, stop))
+            await asyncio.sleep(args.baseline)
+            stop.set()
+            idle_lags = await idle
+
+            statuses: dict = {}
+            login_times = []
+
+            async def one_login():
+                start = time.perf_counter()
+                response = await client.post(f"{base_url}/users/token",
+                                             data={"username": args.email, "password": args.password})
+                login_times.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            stop = asyncio.Event()
+            storm = asyncio.create_task(probe(prober, base_url, args.probe_interval, stop))
+            started = time.perf_counter()
+            await asyncio.gather(*(one_login() for _ in range(args.logins)))
+            storm_seconds = time.perf_counter() - started
+            stop.set()
+            storm_lags = await storm
+
+        print(f"logins={args.logins} em {storm_seconds:.1f}s ({args.logins / storm_seconds:.1f} logins/s) "
+              f"status={dict(sorted(statuses.items()))}")
+        print(f"latência do login (ms): {summary(login_times)}")
+        print(f"GET / ocioso (ms): {summary(idle_lags)}")
+        print(f"GET / durante os logins (ms): {summary(storm_lags)} ({len(storm_lags)} amostras)")
+        return 0 if statuses.get(200) else 1
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="Segundos entre as sondas GET /")
+    parser.add_argument("--baseline", type=float, default=2, help="Segundos medindo o loop ocioso")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--email", default="cliente@teste.com")
+    parser.add_argument("--password", default="123")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Micro-benchmarks dos caminhos quentes, com baseline e limite de regressão.
+
+Casos:
+  - crud: get_active_orders (ORM e _data), get_user_order_history, create_order
+    (num banco com a massa sintética do app.seed; cada create_order é desfeito,
+    para o banco não mudar entre as chamadas);
+  - IA 1: parser.normalize_text e parser.parse_order_text com cardápios de
+    10, 100 e 1000 produtos (carregado de ../ia_1_nlu; pulado sem spaCy ou
+    sem modelo de português);
+  - IA 2: gemini_service.format_history e a montagem do prompt inteira
+    (get_gemini_recommendation com o Gemini dublê, sem latência);
+  - WebSocket: ConnectionManager.broadcast_to_kitchens para 100 e 1000
+    sockets falsos, até todos os frames serem "enviados".
+
+Cada caso roda em lotes de pelo menos --min-time segundos, --repeat vezes.
+A comparação usa o menor tempo por chamada entre os lotes (o menos afetado
+por ruído da máquina, como no timeit); a mediana aparece só para referência. Com --save-baseline os resultados vão
+para o arquivo de baseline; sem, são comparados com ele e o script sai com
+código 1 se algum caso ficar mais de --threshold (padrão 25%) mais lento.
+A baseline só vale para a máquina e o banco em que foi gravada: grave na
+mesma máquina (ex.: no CI, a partir da main) que vai rodar a comparação.
+
+Uso (a partir de backend/):
+    python -m benchmarks.microbench --save-baseline        # SQLite temporário
+    python -m benchmarks.microbench                        # compara com a baseline
+    python -m benchmarks.microbench --database-url postgresql+psycopg2://...  (banco de TESTE: é esvaziado!)
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import create_engine, event, func, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.seed import reset_and_seed, synthetic_products
+from app.services import gemini_service
+from app.websocket_manager import ConnectionManager
+
+from .stubs import StubGeminiModel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Só vale para a máquina que gravou: fica fora do git (ver .gitignore)
+DEFAULT_BASELINE = os.path.join(HERE, "microbench_baseline.json")
+NLU_PARSER = os.path.join(HERE, "..", "..", "ia_1_nlu", "app", "parser.py")
+CATALOG_SIZES = (10, 100, 1000)
+BROADCAST_SIZES = (100, 1000)
+# Event loops dos casos assíncronos, fechados no fim (close_loops)
+_loops = []
+CHAT_TEXT = "quero dois cafés espresso, meia dúzia de pão de queijo e um bolo de fubá, por favor!"
+
+
+def _new_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    _loops.append(loop)
+    return loop
+
+
+def close_loops():
+    """Cancela as tasks pendentes (writers do ConnectionManager) e fecha os loops."""
+    async def cancel_pending():
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for loop in _loops:
+        loop.run_until_complete(cancel_pending())
+        loop.close()
+
+
+def measure(fn: Callable[[], object], min_time: float, repeat: int) -> Dict[str, float]:
+    """Segundos por chamada (mínimo e mediana de `repeat` lotes de pelo menos min_time)."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed < min_time / 4 else max(2, round(min_time / max(elapsed, 1e-9)))
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return {"median": statistics.median(samples), "min": min(samples), "loops": loops}
+
+
+def prepare_database(database_url: str, orders: int):
+    """Banco de teste esvaziado e populado com a massa sintética (sempre a mesma)."""
+    engine = create_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        # O pysqlite adia o BEGIN e não respeita SAVEPOINT dentro dele; com o BEGIN
+        # explícito o rollback do create_order (crud_cases) desfaz tudo
+        @event.listens_for(engine, "connect")
+        def _autocommit_driver(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _begin(conn):
+            conn.exec_driver_sql("BEGIN")
+
+    with redirect_stdout(open(os.devnull, "w")):
+        reset_and_seed(engine, users=max(10, orders // 40), products=50, orders=orders, seed=42,
+                       active_ratio=0.01, until=datetime(2026, 1, 1, tzinfo=timezone.utc))
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        # create_order nunca pode esbarrar no estoque
+        db.execute(update(models.Product).values(quantidade_estoque=10 ** 9))
+        db.commit()
+    return engine, Session
+
+
+def crud_cases(engine, Session) -> Dict[str, Callable]:
+    with Session() as db:
+        # Cliente com mais pedidos: o histórico e os favoritos mais pesados
+        user_id = db.scalar(select(models.Order.usuario_id).group_by(models.Order.usuario_id)
+                            .order_by(func.count().desc()).limit(1))
+        product_ids = db.scalars(select(models.Product.id).order_by(models.Product.id).limit(3)).all()
+    items = [schemas.OrderItemBase(produto_id=product_id, quantidade=1) for product_id in product_ids]
+
+    def run(fn, *args):
+        def call():
+            with Session() as db:
+                fn(db, *args)
+        return call
+
+    def rolled_back(fn, *args):
+        # O commit do crud vira um SAVEPOINT dentro de uma transação desfeita no
+        # fim: cada chamada encontra o mesmo banco (a fila não cresce) e o tempo
+        # não inclui o fsync do commit, que só mede o disco da máquina
+        def call():
+            with engine.connect() as conn:
+                transaction = conn.begin()
+                with Session(bind=conn, join_transaction_mode="create_savepoint") as db:
+                    fn(db, *args)
+                transaction.rollback()
+        return call
+
+    return {
+        "crud.get_active_orders": run(crud.get_active_orders),
+        "crud.get_active_orders_data": run(crud.get_active_orders_data),
+        "crud.get_user_order_history": run(crud.get_user_order_history, user_id),
+        "crud.create_order": rolled_back(crud.create_order, user_id, items),
+    }
+
+
+def gemini_cases(Session) -> Dict[str, Callable]:
+    with Session() as db:
+        user_id = db.scalar(select(models.Order.usuario_id).group_by(models.Order.usuario_id)
+                            .order_by(func.count().desc()).limit(1))
+        favorites = crud.get_user_favorites(db, user_id)
+        all_products = crud.get_all_products(db)
+    promotions = [p for p in all_products if p.em_promocao]
+    parsed_items = [schemas.OrderItemBase(produto_id=p.id, quantidade=2) for p in all_products[:2]]
+    gemini_service.model = StubGeminiModel(latency_ms=0)
+    loop = _new_loop()
+
+    def prompt():
+        loop.run_until_complete(gemini_service.get_gemini_recommendation(
+            "confirm", parsed_items, favorites, promotions, all_products))
+
+    return {
+        "gemini.format_history": lambda: gemini_service.format_history(favorites),
+        "gemini.prompt": prompt,
+    }
+
+
+class FakeWebSocket:
+    """Socket que aceita tudo na hora: mede só o custo do ConnectionManager."""
+
+    async def send_text(self, frame: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def broadcast_cases(Session) -> Dict[str, Callable]:
+    with Session() as db:
+        order_id = db.scalar(select(func.max(models.Order.id)))
+        message = {"type": "new_order", "data": crud.get_order_data(db, order_id)}
+    cases = {}
+    for size in BROADCAST_SIZES:
+        loop = _new_loop()
+        manager = ConnectionManager()
+
+        async def connect(manager=manager, size=size):
+            for _ in range(size):
+                manager.connect(FakeWebSocket(), user_id=0, role="cozinheiro")
+
+        async def broadcast(manager=manager):
+            await manager.broadcast_to_kitchens(message)
+            for connection in manager.kitchen_connections:
+                await connection.queue.join()
+
+        loop.run_until_complete(connect())
+        cases[f"ws.broadcast_to_kitchens[{size}]"] = lambda loop=loop, broadcast=broadcast: \
+            loop.run_until_complete(broadcast())
+    return cases
+
+
+def load_nlu_parser(path: str):
+    """O parser.py da IA 1, carregado pelo caminho (os dois serviços se chamam "app")."""
+    try:
+        spec = importlib.util.spec_from_file_location("ia_1_nlu_parser", path)
+        parser = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(parser)
+    except (ImportError, OSError) as e:
+        print(f"Casos da IA 1 pulados: {e}")
+        return None
+    return parser
+
+
+def nlu_cases(path: str) -> Dict[str, Callable]:
+    parser = load_nlu_parser(path)
+    if parser is None:
+        return {}
+    cases = {"nlu.normalize_text": lambda: parser.normalize_text(CHAT_TEXT)}
+    try:
+        parser.load_model()
+    except OSError as e:
+        print(f"parse_order_text pulado: {e}")
+        return cases
+    for size in CATALOG_SIZES:
+        keywords = [k for row in synthetic_products(size, 1, random.Random(size)) for k in row[4].split(",")]
+        cases[f"nlu.parse_order_text[{size}]"] = lambda keywords=keywords: parser.parse_order_text(CHAT_TEXT, keywords)
+    return cases
+
+
+def compare(results: dict, baseline: Optional[dict], threshold: float) -> int:
+    print(f"{'caso':<34} {'mín (µs)':>10} {'mediana (µs)':>13} {'baseline':>10} {'variação':>9}")
+    regressions = 0
+    for name, result in results.items():
+        min_us = result["min"] * 1e6
+        line = f"{name:<34} {min_us:>10.1f} {result['median'] * 1e6:>13.1f}"
+        reference = (baseline or {}).get("results", {}).get(name)
+        if reference is None:
+            print(line + f" {'-':>10} {'novo':>9}")
+            continue
+        change = min_us / reference["min_us"] - 1
+        regressed = change > threshold
+        regressions += regressed
+        print(line + f" {reference['min_us']:>10.1f} {change:>+8.0%}" + ("  REGRESSÃO" if regressed else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Banco de TESTE, esvaziado (padrão: SQLite temporário)")
+    parser.add_argument("--orders", type=int, default=20000, help="Pedidos na massa sintética")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Duração mínima (s) de cada lote")
+    parser.add_argument("--repeat", type=int, default=5, help="Lotes por caso")
+    parser.add_argument("--filter", default="", help="Só os casos cujo nome contém este texto")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como a nova baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Regressão tolerada (0.25 = 25%% mais lento)")
+    parser.add_argument("--nlu-parser", default=NLU_PARSER, help="Caminho do parser.py da IA 1")
+    args = parser.parse_args()
+
+    database_url = args.database_url or \
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='coffeenet_micro_'), 'micro.db')}"
+    engine, Session = prepare_database(database_url, args.orders)
+    cases: Dict[str, Callable] = {}
+    cases.update(nlu_cases(args.nlu_parser))
+    cases.update(gemini_cases(Session))
+    cases.update(broadcast_cases(Session))
+    cases.update(crud_cases(engine, Session))
+
+    results = {}
+    for name, fn in cases.items():
+        if args.filter in name:
+            fn()  # aquecimento
+            results[name] = measure(fn, args.min_time, args.repeat)
+    close_loops()
+    engine.dispose()
+
+    meta = {"dialect": engine.dialect.name, "orders": args.orders, "python": platform.python_version(),
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("dialect") != meta["dialect"] or baseline["meta"].get("orders") != meta["orders"]:
+            print(f"Aviso: baseline gravada com {baseline.get('meta')}; agora {meta}")
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f).get("results", {})
+        # Com --filter, só os casos rodados são substituídos
+        saved.update({name: {"median_us": round(r["median"] * 1e6, 3), "min_us": round(r["min"] * 1e6, 3)}
+                      for name, r in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump({"meta": meta, "results": saved}, f, indent=2, ensure_ascii=False)
+        print(f"Baseline gravada em {args.baseline}")
+    elif baseline is None:
+        print(f"Sem baseline em {args.baseline}: rode com --save-baseline para gravar uma.")
+    elif regressions:
+        print(f"{regressions} caso(s) mais de {args.threshold:.0%} mais lento(s) que a baseline.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+O app do backend com o Gemini trocado pelo StubGeminiModel (ver stubs.py).
+
+A IA 1 não precisa de troca aqui: basta IA_1_NLU_URL apontar para o
+stubs.nlu_app. Usado pelo benchmarks.load_test:
+    gunicorn benchmarks.stubbed_backend:app -c gunicorn.conf.py
+"""
+from app.services import gemini_service
+
+from .stubs import StubGeminiModel
+
+
+def _init_stub() -> bool:
+    gemini_service.model = StubGeminiModel()
+    print(f"Gemini substituído pelo dublê ({gemini_service.model.latency_ms:.0f} ms).")
+    return True
+
+
+# O lifespan (health.warm_up) chama gemini_service.init
+gemini_service.init = _init_stub
+
+from app.main import app  # noqa: E402
@@ -0,0 +1,90 @@
+"""
+Dublês da IA 1 (NLU) e da IA 2 (Gemini) para os testes de carga.
+
+- nlu_app: mesmo contrato do ia_1_nlu (POST /parse, /healthz, /readyz), sem
+  spaCy: acha as palavras-chave dos produtos no texto e o número logo antes.
+  Latência: NLU_STUB_LATENCY_MS (média, em ms; varia ±50%).
+- StubGeminiModel: no lugar do genai.GenerativeModel, responde um texto fixo
+  depois de GEMINI_STUB_LATENCY_MS (média, em ms; varia ±50%). Instalado no
+  backend por benchmarks.stubbed_backend.
+
+Assim a carga mede o backend (banco, WebSocket, limitador), com as IAs
+custando um tempo conhecido e sem gastar a cota do Gemini.
+
+Uso avulso da NLU (a partir de backend/):
+    NLU_STUB_LATENCY_MS=30 uvicorn benchmarks.stubs:nlu_app --port 8001
+"""
+import asyncio
+import os
+import random
+import re
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+NLU_STUB_LATENCY_MS = float(os.getenv("NLU_STUB_LATENCY_MS", "30"))
+GEMINI_STUB_LATENCY_MS = float(os.getenv("GEMINI_STUB_LATENCY_MS", "400"))
+
+_NUMBERS = {"um": 1, "uma": 1, "dois": 2, "duas": 2, "três": 3, "tres": 3, "quatro": 4, "cinco": 5}
+
+
+async def _sleep_ms(mean_ms: float):
+    if mean_ms > 0:
+        await asyncio.sleep(mean_ms * random.uniform(0.5, 1.5) / 1000)
+
+
+def parse_text(text: str, product_keywords: list) -> list:
+    """Cada palavra-chave encontrada vira um item; a quantidade é o número antes dela (ou 1)."""
+    text = text.lower()
+    items = []
+    for keyword in sorted(set(k.strip().lower() for k in product_keywords if k.strip()), key=len, reverse=True):
+        match = re.search(rf"(?:(\d+|{'|'.join(_NUMBERS)})\s+)?\b{re.escape(keyword)}\b", text)
+        if not match:
+            continue
+        quantity = match.group(1)
+        items.append({
+            "product_guess": keyword,
+            "quantity": int(quantity) if quantity and quantity.isdigit() else _NUMBERS.get(quantity, 1),
+        })
+        # Não conta de novo a mesma parte do texto ("café" dentro de "café com leite")
+        text = text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+    return items
+
+
+class NLURequest(BaseModel):
+    text: str
+    product_keywords: list[str]
+
+
+nlu_app = FastAPI(title="IA 1 (dublê para testes de carga)")
+
+
+@nlu_app.post("/parse")
+async def parse(request: NLURequest):
+    await _sleep_ms(NLU_STUB_LATENCY_MS)
+    return {"items": parse_text(request.text, request.product_keywords)}
+
+
+@nlu_app.get("/healthz")
+@nlu_app.get("/readyz")
+def ready():
+    return {"ready": True, "stub": True}
+
+
+class _StubResponse:
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiModel:
+    """Só o que o gemini_service usa do genai.GenerativeModel."""
+
+    def __init__(self, latency_ms: float = GEMINI_STUB_LATENCY_MS):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str) -> _StubResponse:
+        self.calls += 1
+        await _sleep_ms(self.latency_ms)
+        return _StubResponse("Beleza! Anotado aqui. Vai querer mais alguma coisa?")
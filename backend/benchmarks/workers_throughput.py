@@ -0,0 +1,124 @@
+"""
+Vazão do servidor de produção (gunicorn.conf.py) com 1, 2, 4, ... workers.
+
+Para cada número de workers, sobe o gunicorn com WEB_CONCURRENCY=N, espera o
+/readyz, faz login como cozinha e dispara --concurrency requisições em
+paralelo, por --duration segundos, alternando GET /orders/active (fila da
+cozinha, vai ao banco) e GET /products/ (catálogo em cache). Mostra
+requisições/s e p50/p99 (ms) de cada rota.
+
+Os workers só ajudam até o nº de CPUs da máquina (e do banco): acima disso a
+vazão para de subir e a latência cresce.
+
+Pré-requisitos: DATABASE_URL apontando para um PostgreSQL de TESTE já migrado
+e com o seed padrão (cozinha@teste.com, senha 123).
+
+Uso (a partir de backend/):
+    python -m benchmarks.workers_throughput --workers 1,2,4,8 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .ws_multiworker import percentile
+
+ROUTES = ("/orders/active", "/products/")
+
+
+async def wait_until_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/readyz")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Backend não ficou pronto a tempo")
+
+
+async def load(base_url: str, token: str, concurrency: int, duration: float):
+    """Latências (ms) por rota e nº de erros."""
+    latencies = {route: [] for route in ROUTES}
+    errors = 0
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=30, limits=limits) as client:
+        deadline = time.monotonic() + duration
+
+        async def user(i: int):
+            nonlocal errors
+            n = i
+            while time.monotonic() < deadline:
+                route = ROUTES[n % len(ROUTES)]
+                n += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(route)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies[route].append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return latencies, errors
+
+
+async def run_workers(args, workers: int):
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = os.environ.copy()
+    env.update({"WEB_CONCURRENCY": str(workers), "PORT": str(args.port)})
+    server = subprocess.Popen(
+        ["gunicorn", "app.main:app", "-c", "gunicorn.conf.py",
+         "--bind", f"127.0.0.1:{args.port}", "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        await wait_until_ready(base_url)
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            response = await client.post("/users/token", data={"username": args.email, "password": args.password})
+            response.raise_for_status()
+            token = response.json()["access_token"]
+        # Aquecimento: todos os workers com pool e caches prontos
+        await load(base_url, token, args.concurrency, 1)
+        latencies, errors = await load(base_url, token, args.concurrency, args.duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4,8", help="Números de workers a testar")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requisições em paralelo")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos de carga por rodada")
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--email", default="cozinha@teste.com")
+    parser.add_argument("--password", default="123")
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}")
+    print(f"{'workers':>7} {'req/s':>8} {'erros':>6}  " + "  ".join(f"{r + ' p50/p99 (ms)':>30}" for r in ROUTES))
+    for workers in (int(w) for w in args.workers.split(",")):
+        latencies, errors = asyncio.run(run_workers(args, workers))
+        total = sum(len(values) for values in latencies.values())
+        columns = "  ".join(
+            f"{statistics.median(values) if values else float('nan'):>21.1f}/{percentile(values, 99):<8.1f}"
+            for values in latencies.values()
+        )
+        print(f"{workers:>7} {total / args.duration:>8.0f} {errors:>6}  {columns}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark de conexões WebSocket ociosas.
+
+Sobe o backend com UM worker (para medir a memória de um processo só), abre N
+WebSockets de cliente que ficam parados (só respondem aos pings do servidor)
+e mede:
+- memória residente (RSS) do worker antes e depois -> bytes por conexão;
+- conexões do pool do banco em uso com os sockets abertos (deve ser 0:
+  o endpoint só usa o banco no handshake).
+
+Pré-requisitos: DATABASE_URL apontando para um banco de TESTE já migrado e com
+o seed padrão (cliente@teste.com, senha 123).
+
+Uso (a partir de backend/):
+    python -m benchmarks.ws_idle --connections 10000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+from .ws_multiworker import login, wait_until_up
+
+
+def rss_bytes(pid: int) -> int:
+    """Memória residente de um processo (Linux)."""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("VmRSS não encontrado")
+
+
+def raise_fd_limit(needed: int):
+    """Cada socket é um arquivo aberto: sobe o limite até o máximo permitido."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if hard < needed:
+        print(f"Aviso: limite de arquivos abertos ({hard}) menor que o necessário ({needed}).")
+
+
+async def idle_client(url: str, opened: list, ready: asyncio.Semaphore, stop: asyncio.Event):
+    """
+    Conecta, responde aos pings e fica parado até o fim do teste. Sinaliza
+    `ready` uma única vez: ao abrir ou ao falhar a conexão. Socket que abriu e
+    caiu durante a espera conta como derrubado, não como falha de conexão.
+    """
+    signalled = False
+    try:
+        async with websockets.connect(url, open_timeout=60, max_size=None) as ws:
+            opened[0] += 1
+            signalled = True
+            ready.release()
+
+            async def answer_pings():
+                async for frame in ws:
+                    if '"ping"' in frame:
+                        await ws.send('{"type":"pong"}')
+
+            responder = asyncio.create_task(answer_pings())
+            await stop.wait()
+            responder.cancel()
+    except Exception as e:
+        if signalled:
+            opened[2] += 1
+            if opened[2] <= 5:
+                print(f"Conexão caiu durante a espera: {e!r}")
+            return
+        opened[1] += 1
+        ready.release()
+        if opened[1] <= 5:
+            print(f"Falha ao conectar: {e!r}")
+
+
+async def run(args):
+    raise_fd_limit(args.connections + 100)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning", "--backlog", "4096"],
+        env=os.environ.copy(),
+        stdout=subprocess.DEVNULL,  # um "WS Connect" por socket
+    )
+    stop = asyncio.Event()
+    try:
+        await wait_until_up(base_url)
+        async with httpx.AsyncClient(timeout=60) as client:
+            token = await login(client, base_url, args.email, args.password)
+            url = f"ws://127.0.0.1:{args.port}/ws/{token}"
+
+            # Uma conexão de aquecimento: imports e caches do primeiro acesso não entram na conta
+            async with websockets.connect(url) as ws:
+                await ws.recv()
+            await asyncio.sleep(1)
+            rss_before = rss_bytes(server.pid)
+
+            opened = [0, 0, 0]  # [abertas, falhas, caídas durante a espera]
+            ready = asyncio.Semaphore(0)
+            gate = asyncio.Semaphore(args.concurrency)
+            started = time.perf_counter()
+
+            async def open_one():
+                async with gate:
+                    task = asyncio.create_task(idle_client(url, opened, ready, stop))
+                    await ready.acquire()
+                    return task
+
+            tasks = await asyncio.gather(*(open_one() for _ in range(args.connections)))
+            open_seconds = time.perf_counter() - started
+
+            await asyncio.sleep(args.hold)
+            rss_after = rss_bytes(server.pid)
+            pool = (await client.get(f"{base_url}/metrics/pool")).json()["primary"]
+            ws_stats = (await client.get(f"{base_url}/metrics/ws")).json()
+
+        connected = ws_stats["client_connections"] + ws_stats["kitchen_connections"]
+        per_connection = (rss_after - rss_before) / max(opened[0], 1)
+        print(f"conexões: {opened[0]} abertas, {opened[1]} falhas, {opened[2]} caídas, "
+              f"{connected} registradas no servidor")
+        print(f"abertura: {open_seconds:.1f}s ({opened[0] / open_seconds:.0f} conexões/s)")
+        print(f"RSS do worker: {rss_before / 2**20:.1f} MiB -> {rss_after / 2**20:.1f} MiB "
+              f"(~{per_connection / 1024:.1f} KiB por conexão)")
+        print(f"pool do banco com os sockets abertos: checkedout={pool['checkedout']} "
+              f"checkouts={pool['checkouts']} timeouts={pool['timeouts']}")
+        print(f"WS derrubados: {ws_stats['dropped']}")
+
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        ok = opened[1] == 0 and opened[2] == 0 and not pool["checkedout"]
+        return 0 if ok else 1
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=200, help="Handshakes simultâneos")
+    parser.add_argument("--hold", type=float, default=5, help="Segundos com tudo aberto antes de medir")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--email", default="cliente@teste.com")
+    parser.add_argument("--password", default="123")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
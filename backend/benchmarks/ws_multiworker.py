@@ -0,0 +1,151 @@
+"""
+Teste de carga multi-worker do barramento de eventos.
+
+Sobe o backend com N workers do uvicorn, conecta K cozinhas via WebSocket
+(o kernel distribui as conexões entre os workers), confirma M pedidos em
+paralelo e confere se TODAS as cozinhas receberam TODOS os "new_order",
+independente do worker que atendeu a confirmação.
+
+Pré-requisitos: DATABASE_URL apontando para um PostgreSQL de TESTE já migrado
+e com o seed padrão (cozinha@teste.com / cliente@teste.com, senha 123).
+
+Uso (a partir de backend/):
+    python -m benchmarks.ws_multiworker --workers 4 --kitchens 20 --orders 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def wait_until_up(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Backend não subiu a tempo")
+
+
+async def login(client: httpx.AsyncClient, base_url: str, email: str, password: str) -> str:
+    response = await client.post(f"{base_url}/users/token", data={"username": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def kitchen_listener(ws_url: str, token: str, expected: int, received: dict, ready: asyncio.Event, counter: list):
+    """Conecta uma cozinha e anota quando cada new_order chega."""
+    async with websockets.connect(f"{ws_url}/ws/{token}", max_size=None) as ws:
+        await ws.recv()  # initial_state
+        counter[0] += 1
+        if counter[0] == counter[1]:
+            ready.set()
+        seen = 0
+        while seen < expected:
+            message = json.loads(await ws.recv())
+            if message.get("type") == "new_order":
+                received.setdefault(message["data"]["id"], []).append(time.perf_counter())
+                seen += 1
+
+
+async def run(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    ws_url = f"ws://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        await wait_until_up(base_url)
+        async with httpx.AsyncClient(timeout=30) as client:
+            kitchen_token = await login(client, base_url, args.kitchen_email, args.password)
+            client_token = await login(client, base_url, args.client_email, args.password)
+            kitchen_headers = {"Authorization": f"Bearer {kitchen_token}"}
+            client_headers = {"Authorization": f"Bearer {client_token}"}
+
+            # Garante estoque suficiente para todos os pedidos do teste
+            products = (await client.get(f"{base_url}/products/", headers=kitchen_headers)).json()
+            product_id = products[0]["id"]
+            await client.put(f"{base_url}/products/{product_id}", headers=kitchen_headers,
+                             json={"quantidade_estoque": args.orders * 10 + 1000})
+
+            received: dict = {}
+            ready = asyncio.Event()
+            counter = [0, args.kitchens]
+            listeners = [
+                asyncio.create_task(kitchen_listener(ws_url, kitchen_token, args.orders, received, ready, counter))
+                for _ in range(args.kitchens)
+            ]
+            await asyncio.wait_for(ready.wait(), timeout=30)
+
+            sent_at: dict = {}
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def confirm():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(f"{base_url}/orders/confirm", headers=client_headers,
+                                                 json={"items": [{"produto_id": product_id, "quantidade": 1}]})
+                    response.raise_for_status()
+                    sent_at[response.json()["id"]] = start
+
+            started = time.perf_counter()
+            await asyncio.gather(*(confirm() for _ in range(args.orders)))
+            confirm_seconds = time.perf_counter() - started
+
+            done, pending = await asyncio.wait(listeners, timeout=args.drain_timeout)
+            for task in pending:
+                task.cancel()
+
+        deliveries = sum(len(times) for times in received.values())
+        expected = args.orders * args.kitchens
+        latencies = [(t - sent_at[order_id]) * 1000 for order_id, times in received.items()
+                     if order_id in sent_at for t in times]
+        print(f"workers={args.workers} cozinhas={args.kitchens} pedidos={args.orders}")
+        print(f"confirmações: {args.orders / confirm_seconds:.1f} pedidos/s")
+        print(f"entregas: {deliveries}/{expected} ({100 * deliveries / expected:.1f}%)")
+        if latencies:
+            print(f"latência confirm->cozinha (ms): p50={statistics.median(latencies):.1f} "
+                  f"p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f} "
+                  f"max={max(latencies):.1f}")
+        return 0 if deliveries == expected else 1
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--kitchens", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20, help="Confirmações simultâneas")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    parser.add_argument("--kitchen-email", default="cozinha@teste.com")
+    parser.add_argument("--client-email", default="cliente@teste.com")
+    parser.add_argument("--password", default="123")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
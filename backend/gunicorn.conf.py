@@ -0,0 +1,26 @@
+# Configuração do servidor de produção (start.sh, RUN_MODE=production).
+# Vários workers uvicorn sob o gunicorn, com o código do app carregado uma vez
+# no processo principal (preload) e compartilhado pelos workers.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Nº de workers: WEB_CONCURRENCY ou um por CPU. Lembre do pool do banco:
+# workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) precisa caber no max_connections.
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "app.server.DrainingUvicornWorker"
+# Importa o app antes do fork: os workers sobem mais rápido e dividem a memória
+# do código. Conexões (banco, LISTEN, clientes HTTP) só são abertas no lifespan
+# de cada worker, depois do fork.
+preload_app = True
+# Tempo para o worker drenar os WebSockets (WS_DRAIN_SECONDS) e terminar as
+# requisições em andamento antes de ser morto
+graceful_timeout = int(float(os.getenv("WS_DRAIN_SECONDS", "10"))) + 20
+timeout = 60
+keepalive = 5
+backlog = 2048
+
+
+def child_exit(server, worker):
+    # As conexões (WebSocket, pool) do worker que saiu param de contar no /metrics
+    from app import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,97 @@
+"""Esquema inicial (equivalente ao antigo create_all)
+
+Bancos criados antes das migrações já têm essas tabelas; nesse caso cada
+tabela existente é simplesmente pulada e o banco passa a ser versionado.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("usuarios"):
+        op.create_table(
+            "usuarios",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("cargo", sa.Enum("cliente", "cozinheiro", name="userrole"), nullable=False),
+        )
+        op.create_index("ix_usuarios_id", "usuarios", ["id"])
+        op.create_index("ix_usuarios_email", "usuarios", ["email"], unique=True)
+
+    if not _has_table("produtos"):
+        op.create_table(
+            "produtos",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("nome", sa.String(), nullable=False),
+            sa.Column("preco", sa.Float(), nullable=False),
+            sa.Column("categoria", sa.String()),
+            sa.Column("keywords", sa.String()),
+            sa.Column("quantidade_estoque", sa.Integer(), nullable=False),
+            sa.Column("em_promocao", sa.Boolean(), nullable=False),
+            sa.Column("preco_promocional", sa.Float(), nullable=True),
+        )
+        op.create_index("ix_produtos_id", "produtos", ["id"])
+        op.create_index("ix_produtos_nome", "produtos", ["nome"])
+        op.create_index("ix_produtos_categoria", "produtos", ["categoria"])
+
+    if not _has_table("promocoes"):
+        op.create_table(
+            "promocoes",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("descricao", sa.String(), nullable=False),
+            sa.Column("produto_associado_id", sa.Integer(), sa.ForeignKey("produtos.id")),
+            sa.Column("ativa", sa.Boolean()),
+            sa.Column("data_inicio", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("data_fim", sa.DateTime(timezone=True)),
+        )
+        op.create_index("ix_promocoes_id", "promocoes", ["id"])
+
+    if not _has_table("pedidos"):
+        op.create_table(
+            "pedidos",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column(
+                "status",
+                sa.Enum("RECEBIDO", "EM_PRODUCAO", "CANCELADO", "PRONTO", name="orderstatus"),
+            ),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("total", sa.Float()),
+        )
+        op.create_index("ix_pedidos_id", "pedidos", ["id"])
+
+    if not _has_table("itens_pedido"):
+        op.create_table(
+            "itens_pedido",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("pedido_id", sa.Integer(), sa.ForeignKey("pedidos.id")),
+            sa.Column("produto_id", sa.Integer(), sa.ForeignKey("produtos.id")),
+            sa.Column("quantidade", sa.Integer(), nullable=False),
+            sa.Column("preco_no_momento", sa.Float(), nullable=False),
+        )
+        op.create_index("ix_itens_pedido_id", "itens_pedido", ["id"])
+
+
+def downgrade():
+    op.drop_table("itens_pedido")
+    op.drop_table("pedidos")
+    op.drop_table("promocoes")
+    op.drop_table("produtos")
+    op.drop_table("usuarios")
+    sa.Enum(name="orderstatus").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="userrole").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,46 @@
+"""Índices das consultas quentes de pedidos
+
+- ix_pedidos_usuario_created_at: histórico do cliente (usuario_id, created_at DESC)
+- ix_pedidos_ativos_created_at: fila da cozinha (parcial, só RECEBIDO/EM_PRODUCAO)
+- ix_itens_pedido_pedido_id: carga dos itens de cada pedido
+
+No PostgreSQL os índices são criados com CONCURRENTLY para não travar
+escritas em "pedidos" durante o deploy.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+ACTIVE_ORDERS = sa.text("status IN ('RECEBIDO', 'EM_PRODUCAO')")
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_pedidos_usuario_created_at", "pedidos", ["usuario_id", "created_at"],
+            if_not_exists=True, postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_pedidos_ativos_created_at", "pedidos", ["created_at"],
+            postgresql_where=ACTIVE_ORDERS, sqlite_where=ACTIVE_ORDERS,
+            if_not_exists=True, postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_itens_pedido_pedido_id", "itens_pedido", ["pedido_id"],
+            if_not_exists=True, postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_itens_pedido_pedido_id", table_name="itens_pedido")
+    op.drop_index("ix_pedidos_ativos_created_at", table_name="pedidos")
+    op.drop_index("ix_pedidos_usuario_created_at", table_name="pedidos")
@@ -0,0 +1,77 @@
+"""Tabela user_product_stats (favoritos incrementais por cliente)
+
+Cria o agregado e faz o backfill a partir dos pedidos já existentes, usando
+a mesma fórmula de score de crud.favorite_weight (copiada aqui para a migração
+não depender do código da aplicação).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+FAVORITES_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+FAVORITES_HALF_LIFE_DAYS = 90.0
+BATCH_SIZE = 5000
+
+
+def _weight(ordered_at):
+    if ordered_at is None:
+        ordered_at = datetime.now(timezone.utc)
+    if ordered_at.tzinfo is None:
+        ordered_at = ordered_at.replace(tzinfo=timezone.utc)
+    days = (ordered_at - FAVORITES_EPOCH).total_seconds() / 86400
+    return 2.0 ** (days / FAVORITES_HALF_LIFE_DAYS)
+
+
+def upgrade():
+    stats = op.create_table(
+        "user_product_stats",
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), primary_key=True),
+        sa.Column("produto_id", sa.Integer(), sa.ForeignKey("produtos.id"), primary_key=True),
+        sa.Column("vezes_pedido", sa.Integer(), nullable=False),
+        sa.Column("quantidade_total", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("ultimo_pedido_em", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_user_product_stats_usuario_score", "user_product_stats", ["usuario_id", "score"])
+
+    # --- Backfill: uma linha por (pedido, produto) ---
+    pedidos = sa.table("pedidos", sa.column("id"), sa.column("usuario_id"), sa.column("created_at"))
+    itens = sa.table("itens_pedido", sa.column("pedido_id"), sa.column("produto_id"), sa.column("quantidade"))
+    query = (
+        sa.select(pedidos.c.usuario_id, itens.c.produto_id, pedidos.c.created_at,
+                  sa.func.sum(itens.c.quantidade))
+        .select_from(pedidos.join(itens, itens.c.pedido_id == pedidos.c.id))
+        .where(pedidos.c.usuario_id.is_not(None))
+        .group_by(pedidos.c.id, pedidos.c.usuario_id, itens.c.produto_id, pedidos.c.created_at)
+    )
+    aggregated = {}
+    for user_id, product_id, created_at, quantity in op.get_bind().execute(query):
+        row = aggregated.setdefault((user_id, product_id), {
+            "usuario_id": user_id, "produto_id": product_id, "vezes_pedido": 0,
+            "quantidade_total": 0, "score": 0.0, "ultimo_pedido_em": None,
+        })
+        row["vezes_pedido"] += 1
+        row["quantidade_total"] += int(quantity or 0)
+        row["score"] += _weight(created_at)
+        if created_at is not None and (row["ultimo_pedido_em"] is None or created_at > row["ultimo_pedido_em"]):
+            row["ultimo_pedido_em"] = created_at
+
+    rows = list(aggregated.values())
+    for start in range(0, len(rows), BATCH_SIZE):
+        op.bulk_insert(stats, rows[start:start + BATCH_SIZE])
+
+
+def downgrade():
+    op.drop_index("ix_user_product_stats_usuario_score", table_name="user_product_stats")
+    op.drop_table("user_product_stats")
@@ -0,0 +1,29 @@
+"""Tabela eventos_payloads (eventos grandes demais para o NOTIFY)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "eventos_payloads",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_eventos_payloads_created_at", "eventos_payloads", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_eventos_payloads_created_at", table_name="eventos_payloads")
+    op.drop_table("eventos_payloads")
@@ -0,0 +1,25 @@
+"""Sequence eventos_seq (números de sequência dos eventos WebSocket)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Só o barramento do PostgreSQL usa a sequence; no SQLite o seq fica em memória
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.schema.CreateSequence(sa.Sequence("eventos_seq"), if_not_exists=True))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(sa.schema.DropSequence(sa.Sequence("eventos_seq"), if_exists=True))
@@ -0,0 +1,25 @@
+"""Coluna pedidos.versao (status_update compacto)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Com DEFAULT constante o PostgreSQL (11+) não reescreve a tabela
+    with op.batch_alter_table("pedidos") as batch_op:
+        batch_op.add_column(sa.Column("versao", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    with op.batch_alter_table("pedidos") as batch_op:
+        batch_op.drop_column("versao")
@@ -0,0 +1,27 @@
+"""Tabela rate_limit_buckets (limitador do chat compartilhado entre workers)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("chave", sa.String(), primary_key=True),
+        sa.Column("fichas", sa.Float(), nullable=False),
+        sa.Column("atualizado_em", sa.Float(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("rate_limit_buckets")
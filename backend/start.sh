@@ -1,5 +1,10 @@
 #!/bin/sh
-# Este script espera o banco de dados estar pronto e depois inicia a aplicação.
+# Inicialização do container do backend.
+#   ./start.sh          -> servidor (RUN_MODE=production: gunicorn com vários workers;
+#                          RUN_MODE=development: uvicorn com --reload)
+#   ./start.sh seed     -> passo único: migrações + dados iniciais (serviço "seed" do compose)
+set -e
+MODE="${1:-serve}"
 
 # Espera o PostgreSQL ficar disponível
 echo "Esperando PostgreSQL..."
@@ -8,10 +13,30 @@ while ! nc -z db 5432; do
 done
 echo "PostgreSQL iniciado."
 
-# Roda o script para popular o banco de dados
-echo "Populando o banco de dados..."
-python -m app.seed
+# Aplica as migrações do banco (cria/atualiza tabelas e índices)
+echo "Aplicando migrações..."
+alembic upgrade head
 
-# Inicia a aplicação FastAPI
-echo "Iniciando servidor FastAPI..."
-uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+if [ "$MODE" = "seed" ]; then
+  # Roda o script para popular o banco de dados (uma vez, e não a cada boot do servidor)
+  echo "Populando o banco de dados..."
+  exec python -m app.seed
+fi
+
+# Métricas dos workers (app/metrics.py): as da execução anterior não contam
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+  rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+  mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+# (permessage-deflate já é o padrão do uvicorn; fica explícito porque os
+# snapshots do WebSocket, cardápio e fila da cozinha, dependem dele)
+# "exec": o servidor vira o processo principal e recebe o SIGTERM do
+# "docker stop" direto, para drenar as conexões antes de sair.
+if [ "${RUN_MODE:-production}" = "development" ]; then
+  echo "Iniciando servidor FastAPI (desenvolvimento, --reload)..."
+  exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload --ws-per-message-deflate true
+fi
+
+echo "Iniciando servidor FastAPI (produção, ${WEB_CONCURRENCY:-$(nproc)} workers)..."
+exec gunicorn app.main:app -c gunicorn.conf.py
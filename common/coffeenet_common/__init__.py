@@ -0,0 +1,6 @@
+"""
+Código comum ao backend e à IA 1 (logs, métricas e profiler).
+
+Os dois serviços instalam este pacote pelo requirements.txt ("../common");
+as imagens são construídas a partir da raiz do repositório para copiá-lo.
+"""
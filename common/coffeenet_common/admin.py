@@ -0,0 +1,72 @@
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from typing import Optional
+from . import profiler
+
+# Rotas de diagnóstico do backend e da IA 1 (app.include_router(admin.router)),
+# liberadas pelo segredo PROFILE_TOKEN (header X-Profile-Token).
+# Sem PROFILE_TOKEN configurado, elas nem existem (404).
+
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    if not profiler.PROFILE_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not profiler.check_token(x_profile_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token do profiler inválido")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_profile_token)],
+    include_in_schema=False,
+)
+
+FORMAT = Query("collapsed", pattern="^(collapsed|speedscope)$")
+
+
+def _profile_response(profile_id: str, profile: dict, fmt: str) -> Response:
+    body, media_type = profiler.render(profile, fmt)
+    extension = "json" if fmt == "speedscope" else "txt"
+    return Response(body, media_type=media_type, headers={
+        "X-Profile-Id": profile_id,
+        "Content-Disposition": f'attachment; filename="{profile_id}.{fmt}.{extension}"',
+    })
+
+
+@router.post("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    format: str = FORMAT,
+    idle: bool = False,
+):
+    """
+    Perfil de todas as threads DESTE worker (o que atendeu a requisição) por
+    `seconds` segundos. Com vários workers, o pid vem no nome do perfil.
+    """
+    profile_id, profile = await profiler.profile_for(seconds, idle=idle)
+    return _profile_response(profile_id, profile, format)
+
+
+@router.post("/profile/requests")
+def profile_requests(
+    rate: float = Query(..., ge=0, le=1),
+    seconds: float = Query(60, gt=0, le=profiler.PROFILE_MAX_SECONDS * 12),
+):
+    """Perfila uma fração das requisições deste worker por um tempo (cada uma vira um perfil)."""
+    profiler.request_sampling.set(rate, seconds)
+    return {"pid": os.getpid(), "rate": rate, "seconds": seconds}
+
+
+@router.get("/profiles")
+def list_profiles():
+    return profiler.list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+def read_profile(profile_id: str, format: str = FORMAT):
+    profile = profiler.load(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Perfil não encontrado")
+    return _profile_response(profile_id, profile, format)
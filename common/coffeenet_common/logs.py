@@ -0,0 +1,81 @@
+"""
+Logs do backend e da IA 1: uma linha por evento, com nível e campos.
+
+Os módulos usam logging.getLogger(__name__) ("app.main", "app.crud"...) e
+passam os dados em extra={...}, em vez de montá-los no texto:
+
+    logger.debug("WS conectado", extra={"user_id": 1, "role": "cliente"})
+    -> {"ts": "...", "level": "DEBUG", "logger": "app.main", "msg": "WS conectado", "user_id": 1, "role": "cliente"}
+
+Os eventos do caminho quente (conexões WebSocket, cada análise da IA 1) são
+DEBUG; o padrão é WARNING, então eles ficam desligados (custo de um if) e só
+os erros aparecem. LOG_LEVEL=INFO mostra também a inicialização.
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import orjson
+except ImportError:  # a IA 1 não instala o orjson
+    orjson = None
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+# json (uma linha JSON por evento) ou text (legível, para desenvolvimento)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Atributos que todo LogRecord tem; o resto veio do extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        if orjson is not None:
+            return orjson.dumps(data, default=str).decode()
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def setup(package: str = "app"):
+    """
+    Configura os loggers do pacote e os deste (coffeenet_common.profiler...).
+    Idempotente: o import do app pode acontecer mais de uma vez.
+    """
+    for name in (package, __package__):
+        logger = logging.getLogger(name)
+        if getattr(logger, "_coffeenet_configured", False):
+            continue
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        # Não repete as linhas no logger raiz (gunicorn/uvicorn têm os seus)
+        logger.propagate = False
+        logger._coffeenet_configured = True
@@ -0,0 +1,79 @@
+"""
+Partes das métricas do Prometheus comuns ao backend e à IA 1: a duração das
+requisições HTTP por rota, o middleware que a mede e o corpo do GET /metrics.
+As séries de cada serviço ficam no app/metrics.py dele.
+
+Com vários workers (gunicorn ou uvicorn --workers), cada um tem os seus
+contadores; para o /metrics somar todos, defina PROMETHEUS_MULTIPROC_DIR (um
+diretório vazio a cada subida).
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Da IA 1 (alguns milissegundos) às rotas que chamam o Gemini (segundos)
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Duração das requisições HTTP por rota.",
+    ["method", "route", "status"], buckets=HTTP_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """
+    Mede cada requisição HTTP. ASGI puro (e não BaseHTTPMiddleware): não
+    muda o streaming das respostas e custa só um relógio e um observe.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # O roteamento grava a rota encontrada no scope; sem rota (404), um
+            # rótulo só, para não criar uma série por URL
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+def render():
+    """(corpo, content-type) do /metrics: deste worker ou, no modo multiprocesso, de todos."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Chamado quando um worker sai: tira os gauges dele das somas."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,447 @@
+"""
+Profiler por amostragem para workers em produção (sem dependências), usado
+pelo backend e pela IA 1; as rotas /admin ficam em admin.py.
+
+Uma thread acorda a cada PROFILE_INTERVAL segundos, lê a pilha das threads
+(sys._current_frames) e conta as pilhas iguais. O custo só existe enquanto há
+uma sessão aberta, e fica em torno de uma leitura de pilha por amostra.
+
+Quatro jeitos de ligar (todos exigem PROFILE_TOKEN; sem ele, tudo desligado):
+- POST /admin/profile?seconds=N: todas as threads deste worker por N segundos;
+  a resposta já é o arquivo.
+- Header X-Profile-Token numa requisição (ex: um /orders/chat no backend, um
+  /parse na IA 1): só essa requisição. A resposta traz X-Profile-Id; o
+  arquivo sai em GET /admin/profiles/{id}.
+- POST /admin/profile/requests?rate=0.01&seconds=300: uma fração das
+  requisições deste worker, cada uma no seu arquivo.
+- kill -USR2 <pid do worker>: como o primeiro, por PROFILE_SIGNAL_SECONDS; o
+  caminho do arquivo sai no log.
+
+Numa requisição, só entram as amostras do event loop em que ela está rodando
+(o que foi para o threadpool fica de fora). Threads paradas esperando (select,
+fila, lock) não contam, a não ser com idle=true.
+
+Os perfis ficam em PROFILE_DIR, compartilhado pelos workers (qualquer um
+entrega o arquivo), nos formatos "collapsed" (flamegraph.pl, speedscope) ou
+"speedscope" (JSON do https://www.speedscope.app).
+"""
+import asyncio
+import hmac
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # a IA 1 não instala o orjson
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Segredo que libera o profiler (header X-Profile-Token). Vazio = desligado.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Intervalo entre amostras (s). Abaixo do switch interval do Python (5 ms) não ganha nada.
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "coffeenet_profiles"))
+# Quantos perfis guardar em PROFILE_DIR (os mais antigos saem)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+# Fração das requisições perfiladas desde a subida (0 = nenhuma)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "10"))
+PROFILE_MAX_SECONDS = 300
+
+FORMATS = ("collapsed", "speedscope")
+_PROFILE_ID = re.compile(r"^[0-9T]+-[0-9]+-[0-9]+$")
+
+
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def _loads(raw: bytes):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# Última função Python de uma thread parada esperando algo (em C)
+IDLE_FRAMES = {
+    ("select", "selectors.py"),      # event loop sem nada para fazer
+    ("run", "runners.py"),           # idem, com uvloop (o loop todo é C)
+    ("asyncio_run", "_compat.py"),   # idem, uvloop sob o uvicorn
+    ("wait", "threading.py"),        # lock, Condition, Event
+    ("get", "queue.py"),
+    ("_worker", "thread.py"),        # ThreadPoolExecutor sem trabalho
+}
+
+
+def check_token(value: Optional[str]) -> bool:
+    # Compara bytes (os do header, que chega decodificado em latin-1): com str,
+    # o compare_digest levanta TypeError para texto não-ASCII
+    if not PROFILE_TOKEN or value is None:
+        return False
+    try:
+        return hmac.compare_digest(value.encode("latin-1"), PROFILE_TOKEN.encode())
+    except UnicodeEncodeError:
+        return False
+
+
+# --- Nomes dos frames ---
+_labels: Dict[object, str] = {}
+
+
+def _short_path(path: str) -> str:
+    """Caminho relativo ao sys.path (app/crud.py, sqlalchemy/orm/query.py...)."""
+    best = path
+    for prefix in sys.path:
+        prefix = os.path.abspath(prefix or os.getcwd())
+        if path.startswith(prefix + os.sep) and len(path) - len(prefix) < len(best):
+            best = path[len(prefix) + 1:]
+    return best
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        # ";" separa os frames no formato collapsed
+        label = f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+        _labels[code] = label
+    return label
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (code.co_name, os.path.basename(code.co_filename)) in IDLE_FRAMES
+
+
+class Session:
+    """
+    Amostras de uma sessão: pilhas (da raiz para a folha) -> contagem.
+    thread_id/anchor: só a thread dada e só as pilhas que passam pelo frame
+    anchor (o frame do middleware de uma requisição); sem eles, todas as threads.
+    """
+
+    def __init__(self, name: str, thread_id: Optional[int] = None, anchor=None, idle: bool = False):
+        self.name = name
+        self.thread_id = thread_id
+        self.anchor = anchor
+        self.idle = idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        # Passadas da thread do profiler durante a sessão (no máximo uma amostra
+        # por thread em cada): com o event loop ocupado ela espera o GIL, e o
+        # intervalo real passa do PROFILE_INTERVAL
+        self.ticks = 0
+        self.started = time.time()
+        self.duration = 0.0
+        self._thread_names: Dict[int, str] = {}
+
+    def _thread_name(self, thread_id: int) -> str:
+        name = self._thread_names.get(thread_id)
+        if name is None:
+            self._thread_names = {t.ident: t.name for t in threading.enumerate()}
+            name = self._thread_names.get(thread_id, f"thread-{thread_id}")
+        return name
+
+    def _add(self, frame, root: str):
+        if not self.idle and _is_idle(frame):
+            self.idle_samples += 1
+            return
+        labels = []
+        while frame is not None:
+            if frame is self.anchor:
+                break
+            labels.append(_label(frame.f_code))
+            frame = frame.f_back
+        else:
+            if self.anchor is not None:
+                # A thread estava rodando outra coisa (outra requisição, o loop)
+                return
+        labels.append(root)
+        labels.reverse()
+        self.stacks[tuple(labels)] += 1
+        self.samples += 1
+
+    def sample(self, frames: dict, own_thread: int):
+        self.ticks += 1
+        if self.thread_id is not None:
+            frame = frames.get(self.thread_id)
+            if frame is not None:
+                self._add(frame, self.name)
+            return
+        for thread_id, frame in frames.items():
+            if thread_id != own_thread:
+                self._add(frame, self._thread_name(thread_id))
+
+    def finish(self):
+        self.duration = time.time() - self.started
+        self.anchor = None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "pid": os.getpid(),
+            "started": self.started,
+            "duration": round(self.duration, 6),
+            # Tempo (s) que cada amostra representa
+            "interval": self.duration / self.ticks if self.ticks else PROFILE_INTERVAL,
+            "samples": self.samples,
+            "idle_samples": self.idle_samples,
+            "stacks": [[list(stack), count] for stack, count in self.stacks.most_common()],
+        }
+
+
+class Sampler:
+    """Uma thread por worker, viva só enquanto houver sessão aberta."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._sessions: List[Session] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def open(self, session: Session) -> Session:
+        with self._lock:
+            self._sessions.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def close(self, session: Session) -> Session:
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        session.finish()
+        return session
+
+    @property
+    def active(self) -> int:
+        return len(self._sessions)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                sessions = list(self._sessions)
+                frames = sys._current_frames()
+                for session in sessions:
+                    session.sample(frames, own)
+            del frames
+            time.sleep(self.interval)
+
+
+sampler = Sampler()
+
+
+# --- Formatos ---
+def to_collapsed(profile: dict) -> str:
+    """Uma linha por pilha: "raiz;...;folha contagem" (flamegraph.pl, speedscope, inferno)."""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in profile["stacks"])
+
+
+def to_speedscope(profile: dict) -> dict:
+    frames: List[dict] = []
+    index: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, count in profile["stacks"]:
+        ids = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                match = re.match(r"^(.*) \((.*):(\d+)\)$", label)
+                frames.append({"name": match.group(1), "file": match.group(2), "line": int(match.group(3))}
+                              if match else {"name": label})
+            ids.append(index[label])
+        samples.append(ids)
+        weights.append(count * profile["interval"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{profile['name']} (pid {profile['pid']})",
+        "exporter": "coffeenet",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": profile["name"],
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def render(profile: dict, fmt: str) -> Tuple[bytes, str]:
+    """(corpo, content-type) do perfil no formato pedido."""
+    if fmt == "speedscope":
+        return _dumps(to_speedscope(profile)), "application/json"
+    return to_collapsed(profile).encode(), "text/plain; charset=utf-8"
+
+
+# --- Arquivos (PROFILE_DIR, compartilhado pelos workers) ---
+_counter = itertools.count(1)
+
+
+def new_id() -> str:
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.getpid()}-{next(_counter)}"
+
+
+def save(profile_id: str, session: Session) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.json")
+    with open(path, "wb") as f:
+        f.write(_dumps(session.to_dict()))
+    _prune()
+    return path
+
+
+def _prune():
+    try:
+        names = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(".json"))
+    except OSError:
+        return
+    for name in names[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def load(profile_id: str) -> Optional[dict]:
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "rb") as f:
+            return _loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles() -> List[dict]:
+    """Os perfis guardados, do mais novo para o mais antigo (sem as pilhas)."""
+    try:
+        names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith(".json")), reverse=True)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        profile = load(name[:-len(".json")])
+        if profile is not None:
+            profile.pop("stacks")
+            profiles.append({"id": name[:-len(".json")], **profile})
+    return profiles
+
+
+# --- Perfil do worker inteiro por N segundos ---
+async def profile_for(seconds: float, idle: bool = False, name: str = "worker") -> Tuple[str, dict]:
+    session = sampler.open(Session(name, idle=idle))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.close(session)
+    profile_id = new_id()
+    await asyncio.to_thread(save, profile_id, session)
+    return profile_id, session.to_dict()
+
+
+def install_signal_handler(signum: int = getattr(signal, "SIGUSR2", 0)):
+    """kill -USR2 <pid do worker>: perfil de PROFILE_SIGNAL_SECONDS, gravado em PROFILE_DIR."""
+    if not PROFILE_TOKEN or not signum:
+        return
+
+    async def _run():
+        profile_id, profile = await profile_for(PROFILE_SIGNAL_SECONDS, name="signal")
+        logger.warning("Perfil gravado", extra={"id": profile_id, "dir": PROFILE_DIR, "samples": profile["samples"]})
+
+    try:
+        asyncio.get_running_loop().add_signal_handler(signum, lambda: asyncio.ensure_future(_run()))
+    except (NotImplementedError, RuntimeError, ValueError):
+        pass  # Windows ou fora da thread principal
+
+
+# --- Por requisição ---
+class RequestSampling:
+    """Fração das requisições perfiladas (PROFILE_SAMPLE_RATE ou, por um tempo, a do /admin)."""
+
+    def __init__(self, rate: float = PROFILE_SAMPLE_RATE):
+        self.rate = rate
+        self.until: Optional[float] = None
+        self.profiled = 0
+
+    def set(self, rate: float, seconds: float):
+        self.rate = rate
+        self.until = time.monotonic() + seconds
+
+    def current_rate(self) -> float:
+        if self.until is not None and time.monotonic() > self.until:
+            self.rate, self.until = PROFILE_SAMPLE_RATE, None
+        return self.rate
+
+    def wanted(self) -> bool:
+        rate = self.current_rate()
+        return rate > 0 and random.random() < rate
+
+
+request_sampling = RequestSampling()
+
+
+class ProfilerMiddleware:
+    """
+    Perfila a requisição com o header X-Profile-Token válido (ou sorteada pela
+    fração de amostragem). O arquivo é gravado antes do fim da resposta, que
+    leva o header X-Profile-Id. As rotas /admin nunca são perfiladas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILE_TOKEN or scope["path"].startswith("/admin"):
+            await self.app(scope, receive, send)
+            return
+        token = next((v for k, v in scope["headers"] if k == b"x-profile-token"), None)
+        if not ((token is not None and check_token(token.decode("latin-1"))) or request_sampling.wanted()):
+            await self.app(scope, receive, send)
+            return
+
+        request_sampling.profiled += 1
+        profile_id = new_id()
+        session = sampler.open(Session(
+            f"{scope['method']} {scope['path']}", thread_id=threading.get_ident(), anchor=sys._getframe(),
+        ))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False) \
+                    and session.anchor is not None:
+                # Fecha e grava antes do último pedaço: quem recebeu a resposta já acha o arquivo
+                sampler.close(session)
+                save(profile_id, session)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if session.anchor is not None:
+                sampler.close(session)
+                save(profile_id, session)
@@ -0,0 +1,8 @@
+from setuptools import find_packages, setup
+
+setup(
+    name="coffeenet-common",
+    version="0.1.0",
+    packages=find_packages(),
+    install_requires=["fastapi", "prometheus_client"],
+)
@@ -99,57 +99,107 @@
             }
         });
 
+        // Retomada após queda: último seq recebido e o stream dele
+        let lastSeq = null;
+        let lastStream = null;
+        let reconnectDelay = 1000;
+        let menuShown = false;
+
         function connectWebSocket() {
-            ws = new WebSocket(`ws://localhost:8000/ws/${token}`);
+            let url = `ws://localhost:8000/ws/${token}`;
+            if (lastSeq !== null && lastStream !== null) {
+                // O backend reenvia só o que foi perdido (ou o estado completo, se não der)
+                url += `?last_seq=${lastSeq}&stream=${encodeURIComponent(lastStream)}`;
+            }
+            ws = new WebSocket(url);
 
             ws.onopen = () => {
                 console.log("WebSocket conectado (Cliente).");
+                reconnectDelay = 1000;
             };
 
             ws.onmessage = (event) => {
                 const message = JSON.parse(event.data);
                 console.log("WS Recebido (Cliente):", message);
-
-                if (message.type === "status_update") {
-                    updateOrderStatus(message.data);
-                } else if (message.type === "menu") {
-                    currentMenu = message.data || [];
-                    let menuText = "Olá! Bem-vindo ao CoffeeNet! 😊\nNosso cardápio de hoje é:\n\n";
-                    if (message.data && message.data.length > 0) {
-                        message.data.forEach(product => {
-                            if (product.em_promocao && product.preco_promocional != null) {
-                                menuText += `- ${product.nome} (Promoção: R$ ${product.preco_promocional.toFixed(2)})\n`; // Mostra preço promo e risca o normal
-                            } else {
-                                menuText += `- ${product.nome} (R$ ${product.preco.toFixed(2)})\n`; // Mostra preço normal
-                            }
-                        });
-                        menuText += "\nO que você gostaria de pedir?";
-                    } else {
-                        menuText = "Olá! Bem-vindo ao CoffeeNet! 😊\nDesculpe, estamos sem produtos no momento.";
-                    }
-                    addMessageToChat(menuText, "bot");
-                    
-                    const initialBotMessage = chatMessages.querySelector('.message.bot');
-                    if (initialBotMessage && initialBotMessage.textContent.startsWith("Olá! O que você gostaria")) {
-                        initialBotMessage.remove(); // Remove só se for a genérica
-                    }
-                }
-                else if (message.type === "active_orders") {
-                    orderStatusList.innerHTML = ""; 
-                    if (message.data && message.data.length > 0) {
-                        message.data.forEach(order => renderOrderCard(order));
-                    }
-                }
+                handleMessage(message);
             };
 
             ws.onclose = () => {
                 console.log("WebSocket desconectado (Cliente).");
+                // Reconecta com espera crescente
+                setTimeout(connectWebSocket, reconnectDelay);
+                reconnectDelay = Math.min(reconnectDelay * 2, 30000);
             };
 
             ws.onerror = (err) => {
                 console.error("WebSocket erro (Cliente):", err);
             };
         }
+
+        function handleMessage(message) {
+            if (message.type === "ping") {
+                // Heartbeat do servidor: sem resposta, a conexão é derrubada por inatividade
+                ws.send(JSON.stringify({ type: "pong" }));
+                return;
+            }
+            if (message.type === "status_update") {
+                updateOrderStatus(message.data);
+            } else if (message.type === "menu") {
+                currentMenu = message.data || [];
+                // Numa reconexão o cardápio chega de novo; a saudação só aparece uma vez
+                if (menuShown) return;
+                menuShown = true;
+                let menuText = "Olá! Bem-vindo ao CoffeeNet! 😊\nNosso cardápio de hoje é:\n\n";
+                if (message.data && message.data.length > 0) {
+                    message.data.forEach(product => {
+                        if (product.em_promocao && product.preco_promocional != null) {
+                            menuText += `- ${product.nome} (Promoção: R$ ${product.preco_promocional.toFixed(2)})\n`; // Mostra preço promo e risca o normal
+                        } else {
+                            menuText += `- ${product.nome} (R$ ${product.preco.toFixed(2)})\n`; // Mostra preço normal
+                        }
+                    });
+                    menuText += "\nO que você gostaria de pedir?";
+                } else {
+                    menuText = "Olá! Bem-vindo ao CoffeeNet! 😊\nDesculpe, estamos sem produtos no momento.";
+                }
+                addMessageToChat(menuText, "bot");
+                
+                const initialBotMessage = chatMessages.querySelector('.message.bot');
+                if (initialBotMessage && initialBotMessage.textContent.startsWith("Olá! O que você gostaria")) {
+                    initialBotMessage.remove(); // Remove só se for a genérica
+                }
+            }
+            else if (message.type === "menu_delta") {
+                // Produto esgotou, voltou, mudou de preço ou entrou em promoção
+                const changed = new Set([...message.data.removed, ...message.data.updated.map(p => p.id)]);
+                currentMenu = currentMenu.filter(p => !changed.has(p.id)).concat(message.data.updated);
+                currentMenu.sort((a, b) => a.nome.localeCompare(b.nome));
+            }
+            else if (message.type === "sync") {
+                // Posição da sequência no momento do estado completo
+                lastStream = message.stream;
+                lastSeq = message.seq;
+                return;
+            }
+            else if (message.type === "replay") {
+                // Eventos perdidos durante a queda, em ordem
+                lastStream = message.stream;
+                message.events.forEach(handleMessage);
+            }
+            else if (message.type === "order") {
+                // Resposta do get_order
+                renderOrderCard(message.data);
+            }
+            else if (message.type === "active_orders") {
+                orderStatusList.innerHTML = ""; 
+                if (message.data && message.data.length > 0) {
+                    message.data.forEach(order => renderOrderCard(order));
+                }
+            }
+            if (message.seq != null && (lastSeq === null || message.seq > lastSeq)) {
+                lastSeq = message.seq;
+            }
+        }
         
         
         function addMessageToChat(text, sender) {
@@ -501,12 +551,20 @@
             }
         }
         
-        function updateOrderStatus(order) {
-            renderOrderCard(order);
+        function updateOrderStatus(update) {
+            // O backend manda só {id, status, versao}; os itens vêm do card que já está na tela
+            const known = currentOrders[update.id];
+            if (known && known.versao >= update.versao) return; // atualização velha ou repetida
+            if (known) {
+                renderOrderCard({ ...known, status: update.status, versao: update.versao });
+            } else {
+                // Pedido que esta aba não conhece (ex: feito em outra aba): pede o completo
+                ws.send(JSON.stringify({ type: "get_order", id: update.id }));
+            }
             
-            const statusText = STATUS_MAP[order.status];
-            if (order.status !== 0) { // Não notifica "Recebido"
-                addMessageToChat(`O status do seu Pedido #${order.id} foi atualizado para: ${statusText}`, "bot");
+            const statusText = STATUS_MAP[update.status];
+            if (update.status !== 0) { // Não notifica "Recebido"
+                addMessageToChat(`O status do seu Pedido #${update.id} foi atualizado para: ${statusText}`, "bot");
             }
         }
     });
\ No newline at end of file
@@ -90,41 +90,95 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     });
     
+    // Estação: abra a página com ?topics=Bebidas (ou "Bebidas,Doces") para ver
+    // só os pedidos e itens dessas categorias. Sem o parâmetro, vê tudo.
+    const TOPICS = new URLSearchParams(window.location.search).get("topics");
+
+    // Retomada após queda: último seq recebido e o stream dele
+    let lastSeq = null;
+    let lastStream = null;
+    let reconnectDelay = 1000;
+    // Pedidos na tela, por id (os status_update só trazem {id, status, versao})
+    let orders = {};
+
     function connectWebSocket() {
-        ws = new WebSocket(`ws://localhost:8000/ws/${token}`);
+        const params = new URLSearchParams();
+        if (TOPICS) params.set("topics", TOPICS);
+        if (lastSeq !== null && lastStream !== null) {
+            // O backend reenvia só o que foi perdido (ou o estado completo, se não der)
+            params.set("last_seq", lastSeq);
+            params.set("stream", lastStream);
+        }
+        const query = params.toString();
+        ws = new WebSocket(`ws://localhost:8000/ws/${token}${query ? "?" + query : ""}`);
 
         ws.onopen = () => {
             console.log("WebSocket conectado (Cozinha).");
+            reconnectDelay = 1000;
         };
 
         ws.onmessage = (event) => {
             const message = JSON.parse(event.data);
             console.log("WS Recebido (Cozinha):", message);
-
-            if (message.type === "initial_state") {
-                message.data.forEach(order => renderOrderCard(order));
-                updateCounters();
-            } else if (message.type === "new_order") {
-                renderOrderCard(message.data);
-                 updateCounters();
-            } else if (message.type === "status_update") {
-                handleStatusUpdate(message.data);
-                 updateCounters();
-            }
+            handleMessage(message);
         };
 
         ws.onclose = () => {
             console.log("WebSocket desconectado (Cozinha).");
+            // Reconecta com espera crescente (Wi-Fi do tablet caiu, servidor reiniciou...)
+            setTimeout(connectWebSocket, reconnectDelay);
+            reconnectDelay = Math.min(reconnectDelay * 2, 30000);
         };
 
         ws.onerror = (err) => {
             console.error("WebSocket erro (Cozinha):", err);
         };
     }
+
+    function handleMessage(message) {
+        if (message.type === "ping") {
+            // Heartbeat do servidor: sem resposta, a conexão é derrubada por inatividade
+            ws.send(JSON.stringify({ type: "pong" }));
+            return;
+        }
+        if (message.type === "initial_state") {
+            // Estado completo: substitui o que estava na tela
+            Object.values(containers).forEach(container => container.innerHTML = "");
+            orders = {};
+            message.data.forEach(order => renderOrderCard(order));
+            updateCounters();
+        } else if (message.type === "sync") {
+            // Posição da sequência no momento do estado completo
+            lastStream = message.stream;
+            lastSeq = message.seq;
+            return;
+        } else if (message.type === "replay") {
+            // Eventos perdidos durante a queda, em ordem
+            lastStream = message.stream;
+            message.events.forEach(handleMessage);
+        } else if (message.type === "new_order") {
+            renderOrderCard(message.data);
+             updateCounters();
+        } else if (message.type === "status_update") {
+            handleStatusUpdate(message.data);
+             updateCounters();
+        } else if (message.type === "order") {
+            // Resposta do get_order: pedido completo que o painel não conhecia
+            renderOrderCard(message.data);
+            updateCounters();
+        }
+        if (message.seq != null && (lastSeq === null || message.seq > lastSeq)) {
+            lastSeq = message.seq;
+        }
+    }
     
     function renderOrderCard(order) {
         // ignora pedidos prontos ou cancelados
-        if (order.status > 1) return;
+        if (order.status > 1) {
+            delete orders[order.id];
+            return;
+        }
+        orders[order.id] = order;
         
         const container = containers[order.status];
         if (!container) return;
@@ -168,11 +222,20 @@ document.addEventListener("DOMContentLoaded", () => {
         container.appendChild(card);
     }
     
-    function handleStatusUpdate(order) {
+    function handleStatusUpdate(update) {
+        const known = orders[update.id];
+        if (!known) {
+            // Pedido que este painel não conhece: pede o completo (se ainda estiver ativo)
+            if (update.status <= 1) ws.send(JSON.stringify({ type: "get_order", id: update.id }));
+            return;
+        }
+        if (known.versao >= update.versao) return; // atualização velha ou repetida
+        const order = { ...known, status: update.status, versao: update.versao };
         const card = document.getElementById(`order-card-${order.id}`);
         
         if (order.status === 2 || order.status === 3) {
             // Pedido Cancelado ou Pronto: remove do painel
+            delete orders[order.id];
             if (card) {
                 card.style.opacity = '0';
                 setTimeout(() => {
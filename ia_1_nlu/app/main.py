@@ -1,8 +1,51 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response, status
 from pydantic import BaseModel
-from .parser import parse_order_text
+from coffeenet_common import admin, logs, profiler
+from . import metrics, parser
+from .parser import parse_order_text, parse_order_text_with_tier
+
+# Logs estruturados (LOG_LEVEL, LOG_FORMAT; ver coffeenet_common/logs.py)
+logs.setup()
+logger = logging.getLogger(__name__)
+
+# Tempos da inicialização (s) e erro do carregamento do modelo, se houver
+startup = {"timings": {}, "error": None}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    startup["timings"]["import"] = round(started - _import_started, 3)
+    # Carrega o modelo antes de aceitar conexões; sem ele o serviço sobe,
+    # mas o /readyz fica em 503 (e o erro aparece lá)
+    try:
+        parser.load_model()
+        startup["timings"]["model"] = round(time.perf_counter() - started, 3)
+        # Aquecimento: a primeira análise inicializa o pipeline e o vocabulário
+        warm_started = time.perf_counter()
+        parse_order_text("2 cafés e um pão de queijo", ["café", "pão de queijo"])
+        startup["timings"]["warm_up"] = round(time.perf_counter() - warm_started, 3)
+    except Exception as e:
+        startup["error"] = str(e)
+        logger.error("Falha ao carregar o modelo", extra={"error": str(e)})
+    startup["timings"]["startup"] = round(time.perf_counter() - started, 3)
+    total = startup["timings"]["startup"] + startup["timings"]["import"]
+    logger.info("IA 1 pronta", extra={"seconds": round(total, 3), "timings": startup["timings"]})
+    # kill -USR2 <pid do worker>: perfil de alguns segundos (com PROFILE_TOKEN; ver coffeenet_common/profiler.py)
+    profiler.install_signal_handler()
+    yield
+
 
-app = FastAPI(title="IA 1 - CoffeeNet NLU Parser")
+app = FastAPI(title="IA 1 - CoffeeNet NLU Parser", lifespan=lifespan)
+# Perfil de uma requisição com X-Profile-Token (ou de uma fração delas; ver coffeenet_common/profiler.py)
+app.add_middleware(profiler.ProfilerMiddleware)
+# Latência por rota (histograma do /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
 
 class NLURequest(BaseModel):
     text: str
@@ -18,9 +61,36 @@ async def parse_order(request: NLURequest):
     """
     Recebe texto em linguagem natural e retorna itens estruturados.
     """
-    parsed_items = parse_order_text(request.text, request.product_keywords)
+    started = time.perf_counter()
+    parsed_items, tier = parse_order_text_with_tier(request.text, request.product_keywords)
+    metrics.PARSE_DURATION.labels(tier).observe(time.perf_counter() - started)
+    metrics.PARSE_ITEMS.observe(len(parsed_items))
+    metrics.PARSE_KEYWORDS.observe(len(request.product_keywords))
     return NLUResponse(items=parsed_items)
 
 @app.get("/")
 def health_check():
-    return {"status": "IA 1 (NLU) está online!"}
\ No newline at end of file
+    return {"status": "IA 1 (NLU) está online!"}
+
+# Vivo: o processo responde
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+# Métricas no formato do Prometheus (ver metrics.py)
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+# Pronto: modelo carregado e aquecido
+@app.get("/readyz")
+def readyz(response: Response):
+    ready = parser.nlp is not None
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": ready, "timings": startup["timings"], "error": startup["error"]}
+
+
+# Rotas /admin do profiler (liberadas pelo segredo PROFILE_TOKEN; sem ele, 404)
+app.include_router(admin.router)
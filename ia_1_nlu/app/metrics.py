@@ -0,0 +1,35 @@
+"""
+Métricas da IA 1 no formato do Prometheus (GET /metrics):
+
+- http_request_duration_seconds{method, route, status}: por rota (middleware
+  de coffeenet_common.metrics, o mesmo do backend)
+- coffeenet_nlu_parse_duration_seconds{tier}: cada análise, pela etapa que
+  achou os itens (matcher, fallback, none, no_model; ver parser.py)
+- coffeenet_nlu_parse_items / coffeenet_nlu_parse_keywords: itens achados e
+  tamanho do cardápio recebido (o custo cresce com ele)
+
+Com vários workers do uvicorn, defina PROMETHEUS_MULTIPROC_DIR (vazio a cada
+subida; o CMD do Dockerfile cuida disso) para o /metrics somar todos.
+"""
+# Reexportados: o main.py usa metrics.MetricsMiddleware e metrics.render
+from coffeenet_common.metrics import (
+    HTTP_REQUEST_DURATION,
+    MetricsMiddleware,
+    render,
+)
+from prometheus_client import Histogram
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+PARSE_DURATION = Histogram(
+    "coffeenet_nlu_parse_duration_seconds", "Análise de um pedido (parse_order_text).",
+    ["tier"], buckets=LATENCY_BUCKETS,
+)
+PARSE_ITEMS = Histogram(
+    "coffeenet_nlu_parse_items", "Itens achados por análise.",
+    buckets=(0, 1, 2, 3, 5, 10),
+)
+PARSE_KEYWORDS = Histogram(
+    "coffeenet_nlu_parse_keywords", "Palavras-chave (cardápio) recebidas por análise.",
+    buckets=(10, 50, 100, 250, 500, 1000, 2500),
+)
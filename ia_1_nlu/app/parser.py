@@ -1,20 +1,29 @@
 import spacy
 from spacy.matcher import Matcher
+import logging
 import re
 from typing import List, Dict, Tuple, Optional
 
-# Tenta carregar o modelo spaCy para português
-try:
-    nlp = spacy.load("pt_core_news_md") # Tenta carregar modelo médio
-    print("Modelo spaCy 'pt_core_news_md' carregado.")
-except OSError:
-    print("Modelo 'pt_core_news_md' não encontrado. Tentando 'pt_core_news_sm'...")
-    try:
-        nlp = spacy.load("pt_core_news_sm")
-        print("Modelo spaCy 'pt_core_news_sm' carregado.")
-    except OSError:
-        print("ERRO CRÍTICO: Nenhum modelo de português do spaCy encontrado (sm ou md). Instale um: python -m spacy download pt_core_news_sm")
-        nlp = None 
+logger = logging.getLogger(__name__)
+
+# Modelos de português, em ordem de preferência
+SPACY_MODELS = ("pt_core_news_md", "pt_core_news_sm")
+
+# Carregado por load_model() no lifespan do app (e não no import)
+nlp = None
+
+
+def load_model():
+    """Carrega o primeiro modelo spaCy de português disponível. Sem nenhum, levanta OSError."""
+    global nlp
+    for name in SPACY_MODELS:
+        try:
+            nlp = spacy.load(name)
+            logger.info("Modelo spaCy carregado", extra={"model": name})
+            return nlp
+        except OSError:
+            logger.info("Modelo spaCy não encontrado", extra={"model": name})
+    raise OSError("Nenhum modelo de português do spaCy encontrado (sm ou md). Instale um: python -m spacy download pt_core_news_sm")
 
 # Dicionário expandido para quantidades
 text_to_num = {
@@ -60,9 +69,18 @@ def find_keyword_match(text_fragment: str, product_keywords: List[str]) -> Optio
 
 
 def parse_order_text(text: str, product_keywords: List[str]) -> List[Dict]:
+    return parse_order_text_with_tier(text, product_keywords)[0]
+
+
+def parse_order_text_with_tier(text: str, product_keywords: List[str]) -> Tuple[List[Dict], str]:
+    """
+    Itens do pedido e a etapa que os achou (para as métricas do /metrics):
+    "matcher" (padrões do spaCy), "fallback" (frase exata), "none" (nada)
+    ou "no_model" (modelo não carregado).
+    """
     if nlp is None:
-        print("Erro: Modelo spaCy não carregado.")
-        return []
+        logger.error("Modelo spaCy não carregado.")
+        return [], "no_model"
 
     processed_text = normalize_text(text)
     doc = nlp(processed_text)
@@ -111,9 +129,9 @@ def parse_order_text(text: str, product_keywords: List[str]) -> List[Dict]:
         final_quantity = int(quantity) if quantity == int(quantity) else quantity
         existing_quantity = found_items_map.get(keyword_match, 0)
         found_items_map[keyword_match] = existing_quantity + final_quantity
-        print(f"Matcher processou: {final_quantity} x '{keyword_match}' (Índices: {start}-{end-1})")
-
+        logger.debug("Matcher processou", extra={"quantity": final_quantity, "keyword": keyword_match, "start": start, "end": end - 1})
 
+    tier = "matcher" if found_items_map else "none"
 
     if not found_items_map:
         remaining_tokens = [token for i, token in enumerate(doc) if i not in processed_indices]
@@ -133,7 +151,8 @@ def parse_order_text(text: str, product_keywords: List[str]) -> List[Dict]:
                  if found_kw not in found_items_map: 
                       found_items_map[found_kw] = 1 
                       processed_indices.update(range(token.i - len(current_phrase) + 1, token.i + 1))
-                      print(f"Fallback (exato) encontrou: 1 x '{found_kw}'")
+                      tier = "fallback"
+                      logger.debug("Fallback (exato) encontrou", extra={"quantity": 1, "keyword": found_kw})
                  current_phrase = [] # Reseta a frase
              elif not any(kw.lower().startswith(phrase_str) for kw in product_keywords):
                   current_phrase = []
@@ -141,9 +160,6 @@ def parse_order_text(text: str, product_keywords: List[str]) -> List[Dict]:
     # Converte o mapa para o formato de lista esperado
     final_list = [{"product_guess": kw, "quantity": qty} for kw, qty in found_items_map.items()]
 
-    print(f"IA 1 (NLU) - Final items para '{text}': {final_list}") 
+    logger.debug("Itens encontrados", extra={"text": text, "items": final_list, "tier": tier})
 
-    if not final_list:
-        print("Nenhum item do cardápio identificado no pedido.")
-    
-    return final_list
\ No newline at end of file
+    return final_list, tier
\ No newline at end of file